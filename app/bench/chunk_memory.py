@@ -0,0 +1,169 @@
+"""
+Memory benchmark for the chunk representation at ingest.
+
+    PYTHONPATH=. python -m app.bench.chunk_memory --docs 64 --pages 50 --out data/bench_chunks.json
+
+Chunks a synthetic corpus (cleaned page text, as the loaders produce) and
+measures, with tracemalloc, what each representation keeps alive for a
+batch of documents:
+- rows:       row dicts with their own text copies, as `ingest --dir`
+              used to hold for a batch (list(chunk_rows(pages)) per doc)
+- dataclass:  the former Chunk dataclass, one text copy per chunk
+- views:      Chunk views from chunk_pages (__slots__, offsets into the
+              page text, which they keep alive)
+- doc_chunks: chunk_document per doc: one TextBuffer + offset arrays
+
+Pages are built inside the measured loop and dropped after chunking,
+like ingest does, so each number is what the representation retains.
+"""
+import argparse
+import gc
+import json
+import random
+import time
+import tracemalloc
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List
+
+from app.ingest.chunking import chunk_document, chunk_pages
+from app.ingest.loaders import Page
+
+WORDS = (
+    "python java kubernetes postgresql led team engineers built services pipelines latency "
+    "recall data platform migrated cloud reduced costs senior developer university degree "
+    "project managed stakeholders delivered roadmap analytics dashboards machine learning"
+).split()
+
+
+@dataclass
+class LegacyChunk:
+    # The Chunk dataclass before chunks became views; kept for comparison.
+    doc_id: str
+    chunk_id: str
+    page_num: int
+    text: str
+
+
+def synthetic_pages(doc_id: str, n_pages: int, page_chars: int, rng: random.Random) -> List[Page]:
+    pages = []
+    for i in range(n_pages):
+        words: List[str] = []
+        size = 0
+        while size < page_chars:
+            w = rng.choice(WORDS)
+            words.append(w)
+            size += len(w) + 1
+        pages.append(Page(doc_id=doc_id, page_num=i + 1, text=" ".join(words)))
+    return pages
+
+
+def as_rows(doc_id: str, pages: List[Page], **window: int) -> Any:
+    return [c.row() for c in chunk_pages(pages, **window)]
+
+
+def as_dataclasses(doc_id: str, pages: List[Page], **window: int) -> Any:
+    return [LegacyChunk(c.doc_id, c.chunk_id, c.page_num, c.text) for c in chunk_pages(pages, **window)]
+
+
+def as_views(doc_id: str, pages: List[Page], **window: int) -> Any:
+    return chunk_pages(pages, **window)
+
+
+def as_doc_chunks(doc_id: str, pages: List[Page], **window: int) -> Any:
+    return chunk_document(doc_id, pages, **window)
+
+
+REPRESENTATIONS: Dict[str, Callable[..., Any]] = {
+    "rows": as_rows,
+    "dataclass": as_dataclasses,
+    "views": as_views,
+    "doc_chunks": as_doc_chunks,
+}
+
+
+def measure(
+    build: Callable[..., Any],
+    docs: int,
+    pages: int,
+    page_chars: int,
+    seed: int,
+    window: Dict[str, int],
+) -> Dict[str, Any]:
+    rng = random.Random(seed)
+    gc.collect()
+    tracemalloc.start()
+    t0 = time.perf_counter()
+
+    kept = []
+    n_chunks = 0
+    for d in range(docs):
+        doc_pages = synthetic_pages(f"doc{d}", pages, page_chars, rng)
+        rep = build(f"doc{d}", doc_pages, **window)
+        n_chunks += len(rep)
+        kept.append(rep)
+        del doc_pages
+
+    elapsed = time.perf_counter() - t0
+    gc.collect()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del kept
+
+    return {
+        "chunks": n_chunks,
+        "retained_mb": round(retained / 1e6, 2),
+        "peak_mb": round(peak / 1e6, 2),
+        "bytes_per_chunk": round(retained / max(1, n_chunks)),
+        "elapsed_s": round(elapsed, 3),
+    }
+
+
+def run(
+    docs: int,
+    pages: int,
+    page_chars: int,
+    chunk_size: int = 2200,
+    overlap: int = 250,
+    seed: int = 0,
+) -> Dict[str, Any]:
+    window = {"chunk_size": chunk_size, "overlap": overlap}
+    results = {name: measure(build, docs, pages, page_chars, seed, window) for name, build in REPRESENTATIONS.items()}
+    base = results["rows"]["retained_mb"]
+    for r in results.values():
+        r["vs_rows"] = round(r["retained_mb"] / base, 3) if base else None
+    # The raw cleaned text, for scale: every representation holds at least this.
+    text_mb = docs * pages * page_chars / 1e6
+    return {"docs": docs, "pages": pages, "page_chars": page_chars, **window, "text_mb": round(text_mb, 2), "results": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chunk representation memory benchmark")
+    parser.add_argument("--docs", type=int, default=64, help="Documents held at once (ingest --batch-docs)")
+    parser.add_argument("--pages", type=int, default=50, help="Pages per document")
+    parser.add_argument("--page-chars", type=int, default=3000, help="Cleaned characters per page")
+    parser.add_argument("--chunk-size", type=int, default=2200)
+    parser.add_argument("--overlap", type=int, default=250)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=None, help="Write results as JSON")
+    args = parser.parse_args()
+
+    out = run(args.docs, args.pages, args.page_chars, args.chunk_size, args.overlap, args.seed)
+    print(
+        f"docs={out['docs']} pages/doc={out['pages']} chars/page={out['page_chars']} "
+        f"chunk_size={out['chunk_size']} overlap={out['overlap']} text={out['text_mb']} MB"
+    )
+    print(f"{'repr':<11} {'chunks':>8} {'retained_MB':>12} {'peak_MB':>9} {'B/chunk':>8} {'vs_rows':>8} {'time_s':>7}")
+    for name, r in out["results"].items():
+        print(
+            f"{name:<11} {r['chunks']:>8} {r['retained_mb']:>12.2f} {r['peak_mb']:>9.2f} "
+            f"{r['bytes_per_chunk']:>8} {r['vs_rows']:>8.3f} {r['elapsed_s']:>7.2f}"
+        )
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(out, f, indent=2)
+        print(f"Saved: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
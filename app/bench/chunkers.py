@@ -0,0 +1,216 @@
+"""
+Chunk count and retrieval-quality benchmark: character windows vs.
+token-budgeted, boundary-aware chunks.
+
+    PYTHONPATH=. python -m app.bench.chunkers --docs 40 --pages 20 --out data/bench_chunkers.json
+    PYTHONPATH=. python -m app.bench.chunkers --budgets 256,512,800 --dir docs/
+
+The synthetic corpus is sentences of filler words with planted facts
+("The budget code of project Orion-17, as agreed with ..., is QX-4821."),
+one question per fact. A query counts as answered at rank r if the r-th
+retrieved chunk contains the whole fact sentence, so a fact cut in half
+by a chunk boundary is a miss for both halves. Retrieval is offline: BM25 (the
+lexical index) and the hashing embedding backend.
+
+Per chunker: chunks (one embedding input and one index vector each),
+embedded tokens (what the embeddings API bills, overlap included), chunks
+per second, split facts, hit@1 / hit@k and MRR. --dir adds chunk and
+token counts for real PDFs (no quality labels).
+"""
+import argparse
+import json
+import random
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.bench.chunk_memory import WORDS
+from app.ingest.chunking import chunk_document, chunk_document_tokens
+from app.ingest.embed_backends import HashingBackend
+from app.ingest.lexical import LexicalBuilder, LexicalIndex
+from app.ingest.loaders import Page
+from app.tokens import estimate_tokens
+
+ATTRIBUTES = ("budget code", "release date", "owner", "data region", "on-call alias", "vendor")
+SYLLABLES = ("or", "ion", "ka", "vel", "tra", "zen", "mi", "dor", "lux", "pe")
+
+
+def _name(rng: random.Random) -> str:
+    return "".join(rng.choice(SYLLABLES) for _ in range(3)).capitalize() + f"-{rng.randint(10, 99)}"
+
+
+def _filler(rng: random.Random) -> str:
+    words = [rng.choice(WORDS) for _ in range(rng.randint(6, 28))]
+    return " ".join(words).capitalize() + rng.choice(".....!?")
+
+
+def synthetic_corpus(
+    docs: int,
+    pages: int,
+    sentences: int = 30,
+    fact_rate: float = 0.08,
+    seed: int = 0,
+) -> Tuple[Dict[str, List[Page]], List[Dict[str, str]]]:
+    """
+    ({doc_id: pages}, facts); each fact is {"query", "fact"}.
+    """
+    rng = random.Random(seed)
+    corpus: Dict[str, List[Page]] = {}
+    facts: List[Dict[str, str]] = []
+    for d in range(docs):
+        doc_id = f"doc{d}"
+        corpus[doc_id] = []
+        for p in range(pages):
+            parts = []
+            for _ in range(rng.randint(sentences // 2, sentences * 3 // 2)):
+                if rng.random() < fact_rate:
+                    attr, entity = rng.choice(ATTRIBUTES), f"project {_name(rng)}"
+                    value = f"{rng.choice('QXZKM')}{rng.choice('QXZKM')}-{rng.randint(1000, 9999)}"
+                    # Facts run one to three filler sentences long, so some straddle a cut.
+                    detail = " ".join(rng.choice(WORDS) for _ in range(rng.randint(10, 60)))
+                    fact = f"The {attr} of {entity}, as agreed with {detail}, is {value}."
+                    facts.append({"query": f"What is the {attr} of {entity}?", "fact": fact})
+                    parts.append(fact)
+                else:
+                    parts.append(_filler(rng))
+            corpus[doc_id].append(Page(doc_id=doc_id, page_num=p + 1, text=" ".join(parts)))
+    return corpus, facts
+
+
+def chunk_corpus(corpus: Dict[str, List[Page]], chunker: str, budget: int, overlap: int) -> Tuple[List[str], float]:
+    t0 = time.perf_counter()
+    texts: List[str] = []
+    for doc_id, pages in corpus.items():
+        if chunker == "chars":
+            doc = chunk_document(doc_id, pages)
+        else:
+            doc = chunk_document_tokens(doc_id, pages, max_tokens=budget, overlap_tokens=overlap)
+        texts.extend(c.text for c in doc)
+    return texts, time.perf_counter() - t0
+
+
+def _quality(rankings: Sequence[Sequence[int]], texts: List[str], facts: List[Dict[str, str]], k: int) -> Dict[str, float]:
+    hit1 = hitk = rr = 0.0
+    for ranked, f in zip(rankings, facts):
+        for rank, i in enumerate(ranked[:k], start=1):
+            if f["fact"] in texts[i]:
+                hit1 += rank == 1
+                hitk += 1
+                rr += 1.0 / rank
+                break
+    n = max(1, len(facts))
+    return {"hit@1": round(hit1 / n, 4), f"hit@{k}": round(hitk / n, 4), "mrr": round(rr / n, 4)}
+
+
+def evaluate(texts: List[str], facts: List[Dict[str, str]], k: int) -> Dict[str, Any]:
+    builder = LexicalBuilder(LexicalIndex())
+    for i, t in enumerate(texts):
+        builder.add(i, t)
+    lexical = builder.build()
+    bm25 = [lexical.search(f["query"], top_k=k)[1].tolist() for f in facts]
+
+    backend = HashingBackend()
+    vecs = backend.embed(texts)
+    qvecs = backend.embed([f["query"] for f in facts])
+    scores = qvecs @ vecs.T
+    top = np.argsort(-scores, axis=1)[:, :k]
+    dense = top.tolist()
+
+    whole = sum(any(f["fact"] in t for t in texts) for f in facts)
+    return {
+        "split_facts": round(1 - whole / max(1, len(facts)), 4),
+        "bm25": _quality(bm25, texts, facts, k),
+        "hashing": _quality(dense, texts, facts, k),
+    }
+
+
+def run(
+    docs: int,
+    pages: int,
+    budgets: Sequence[int],
+    overlap: int,
+    k: int = 5,
+    seed: int = 0,
+    pdf_dir: Optional[str] = None,
+) -> Dict[str, Any]:
+    corpus, facts = synthetic_corpus(docs, pages, seed=seed)
+    configs = [("chars", 0)] + [("tokens", b) for b in budgets]
+
+    results = []
+    for chunker, budget in configs:
+        texts, elapsed = chunk_corpus(corpus, chunker, budget, overlap)
+        tokens = [estimate_tokens(t) for t in texts]
+        results.append({
+            "chunker": chunker if chunker == "chars" else f"tokens-{budget}",
+            "chunks": len(texts),
+            "embedded_tokens": sum(tokens),
+            "max_chunk_tokens": max(tokens),
+            "chunks_per_s": round(len(texts) / max(elapsed, 1e-9)),
+            **evaluate(texts, facts, k),
+        })
+
+    base = results[0]
+    for r in results:
+        r["chunks_vs_chars"] = round(r["chunks"] / base["chunks"], 3)
+        r["tokens_vs_chars"] = round(r["embedded_tokens"] / base["embedded_tokens"], 3)
+
+    out: Dict[str, Any] = {"docs": docs, "pages": pages, "facts": len(facts), "k": k,
+                           "overlap_tokens": overlap, "results": results}
+    if pdf_dir:
+        out["pdfs"] = pdf_counts(pdf_dir, configs, overlap)
+    return out
+
+
+def pdf_counts(root: str, configs: Sequence[Tuple[str, int]], overlap: int) -> List[Dict[str, Any]]:
+    from app.ingest.loaders import doc_id_for_path, find_pdfs, load_pdf
+
+    corpus = {doc_id_for_path(p, root): load_pdf(p, doc_id_for_path(p, root)) for p in find_pdfs(root)}
+    counts = []
+    for chunker, budget in configs:
+        texts, _ = chunk_corpus(corpus, chunker, budget, overlap)
+        counts.append({
+            "chunker": chunker if chunker == "chars" else f"tokens-{budget}",
+            "chunks": len(texts),
+            "embedded_tokens": sum(estimate_tokens(t) for t in texts),
+        })
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chunker benchmark: chunk counts and retrieval quality")
+    parser.add_argument("--docs", type=int, default=40)
+    parser.add_argument("--pages", type=int, default=20, help="Pages per document")
+    parser.add_argument("--budgets", default="256,512,800", help="Token budgets to compare, comma-separated")
+    parser.add_argument("--overlap", type=int, default=48, help="Overlap tokens for the token chunker")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--dir", default=None, help="Also count chunks for the PDFs under this directory")
+    parser.add_argument("--out", default=None, help="Write results as JSON")
+    args = parser.parse_args()
+
+    budgets = [int(b) for b in args.budgets.split(",") if b]
+    out = run(args.docs, args.pages, budgets, args.overlap, args.k, args.seed, args.dir)
+
+    k = out["k"]
+    print(f"docs={out['docs']} pages/doc={out['pages']} facts={out['facts']} k={k}")
+    print(f"{'chunker':<12} {'chunks':>7} {'vs_chars':>8} {'tokens':>8} {'vs_chars':>8} {'split':>6} "
+          f"{'bm25@1':>7} {f'bm25@{k}':>7} {'hash@1':>7} {f'hash@{k}':>7} {'chunks/s':>9}")
+    for r in out["results"]:
+        print(
+            f"{r['chunker']:<12} {r['chunks']:>7} {r['chunks_vs_chars']:>8.3f} {r['embedded_tokens']:>8} "
+            f"{r['tokens_vs_chars']:>8.3f} {r['split_facts']:>6.3f} {r['bm25']['hit@1']:>7.3f} "
+            f"{r['bm25'][f'hit@{k}']:>7.3f} {r['hashing']['hit@1']:>7.3f} {r['hashing'][f'hit@{k}']:>7.3f} "
+            f"{r['chunks_per_s']:>9}"
+        )
+    for r in out.get("pdfs", []):
+        print(f"pdfs {r['chunker']:<12} chunks={r['chunks']} tokens={r['embedded_tokens']}")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(out, f, indent=2)
+        print(f"Saved: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
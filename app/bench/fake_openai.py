@@ -0,0 +1,274 @@
+"""
+Local stand-in for the OpenAI embeddings and responses endpoints, for
+offline tests and benchmarks. Point a client at it with
+OpenAI(base_url=server.base_url, api_key="test"), or run it standalone and
+set OPENAI_BASE_URL:
+
+    PYTHONPATH=. python -m app.bench.fake_openai --port 8089 --latency-ms 40 --error-rate 0.02
+
+Embeddings are deterministic per text (seeded from its sha256), so the
+same text always maps to the same vector. Latency and failures are
+injectable:
+- latency_s (+ uniform jitter_s) per request, overridable per endpoint,
+  plus embed_per_item_s per embedded input
+- fail_first: the first n requests get a 429
+- error_rate: each request fails with error_status with that probability
+  (seeded, so a run is reproducible)
+"""
+import argparse
+import base64
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Optional
+
+import numpy as np
+
+DIM = 16
+
+DEFAULT_OUTPUT = '{"refusal": false, "candidate_name": "Test", "skills": ["python"]}'
+
+
+def fake_embedding(text: str, dim: int = DIM) -> np.ndarray:
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    return np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+
+
+class FakeOpenAIServer:
+    def __init__(
+        self,
+        latency_s: float = 0.0,
+        fail_first: int = 0,
+        responder: Optional[Callable[[Dict[str, Any]], str]] = None,
+        chunk_delay_s: float = 0.0,
+        dim: int = DIM,
+        jitter_s: float = 0.0,
+        embed_latency_s: Optional[float] = None,
+        responses_latency_s: Optional[float] = None,
+        embed_per_item_s: float = 0.0,
+        error_rate: float = 0.0,
+        error_status: int = 500,
+        seed: int = 0,
+        port: int = 0,
+    ):
+        self.latency_s = latency_s
+        self.jitter_s = jitter_s
+        self.embed_latency_s = embed_latency_s
+        self.responses_latency_s = responses_latency_s
+        self.embed_per_item_s = embed_per_item_s
+        self.fail_first = fail_first
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.dim = dim
+        # Delay between streamed text deltas (stream=true requests)
+        self.chunk_delay_s = chunk_delay_s
+        self.stream_deltas_sent = 0
+        # responder(request_body) -> output_text for /responses
+        self.responder = responder or (lambda body: DEFAULT_OUTPUT)
+        self.requests = 0
+        self.errors_injected = 0
+        self.embedded_inputs = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+        self._rng = random.Random(seed)
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, payload, headers=None):
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.end_headers()
+                try:
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    # Client gave up (e.g. a timed-out request); nothing to do.
+                    pass
+
+            def _stream(self, response, piece=8):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.end_headers()
+                text = response["output"][0]["content"][0]["text"]
+                events = [{"type": "response.created", "response": dict(response, status="in_progress", output=[])}]
+                events += [
+                    {"type": "response.output_text.delta", "item_id": "msg_fake", "output_index": 0,
+                     "content_index": 0, "delta": text[i:i + piece], "logprobs": []}
+                    for i in range(0, len(text), piece)
+                ]
+                events.append({"type": "response.completed", "response": response})
+                try:
+                    for n, ev in enumerate(events):
+                        ev["sequence_number"] = n
+                        self.wfile.write(f"event: {ev['type']}\ndata: {json.dumps(ev)}\n\n".encode("utf-8"))
+                        self.wfile.flush()
+                        if ev["type"] == "response.output_text.delta":
+                            with server.lock:
+                                server.stream_deltas_sent += 1
+                            time.sleep(server.chunk_delay_s)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+            def _error(self, status):
+                with server.lock:
+                    server.errors_injected += 1
+                if status == 429:
+                    self._send(429, {"error": {"message": "rate limited", "type": "rate_limit"}},
+                               {"retry-after": "0"})
+                else:
+                    self._send(status, {"error": {"message": "injected failure", "type": "server_error"}})
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                embeddings = self.path.endswith("/embeddings")
+
+                with server.lock:
+                    server.requests += 1
+                    n = server.requests
+                    server.in_flight += 1
+                    server.max_in_flight = max(server.max_in_flight, server.in_flight)
+                    fail = server._rng.random() < server.error_rate
+                    jitter = server._rng.uniform(0, server.jitter_s) if server.jitter_s else 0.0
+                try:
+                    time.sleep(server.request_latency(body, embeddings) + jitter)
+                    if n <= server.fail_first:
+                        self._error(429)
+                        return
+                    if fail:
+                        self._error(server.error_status)
+                        return
+                    if embeddings:
+                        payload = embeddings_payload(body, server.dim)
+                        with server.lock:
+                            server.embedded_inputs += len(payload["data"])
+                        self._send(200, payload)
+                    elif self.path.endswith("/responses") and body.get("stream"):
+                        self._stream(responses_payload(body, server.responder(body)))
+                    elif self.path.endswith("/responses"):
+                        self._send(200, responses_payload(body, server.responder(body)))
+                    else:
+                        self._send(404, {"error": {"message": "not found"}})
+                finally:
+                    with server.lock:
+                        server.in_flight -= 1
+
+        class Server(ThreadingHTTPServer):
+            daemon_threads = True
+            request_queue_size = 1024
+
+        self.httpd = Server(("127.0.0.1", port), Handler)
+        self.base_url = f"http://127.0.0.1:{self.httpd.server_address[1]}/v1"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def request_latency(self, body: Dict[str, Any], embeddings: bool) -> float:
+        if embeddings:
+            base = self.latency_s if self.embed_latency_s is None else self.embed_latency_s
+            inputs = body.get("input")
+            n = 1 if isinstance(inputs, str) else len(inputs or [])
+            return base + n * self.embed_per_item_s
+        return self.latency_s if self.responses_latency_s is None else self.responses_latency_s
+
+    def stats(self) -> Dict[str, int]:
+        with self.lock:
+            return {
+                "requests": self.requests,
+                "errors_injected": self.errors_injected,
+                "embedded_inputs": self.embedded_inputs,
+                "max_in_flight": self.max_in_flight,
+            }
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def embeddings_payload(body, dim: int = DIM):
+    inputs = body["input"]
+    if isinstance(inputs, str):
+        inputs = [inputs]
+
+    data = []
+    for i, text in enumerate(inputs):
+        vec = fake_embedding(text, dim)
+        if body.get("encoding_format") == "base64":
+            emb = base64.b64encode(vec.tobytes()).decode("ascii")
+        else:
+            emb = vec.tolist()
+        data.append({"object": "embedding", "index": i, "embedding": emb})
+
+    # Out of order on purpose: clients must sort by index.
+    data.reverse()
+    return {
+        "object": "list",
+        "data": data,
+        "model": body.get("model"),
+        "usage": {"prompt_tokens": 0, "total_tokens": 0},
+    }
+
+
+def responses_payload(body, text):
+    return {
+        "id": "resp_fake",
+        "object": "response",
+        "created_at": 0,
+        "model": body.get("model"),
+        "status": "completed",
+        "output": [{
+            "type": "message",
+            "id": "msg_fake",
+            "role": "assistant",
+            "status": "completed",
+            "content": [{"type": "output_text", "text": text, "annotations": []}],
+        }],
+        "parallel_tool_calls": False,
+        "tool_choice": "auto",
+        "tools": [],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local fake OpenAI embeddings/responses server")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--dim", type=int, default=DIM)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--embed-per-item-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=500)
+    args = parser.parse_args()
+
+    server = FakeOpenAIServer(
+        latency_s=args.latency_ms / 1000,
+        jitter_s=args.jitter_ms / 1000,
+        embed_per_item_s=args.embed_per_item_ms / 1000,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        dim=args.dim,
+        port=args.port,
+    )
+    print(f"Fake OpenAI API on {server.base_url} (set OPENAI_BASE_URL to this)")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
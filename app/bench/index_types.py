@@ -0,0 +1,149 @@
+"""
+Recall/latency/memory benchmark for the selectable FAISS index types.
+
+    PYTHONPATH=. python -m app.bench.index_types --n 100000 --dim 384 --out data/bench_index.json
+
+Recall@k is measured against the exact flat index on the same vectors.
+Latency is per single-query search (what analyze_document does), reported
+as p50/p99. Memory is the serialized index size.
+"""
+import argparse
+import json
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import faiss
+
+from app.ingest.index_types import make_index, search_params
+
+
+def synthetic_vectors(n: int, dim: int, clusters: int = 100, seed: int = 0) -> np.ndarray:
+    """
+    Normalized vectors drawn around random centers, a rough stand-in for
+    embedding distributions (which are far from uniform).
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    assign = rng.integers(0, clusters, size=n)
+    x = centers[assign] + 0.5 * rng.standard_normal((n, dim)).astype(np.float32)
+    faiss.normalize_L2(x)
+    return x
+
+
+def load_vectors(index_path: str) -> np.ndarray:
+    index = faiss.read_index(index_path)
+    inner = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap2) else index
+    if not isinstance(inner, faiss.IndexFlat):
+        raise SystemExit("--from-index needs a flat index (exact vectors); run reindex --index-type flat first")
+    return inner.reconstruct_n(0, inner.ntotal)
+
+
+def percentile_ms(samples: List[float], q: float) -> float:
+    return float(np.percentile(np.array(samples) * 1000, q))
+
+
+def run_config(
+    name: str,
+    index: faiss.Index,
+    queries: np.ndarray,
+    truth: np.ndarray,
+    k: int,
+    build_s: float,
+    nprobe: Optional[int] = None,
+    ef_search: Optional[int] = None,
+) -> Dict[str, Any]:
+    params = search_params(index, nprobe=nprobe, ef_search=ef_search)
+
+    latencies: List[float] = []
+    hits = 0
+    for i in range(len(queries)):
+        t0 = time.perf_counter()
+        _, ids = index.search(queries[i:i + 1], k, params=params)
+        latencies.append(time.perf_counter() - t0)
+        hits += len(set(ids[0].tolist()) & set(truth[i].tolist()))
+
+    return {
+        "config": name,
+        "nprobe": nprobe,
+        "ef_search": ef_search,
+        f"recall@{k}": hits / (len(queries) * k),
+        "p50_ms": percentile_ms(latencies, 50),
+        "p99_ms": percentile_ms(latencies, 99),
+        "memory_bytes": int(faiss.serialize_index(index).nbytes),
+        "build_s": build_s,
+    }
+
+
+def build(kind: str, vectors: np.ndarray) -> tuple:
+    t0 = time.perf_counter()
+    index = make_index(vectors.shape[1], index_type=kind, n_train=len(vectors))
+    if not index.is_trained:
+        index.train(vectors)
+    index.add_with_ids(vectors, np.arange(len(vectors), dtype=np.int64))
+    return index, time.perf_counter() - t0
+
+
+def run(
+    vectors: np.ndarray,
+    n_queries: int = 200,
+    k: int = 10,
+    nprobes: List[int] = (1, 8, 32, 128),
+    efs: List[int] = (16, 64, 256),
+) -> List[Dict[str, Any]]:
+    rng = np.random.default_rng(1)
+    # Queries near (not equal to) stored vectors, like real paraphrased queries.
+    picks = rng.choice(len(vectors), size=min(n_queries, len(vectors)), replace=False)
+    queries = vectors[picks] + 0.05 * rng.standard_normal((len(picks), vectors.shape[1])).astype(np.float32)
+    faiss.normalize_L2(queries)
+
+    flat, flat_s = build("flat", vectors)
+    _, truth = flat.search(queries, k)
+
+    results = [run_config("flat", flat, queries, truth, k, flat_s)]
+
+    for kind in ("ivf", "ivfpq"):
+        index, build_s = build(kind, vectors)
+        nlist = faiss.downcast_index(index.index).nlist
+        for nprobe in nprobes:
+            if nprobe <= nlist:
+                results.append(run_config(kind, index, queries, truth, k, build_s, nprobe=nprobe))
+
+    index, build_s = build("hnsw", vectors)
+    for ef in efs:
+        results.append(run_config("hnsw", index, queries, truth, k, build_s, ef_search=max(ef, k)))
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FAISS index type benchmark")
+    parser.add_argument("--n", type=int, default=20_000, help="Synthetic corpus size")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--from-index", default=None, help="Benchmark on vectors from an existing flat faiss.index")
+    parser.add_argument("--out", default=None, help="Write results as JSON")
+    args = parser.parse_args()
+
+    vectors = load_vectors(args.from_index) if args.from_index else synthetic_vectors(args.n, args.dim)
+    results = run(vectors, n_queries=args.queries, k=args.k)
+
+    recall_key = f"recall@{args.k}"
+    print(f"n={len(vectors)} dim={vectors.shape[1]} queries={args.queries} k={args.k}")
+    print(f"{'config':<8} {'knob':<12} {recall_key:>10} {'p50_ms':>8} {'p99_ms':>8} {'mem_MB':>8} {'build_s':>8}")
+    for r in results:
+        knob = f"nprobe={r['nprobe']}" if r["nprobe"] else (f"ef={r['ef_search']}" if r["ef_search"] else "-")
+        print(
+            f"{r['config']:<8} {knob:<12} {r[recall_key]:>10.3f} {r['p50_ms']:>8.3f} "
+            f"{r['p99_ms']:>8.3f} {r['memory_bytes'] / 1e6:>8.1f} {r['build_s']:>8.2f}"
+        )
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"n": len(vectors), "dim": int(vectors.shape[1]), "k": args.k, "results": results}, f, indent=2)
+        print(f"Saved: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
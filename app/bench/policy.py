@@ -0,0 +1,113 @@
+"""
+Policy engine micro-benchmark: cost per KB of scanned text.
+
+    PYTHONPATH=. python -m app.bench.policy --out data/bench_policy.json
+
+Compares the compiled engine (one pass, every match with category and
+priority) with the previous approach: lower() + one substring scan per
+pattern, boolean result only. Also shows how both scale with rule count,
+using synthetic extra phrases.
+"""
+import argparse
+import json
+import random
+import time
+from typing import Any, Callable, Dict, List
+
+from app.policy.engine import PolicyEngine, literal_rules
+from app.policy.evaluate import QUERY_ENGINE, SECRET_KEYWORDS
+from app.policy.rules import INJECTION_PATTERNS
+
+WORDS = (
+    "the candidate worked on python data pipelines and led a team of engineers "
+    "at acme corp during 2019 2021 built services reduced latency improved recall"
+).split()
+
+
+def sample_text(kb: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    out: List[str] = []
+    size = 0
+    while size < kb * 1024:
+        w = rng.choice(WORDS)
+        out.append(w)
+        size += len(w) + 1
+    return " ".join(out)[: kb * 1024]
+
+
+def legacy_scan(patterns: List[str]) -> Callable[[str], bool]:
+    def scan(text: str) -> bool:
+        t = text.lower()
+        return any(p in t for p in patterns)
+    return scan
+
+
+def us_per_kb(fn: Callable[[str], Any], text: str, kb: int, min_time_s: float = 0.2) -> float:
+    n = 0
+    t0 = time.perf_counter()
+    while True:
+        fn(text)
+        n += 1
+        elapsed = time.perf_counter() - t0
+        if elapsed >= min_time_s:
+            return elapsed / n / kb * 1e6
+
+
+def synthetic_phrases(n: int, seed: int = 1) -> List[str]:
+    rng = random.Random(seed)
+    verbs = ["print", "show", "reveal", "dump", "leak", "export", "override", "disable"]
+    objects = ["config", "prompt", "token", "memory", "policy", "rules", "history", "secrets"]
+    return [f"{rng.choice(verbs)} {rng.choice(objects)} {i}" for i in range(n)]
+
+
+def run(sizes_kb: List[int], rule_counts: List[int]) -> Dict[str, Any]:
+    base = INJECTION_PATTERNS + SECRET_KEYWORDS
+    results: Dict[str, Any] = {"rules": len(QUERY_ENGINE.rules), "by_size": [], "by_rule_count": []}
+
+    legacy = legacy_scan(base)
+    for kb in sizes_kb:
+        text = sample_text(kb)
+        results["by_size"].append({
+            "kb": kb,
+            "engine_us_per_kb": us_per_kb(QUERY_ENGINE.scan, text, kb),
+            "legacy_us_per_kb": us_per_kb(legacy, text, kb),
+        })
+
+    text = sample_text(16)
+    for n in rule_counts:
+        phrases = base + synthetic_phrases(max(0, n - len(base)))
+        engine = PolicyEngine(literal_rules(phrases, "synthetic", 1))
+        results["by_rule_count"].append({
+            "rules": len(phrases),
+            "engine_us_per_kb": us_per_kb(engine.scan, text, 16),
+            "legacy_us_per_kb": us_per_kb(legacy_scan(phrases), text, 16),
+        })
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Policy engine micro-benchmark")
+    parser.add_argument("--sizes-kb", type=int, nargs="+", default=[1, 16, 256])
+    parser.add_argument("--rule-counts", type=int, nargs="+", default=[45, 200, 1000])
+    parser.add_argument("--out", default=None, help="Write results as JSON")
+    args = parser.parse_args()
+
+    results = run(args.sizes_kb, args.rule_counts)
+
+    print(f"rules={results['rules']}")
+    print(f"{'size_kb':>8} {'engine_us/KB':>13} {'legacy_us/KB':>13}")
+    for r in results["by_size"]:
+        print(f"{r['kb']:>8} {r['engine_us_per_kb']:>13.1f} {r['legacy_us_per_kb']:>13.1f}")
+    print(f"{'rules':>8} {'engine_us/KB':>13} {'legacy_us/KB':>13}")
+    for r in results["by_rule_count"]:
+        print(f"{r['rules']:>8} {r['engine_us_per_kb']:>13.1f} {r['legacy_us_per_kb']:>13.1f}")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,395 @@
+"""
+Offline end-to-end benchmark suite. No network: embeddings and LLM calls
+go to a local fake OpenAI server (app.bench.fake_openai) with injectable
+latency and errors.
+
+    PYTHONPATH=. python -m app.bench.suite --out data/bench.json
+    PYTHONPATH=. python -m app.bench.suite --scenarios search --sizes 1000,100000,1000000
+    PYTHONPATH=. python -m app.bench.suite --out data/bench_new.json --compare data/bench.json
+
+Scenarios:
+- ingest:  synthetic pages -> chunks -> embeddings -> index + lexical
+           index + chunk store; pages/s, chunks/s, API requests
+- search:  single-query latency (p50/p95/p99) vs corpus size, dense and
+           BM25, plus load time and on-disk size
+- analyze: end-to-end analyze_document latency and per-stage p50/p95/p99
+           from the tracer, plus batch throughput
+
+Each scenario runs in a fresh interpreter (this module with
+--run-scenario) with DATA_DIR and OPENAI_BASE_URL pointed at a scratch
+directory and the fake server (the app reads its configuration at import). Its rss_peak_mb is therefore that
+scenario's own memory high-water mark. Results are one JSON document;
+--compare prints the relative change of every metric against an earlier
+run.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from app.bench.fake_openai import FakeOpenAIServer
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SCENARIOS = ("ingest", "search", "analyze")
+
+WORDS = (
+    "python java kubernetes postgresql led team engineers built services pipelines latency "
+    "recall data platform migrated cloud reduced costs senior developer university degree "
+    "project managed stakeholders delivered roadmap analytics dashboards machine learning "
+    "models deployed monitoring incident response api design microservices frontend react"
+).split()
+
+
+def rss_peak_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes.
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def percentiles_ms(samples_s: List[float]) -> Dict[str, float]:
+    ms = np.asarray(samples_s) * 1000
+    return {f"p{q}_ms": round(float(np.percentile(ms, q)), 3) for q in (50, 95, 99)}
+
+
+def synthetic_text(n_words: int, rng: np.random.Generator) -> str:
+    return " ".join(WORDS[i] for i in rng.integers(0, len(WORDS), size=n_words))
+
+
+def synthetic_pages(n_pages: int, page_words: int, pages_per_doc: int = 10, seed: int = 0):
+    from app.ingest.loaders import Page
+
+    rng = np.random.default_rng(seed)
+    docs: Dict[str, List[Page]] = {}
+    for i in range(n_pages):
+        doc_id = f"bench/doc{i // pages_per_doc}"
+        docs.setdefault(doc_id, []).append(Page(doc_id=doc_id, page_num=i % pages_per_doc + 1,
+                                                text=synthetic_text(page_words, rng)))
+    return docs
+
+
+# --- scenarios (run in a child process) ---
+
+def scenario_ingest(cfg: Dict[str, Any]) -> Dict[str, Any]:
+    from app.cli import chunk_rows
+    from app.ingest.embed_store import engine_stats, upsert_documents
+
+    docs = synthetic_pages(cfg["pages"], cfg["page_words"])
+    t0 = time.perf_counter()
+    rows = {doc_id: list(chunk_rows(pages)) for doc_id, pages in docs.items()}
+    chunk_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    stats = upsert_documents(rows)
+    elapsed = time.perf_counter() - t0 + chunk_s
+
+    es = engine_stats()
+    return {
+        "pages": cfg["pages"],
+        "chunks": stats.chunks,
+        "elapsed_s": round(elapsed, 3),
+        "pages_per_s": round(cfg["pages"] / elapsed, 1),
+        "chunks_per_s": round(stats.chunks / elapsed, 1),
+        "embedding_requests": es.requests,
+        "embedding_retries": es.retries,
+        "max_in_flight": es.max_in_flight,
+    }
+
+
+def build_search_corpus(data_dir: str, n: int, dim: int, index_type: str) -> None:
+    from app.bench.index_types import synthetic_vectors
+    from app.ingest.chunk_store import ChunkStoreWriter
+    from app.ingest.index_types import build_index
+    from app.ingest.lexical import LexicalBuilder, LexicalIndex, lexical_path
+
+    rng = np.random.default_rng(n)
+    store = ChunkStoreWriter(data_dir)
+    lexical = LexicalBuilder(LexicalIndex())
+    for i in range(n):
+        text = synthetic_text(40, rng)
+        store.append({"doc_id": f"doc{i // 100}", "chunk_id": f"doc{i // 100}-c{i % 100}",
+                      "page_num": 1, "text": text, "vector_id": i})
+        lexical.add(i, text)
+    store.commit()
+    lexical.build().save(lexical_path(data_dir))
+
+    import faiss
+    index = build_index(synthetic_vectors(n, dim), np.arange(n, dtype=np.int64), index_type=index_type)
+    faiss.write_index(index, os.path.join(data_dir, "faiss.index"))
+
+
+def scenario_search(cfg: Dict[str, Any]) -> Dict[str, Any]:
+    from app.bench.index_types import synthetic_vectors
+    from app.rag.retrieve import Retriever
+
+    results = []
+    for n in cfg["sizes"]:
+        data_dir = os.path.join(cfg["workdir"], f"search-{n}")
+        t0 = time.perf_counter()
+        build_search_corpus(data_dir, n, cfg["dim"], cfg["index_type"])
+        build_s = time.perf_counter() - t0
+
+        retriever = Retriever(data_dir=data_dir, index_path=os.path.join(data_dir, "faiss.index"))
+        t0 = time.perf_counter()
+        retriever.ensure_loaded()
+        load_s = time.perf_counter() - t0
+
+        queries = synthetic_vectors(cfg["queries"], cfg["dim"], seed=1)
+        rng = np.random.default_rng(2)
+        texts = [synthetic_text(4, rng) for _ in range(cfg["queries"])]
+
+        dense: List[float] = []
+        for q in queries:
+            t0 = time.perf_counter()
+            retriever.search_vector(q, top_k=cfg["k"])
+            dense.append(time.perf_counter() - t0)
+
+        lexical: List[float] = []
+        for q in texts:
+            t0 = time.perf_counter()
+            retriever.search(q, top_k=cfg["k"], mode="lexical")
+            lexical.append(time.perf_counter() - t0)
+
+        disk = sum(os.path.getsize(os.path.join(data_dir, f)) for f in os.listdir(data_dir))
+        results.append({
+            "chunks": n,
+            "build_s": round(build_s, 3),
+            "load_s": round(load_s, 4),
+            "disk_mb": round(disk / 1e6, 2),
+            "vector": percentiles_ms(dense),
+            "lexical": percentiles_ms(lexical),
+        })
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    return {"dim": cfg["dim"], "k": cfg["k"], "index_type": cfg["index_type"], "sizes": results}
+
+
+def scenario_analyze(cfg: Dict[str, Any]) -> Dict[str, Any]:
+    from app.cli import chunk_rows
+    from app.ingest.embed_store import upsert_documents
+    from app.rag.extract import analyze_document, analyze_documents
+    from app.rag.retrieve import Retriever
+    from app.tracing import get_tracer
+
+    docs = synthetic_pages(cfg["analyze_pages"], cfg["page_words"])
+    upsert_documents({doc_id: list(chunk_rows(pages)) for doc_id, pages in docs.items()})
+    retriever = Retriever()
+
+    rng = np.random.default_rng(3)
+    queries = [f"Extract {synthetic_text(3, rng)}" for _ in range(cfg["analyze_queries"])]
+
+    tracer = get_tracer()
+    tracer.reset()
+    latencies: List[float] = []
+    for q in queries:
+        t0 = time.perf_counter()
+        analyze_document(q, top_k=cfg["k"], retriever=retriever, use_cache=False)
+        latencies.append(time.perf_counter() - t0)
+    stages = tracer.summaries()
+
+    t0 = time.perf_counter()
+    batch = analyze_documents(queries, top_k=cfg["k"], retriever=retriever, use_cache=False,
+                              max_concurrency=cfg["concurrency"])
+    batch_s = time.perf_counter() - t0
+
+    return {
+        "queries": len(queries),
+        "sequential": percentiles_ms(latencies),
+        "stages": {name: {k: v for k, v in s.items() if k != "sum_ms"} for name, s in stages.items()},
+        "batch": {
+            "concurrency": cfg["concurrency"],
+            "elapsed_s": round(batch_s, 3),
+            "queries_per_s": round(len(queries) / batch_s, 1),
+            "failed": sum(1 for r in batch if r.error),
+        },
+    }
+
+
+RUNNERS = {"ingest": scenario_ingest, "search": scenario_search, "analyze": scenario_analyze}
+
+
+def run_scenario(name: str, cfg: Dict[str, Any], env: Dict[str, str]) -> Dict[str, Any]:
+    """
+    Runs one scenario in a child interpreter configured through env; the
+    config goes in as JSON on stdin, the result comes back on stdout.
+    """
+    proc = subprocess.run(
+        [sys.executable, "-m", "app.bench.suite", "--run-scenario", name],
+        input=json.dumps(cfg),
+        capture_output=True,
+        text=True,
+        env={**os.environ, **env},
+        cwd=REPO_ROOT,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"Scenario {name} failed:\n{proc.stderr[-2000:]}")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def scenario_main(name: str) -> None:
+    result = RUNNERS[name](json.load(sys.stdin))
+    result["rss_peak_mb"] = rss_peak_mb()
+    print(json.dumps(result))
+
+
+# --- orchestration ---
+
+def git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5)
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    cfg = {
+        "pages": args.pages,
+        "page_words": args.page_words,
+        "sizes": [int(s) for s in args.sizes.split(",")],
+        "dim": args.dim,
+        "queries": args.queries,
+        "k": args.k,
+        "index_type": args.index_type,
+        "analyze_pages": args.analyze_pages,
+        "analyze_queries": args.analyze_queries,
+        "concurrency": args.concurrency,
+    }
+    names = [s for s in args.scenarios.split(",") if s]
+    unknown = set(names) - set(SCENARIOS)
+    if unknown:
+        raise SystemExit(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+    server = FakeOpenAIServer(
+        dim=args.dim,
+        embed_latency_s=args.embed_latency_ms / 1000,
+        embed_per_item_s=args.embed_per_item_ms / 1000,
+        responses_latency_s=args.llm_latency_ms / 1000,
+        jitter_s=args.jitter_ms / 1000,
+        error_rate=args.error_rate,
+    )
+    scenarios: Dict[str, Any] = {}
+
+    with server:
+        for name in names:
+            workdir = tempfile.mkdtemp(prefix=f"bench-{name}-")
+            env = {
+                "DATA_DIR": workdir,
+                "OPENAI_BASE_URL": server.base_url,
+                "OPENAI_API_KEY": "bench",
+                "EMBED_BACKEND": "openai",
+                "EMBED_CACHE": "0",
+                "LLM_CACHE": "0",
+                "TRACE_PATH": "",
+                "LOG_LEVEL": "WARNING",
+            }
+            try:
+                scenarios[name] = run_scenario(name, dict(cfg, workdir=workdir), env)
+            finally:
+                shutil.rmtree(workdir, ignore_errors=True)
+            print(f"{name}: {json.dumps(scenarios[name])}", file=sys.stderr)
+
+        server_stats = server.stats()
+
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "config": cfg,
+        },
+        "fake_server": {
+            "embed_latency_ms": args.embed_latency_ms,
+            "embed_per_item_ms": args.embed_per_item_ms,
+            "llm_latency_ms": args.llm_latency_ms,
+            "jitter_ms": args.jitter_ms,
+            "error_rate": args.error_rate,
+            **server_stats,
+        },
+        "scenarios": scenarios,
+    }
+
+
+def flatten(d: Any, prefix: str = "") -> Dict[str, float]:
+    out: Dict[str, float] = {}
+    if isinstance(d, dict):
+        for k, v in d.items():
+            out.update(flatten(v, f"{prefix}.{k}" if prefix else str(k)))
+    elif isinstance(d, list):
+        for i, v in enumerate(d):
+            key = f"{prefix}[{v.get('chunks', i)}]" if isinstance(v, dict) else f"{prefix}[{i}]"
+            out.update(flatten(v, key))
+    elif isinstance(d, (int, float)) and not isinstance(d, bool):
+        out[prefix] = float(d)
+    return out
+
+
+def compare(old: Dict[str, Any], new: Dict[str, Any]) -> List[str]:
+    """
+    One line per metric present in both runs' scenarios: old -> new (+x%).
+    """
+    a, b = flatten(old.get("scenarios", {})), flatten(new.get("scenarios", {}))
+    lines = []
+    for key in sorted(set(a) & set(b)):
+        change = (b[key] - a[key]) / a[key] * 100 if a[key] else 0.0
+        lines.append(f"{key:<48} {a[key]:>12g} -> {b[key]:<12g} {change:+.1f}%")
+    return lines
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Offline benchmark suite (fake OpenAI server)")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="Comma-separated subset of: " + ", ".join(SCENARIOS))
+    parser.add_argument("--pages", type=int, default=500, help="Pages to ingest (ingest)")
+    parser.add_argument("--page-words", type=int, default=400)
+    parser.add_argument("--sizes", default="1000,10000,100000", help="Corpus sizes in chunks (search)")
+    parser.add_argument("--dim", type=int, default=384, help="Embedding dimension")
+    parser.add_argument("--queries", type=int, default=200, help="Queries per corpus size (search)")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--index-type", default="flat")
+    parser.add_argument("--analyze-pages", type=int, default=50)
+    parser.add_argument("--analyze-queries", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=8, help="Batch analyze concurrency")
+    parser.add_argument("--embed-latency-ms", type=float, default=30.0)
+    parser.add_argument("--embed-per-item-ms", type=float, default=0.05)
+    parser.add_argument("--llm-latency-ms", type=float, default=200.0)
+    parser.add_argument("--jitter-ms", type=float, default=10.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Injected 500s (retried by the client)")
+    parser.add_argument("--out", default=None, help="Write results as JSON (default: stdout)")
+    parser.add_argument("--compare", default=None, help="Earlier results JSON to diff against")
+    parser.add_argument("--run-scenario", default=None, help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args()
+    if args.run_scenario:
+        scenario_main(args.run_scenario)
+        return
+
+    results = run(args)
+    text = json.dumps(results, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        print(f"Saved: {args.out}", file=sys.stderr)
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            print("\n".join(compare(json.load(f), results)), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
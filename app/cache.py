@@ -0,0 +1,106 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, Optional
+
+
+class DiskCache:
+    """
+    Small persistent key/value store on SQLite.
+    Size-bounded: once max_entries is exceeded the least recently used
+    rows are evicted. Optional ttl_seconds expires rows on read.
+    """
+
+    def __init__(self, path: str, max_entries: int = 100_000, ttl_seconds: Optional[float] = None):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            " key TEXT PRIMARY KEY,"
+            " value BLOB NOT NULL,"
+            " created REAL NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS cache_last_used ON cache(last_used)")
+        self._conn.commit()
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, bytes]:
+        keys = list(dict.fromkeys(keys))
+        if not keys:
+            return {}
+
+        now = time.time()
+        found: Dict[str, bytes] = {}
+        expired = []
+
+        with self._lock:
+            # SQLite caps bound parameters per statement; query in slices.
+            for i in range(0, len(keys), 500):
+                part = keys[i:i + 500]
+                marks = ",".join("?" * len(part))
+                rows = self._conn.execute(
+                    f"SELECT key, value, created FROM cache WHERE key IN ({marks})", part
+                ).fetchall()
+                for key, value, created in rows:
+                    if self.ttl_seconds is not None and now - created > self.ttl_seconds:
+                        expired.append(key)
+                    else:
+                        found[key] = value
+
+            if found:
+                self._conn.executemany(
+                    "UPDATE cache SET last_used = ? WHERE key = ?",
+                    [(now, k) for k in found],
+                )
+            if expired:
+                self._conn.executemany("DELETE FROM cache WHERE key = ?", [(k,) for k in expired])
+            self._conn.commit()
+
+        return found
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.get_many([key]).get(key)
+
+    def put_many(self, items: Dict[str, bytes]) -> None:
+        if not items:
+            return
+
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO cache (key, value, created, last_used) VALUES (?, ?, ?, ?)",
+                [(k, sqlite3.Binary(v), now, now) for k, v in items.items()],
+            )
+            self._evict()
+            self._conn.commit()
+
+    def put(self, key: str, value: bytes) -> None:
+        self.put_many({key: value})
+
+    def _evict(self) -> None:
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()
+        excess = count - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM cache WHERE key IN "
+                "(SELECT key FROM cache ORDER BY last_used ASC LIMIT ?)",
+                (excess,),
+            )
+
+    def __len__(self) -> int:
+        with self._lock:
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()
+        return count
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
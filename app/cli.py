@@ -1,59 +1,356 @@
+"""
+Command line entry point.
+
+Only argparse, app.config and app.tracing load at startup: each
+subcommand imports what it needs (openai, faiss, numpy, fitz, pydantic)
+when it runs, so `--help`, `stats` and policy refusals start fast. Keep
+heavy imports out of module level here; tests/test_startup.py enforces an
+import-time budget.
+"""
 import argparse
 import json
 import os
+import sys
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from app.config import (
+    CHUNKER,
+    CHUNKERS,
+    DATA_DIR,
+    INDEX_TYPE,
+    INDEX_TYPES,
+    ANALYZE_CONCURRENCY,
+    SERVE_HOST,
+    SERVE_PORT,
+    SERVE_MAX_CONCURRENCY,
+    SERVE_TIMEOUT_S,
+    RETRIEVAL_MODE,
+    RETRIEVAL_MODES,
+    EMBED_BACKEND,
+)
+from app.tracing import (
+    attribute_rates,
+    get_tracer,
+    histograms_from_spans,
+    prometheus_text,
+    read_trace,
+    summaries_jsonl,
+)
+
+if TYPE_CHECKING:
+    from app.ingest.embed_store import EmbedStats
+    from app.ingest.loaders import Page
+    from app.rag.retrieve import Retriever
+
+
+def chunk_rows(pages: Iterable["Page"], chunker: str = CHUNKER) -> Iterator[Dict[str, Any]]:
+    from app.ingest.chunking import iter_chunks, iter_token_chunks
+
+    chunks = iter_token_chunks(pages) if chunker == "tokens" else iter_chunks(pages)
+    for c in chunks:
+        yield c.row()
+
+
+def ingest_pdf(file_path: str, doc_id: str, chunker: str = CHUNKER) -> "EmbedStats":
+    from app.ingest.embed_store import upsert_document
+    from app.ingest.loaders import iter_pdf_pages
+
+    # Streaming: pages -> chunks -> rows are pulled lazily by the store update,
+    # so peak memory does not grow with PDF size.
+    pages = iter_pdf_pages(file_path, doc_id=doc_id)
+    return upsert_document(doc_id, chunk_rows(pages, chunker))
+
+
+def ingest_dir(
+    root: str,
+    workers: Optional[int] = None,
+    batch_docs: int = 64,
+    chunker: str = CHUNKER,
+) -> Tuple[int, "EmbedStats", List[str]]:
+    """
+    Ingest every PDF under root. Text extraction runs on a process pool;
+    finished documents are chunked and upserted batch_docs at a time.
+    doc_id is the path relative to root without extension (kept when two
+    files would otherwise share an id). Unreadable files are skipped.
+    Returns (documents ingested, stats, paths of skipped files).
+    """
+    from app.ingest.chunking import chunk_document, chunk_document_tokens
+    from app.ingest.embed_store import EmbedStats, upsert_documents
+    from app.ingest.loaders import doc_ids_for_paths, find_pdfs, load_pdfs_parallel
+
+    files = doc_ids_for_paths(find_pdfs(root), root)
+    failed: List[str] = []
+    total = EmbedStats()
+    # Per document: its text once plus chunk offsets; rows (and their text
+    # copies) are only built as the store update pulls them.
+    batch: Dict[str, Iterator[Dict[str, Any]]] = {}
+
+    def flush() -> None:
+        total.add(upsert_documents(batch))
+        batch.clear()
 
-from app.ingest.loaders import load_pdf
-from app.ingest.chunking import chunk_pages
-from app.ingest.embed_store import build_and_persist
-from app.rag.extract import analyze_document
-from app.eval.run import run_all
+    def on_error(path: str, doc_id: str, err: Exception) -> None:
+        failed.append(path)
 
+    for doc_id, pages in load_pdfs_parallel(files, workers=workers, on_error=on_error):
+        chunks = chunk_document_tokens(doc_id, pages) if chunker == "tokens" else chunk_document(doc_id, pages)
+        batch[doc_id] = chunks.rows()
+        if len(batch) >= batch_docs:
+            flush()
+    if batch:
+        flush()
 
-def ingest_pdf(file_path: str, doc_id: str) -> int:
-    pages = load_pdf(file_path, doc_id=doc_id)
-    chunks = chunk_pages(pages)
+    return len(files) - len(failed), total, failed
 
-    rows = [{
-        "doc_id": c.doc_id,
-        "chunk_id": c.chunk_id,
-        "page_num": c.page_num,
-        "text": c.text
-    } for c in chunks]
 
-    build_and_persist(rows)
-    return len(rows)
+def read_queries(path: str) -> List[Dict[str, Any]]:
+    """
+    JSONL, one query per line: {"query": "...", ...} or a bare JSON string.
+    Extra fields (e.g. an id) are passed through to the output.
+    """
+    items: List[Dict[str, Any]] = []
+    with open(path, "r", encoding="utf-8") as f:
+        for n, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            if isinstance(item, str):
+                item = {"query": item}
+            if not isinstance(item, dict) or not isinstance(item.get("query"), str):
+                raise SystemExit(f"{path}:{n}: expected an object with a 'query' string")
+            items.append(item)
+    return items
+
+
+def analyze_batch(
+    queries_file: str,
+    out: Optional[str],
+    top_k: int,
+    concurrency: int,
+    use_cache: bool,
+    retriever: Optional["Retriever"] = None,
+) -> int:
+    from app.rag.extract import analyze_documents
+
+    items = read_queries(queries_file)
+    results = analyze_documents(
+        [it["query"] for it in items],
+        top_k=top_k,
+        retriever=retriever,
+        use_cache=use_cache,
+        max_concurrency=concurrency,
+    )
+
+    lines = []
+    for item, r in zip(items, results):
+        row = dict(item)
+        if r.error is not None:
+            row["error"] = r.error
+        else:
+            row["result"] = r.result.model_dump()
+        lines.append(json.dumps(row, ensure_ascii=False))
+
+    if out:
+        with open(out, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + ("\n" if lines else ""))
+        print(f"Saved: {out}")
+    else:
+        print("\n".join(lines))
+
+    failed = sum(1 for r in results if r.error is not None)
+    # stderr, so stdout stays pure JSONL
+    print(f"queries={len(items)} failed={failed}", file=sys.stderr)
+    return 1 if failed else 0
+
+
+def trace_stats(path: str, fmt: str = "table") -> str:
+    """
+    Latency summary (count, p50/p95/p99, max per span name) of a trace file.
+    """
+    spans = list(read_trace(path))
+    summaries = {name: h.summary() for name, h in sorted(histograms_from_spans(spans).items())}
+
+    if fmt == "jsonl":
+        return summaries_jsonl(summaries)
+    if fmt == "prometheus":
+        return prometheus_text(summaries)
+
+    lines = [f"{'span':<14} {'count':>7} {'p50_ms':>10} {'p95_ms':>10} {'p99_ms':>10} {'max_ms':>10}"]
+    for name, sm in summaries.items():
+        lines.append(
+            f"{name:<14} {sm['count']:>7} {sm['p50_ms']:>10.1f} {sm['p95_ms']:>10.1f} "
+            f"{sm['p99_ms']:>10.1f} {sm['max_ms']:>10.1f}"
+        )
+    rates = attribute_rates(spans)
+    if rates:
+        lines.append("")
+        for name, attrs in rates.items():
+            lines.append(f"{name}: " + " ".join(f"{k}={v:.1%}" for k, v in attrs.items()))
+    return "\n".join(lines) + "\n"
 
 
 def main():
     parser = argparse.ArgumentParser(description="LLM Document Analysis Assistant")
     sub = parser.add_subparsers(dest="cmd", required=True)
 
-    p_ingest = sub.add_parser("ingest", help="Ingest a PDF and build FAISS index")
-    p_ingest.add_argument("--file", required=True, help="Path to PDF")
-    p_ingest.add_argument("--doc-id", default="doc", help="Document identifier")
+    p_ingest = sub.add_parser("ingest", help="Ingest PDFs into the FAISS index (adds or replaces doc_ids)")
+    src = p_ingest.add_mutually_exclusive_group(required=True)
+    src.add_argument("--file", help="Path to PDF")
+    src.add_argument("--dir", help="Directory of PDFs (recursive); doc_id = relative path")
+    p_ingest.add_argument("--doc-id", default="doc", help="Document identifier (with --file)")
+    p_ingest.add_argument("--workers", type=int, default=None, help="Extraction processes (with --dir)")
+    p_ingest.add_argument("--batch-docs", type=int, default=64, help="Documents per index update (with --dir)")
+    p_ingest.add_argument("--chunker", default=CHUNKER, choices=CHUNKERS,
+                          help="tokens: CHUNK_TOKENS per chunk at sentence boundaries; chars: 2200-char windows per page")
+
+    p_delete = sub.add_parser("delete", help="Remove a document from the index")
+    p_delete.add_argument("--doc-id", required=True, help="Document identifier")
+
+    p_reindex = sub.add_parser("reindex", help="Rebuild faiss.index (as another index type or embedding backend) and the lexical index")
+    p_reindex.add_argument("--index-type", default=INDEX_TYPE, choices=INDEX_TYPES)
+
+    sub.add_parser("migrate", help="Convert a legacy data/chunks.jsonl into the binary chunk store")
 
     p_analyze = sub.add_parser("analyze", help="Analyze using RAG + JSON extraction")
-    p_analyze.add_argument("--query", required=True)
+    queries = p_analyze.add_mutually_exclusive_group(required=True)
+    queries.add_argument("--query")
+    queries.add_argument("--queries-file", help="JSONL of queries; writes JSONL results")
     p_analyze.add_argument("--top-k", type=int, default=5)
+    p_analyze.add_argument("--mode", default=RETRIEVAL_MODE, choices=RETRIEVAL_MODES,
+                           help="Retrieval: dense vectors, BM25 keywords (no embeddings call) or both fused")
     p_analyze.add_argument("--out", default=None, help="Path to save JSON output")
+    p_analyze.add_argument("--stream", action="store_true",
+                           help="Stream the extraction; print fields to stderr as they complete")
+    p_analyze.add_argument("--concurrency", type=int, default=ANALYZE_CONCURRENCY,
+                           help="Parallel LLM extractions (with --queries-file)")
+    p_analyze.add_argument("--no-cache", action="store_true", help="Bypass the LLM response cache")
+    p_analyze.add_argument("--trace", default=None, help="Append pipeline spans as JSONL to this file")
+
+    p_serve = sub.add_parser("serve", help="Serve analyze over local HTTP")
+    p_serve.add_argument("--host", default=SERVE_HOST)
+    p_serve.add_argument("--port", type=int, default=SERVE_PORT)
+    p_serve.add_argument("--max-concurrency", type=int, default=SERVE_MAX_CONCURRENCY,
+                         help="Analyses in flight at once")
+    p_serve.add_argument("--timeout", type=float, default=SERVE_TIMEOUT_S, help="Per-request timeout, seconds")
+    p_serve.add_argument("--mode", default=RETRIEVAL_MODE, choices=RETRIEVAL_MODES, help="Retrieval mode")
+    p_serve.add_argument("--trace", default=None, help="Append pipeline spans as JSONL to this file")
 
     p_eval = sub.add_parser("eval", help="Run basic eval suite")
     p_eval.add_argument("--top-k", type=int, default=5)
+    p_eval.add_argument("--no-cache", action="store_true", help="Bypass the LLM response cache")
+    p_eval.add_argument("--trace", default=None, help="Append pipeline spans as JSONL to this file")
+    p_eval.add_argument("--concurrency", type=int, default=ANALYZE_CONCURRENCY, help="Cases run in parallel")
+    cassette = p_eval.add_mutually_exclusive_group()
+    cassette.add_argument("--record", default=None, metavar="CASSETTE",
+                          help="Record embeddings and LLM responses to this file")
+    cassette.add_argument("--replay", default=None, metavar="CASSETTE",
+                          help="Replay a recorded cassette offline (no API calls)")
+    p_eval.add_argument("--report", default=None, help="Write a JSON report with per-case timings")
+
+    p_stats = sub.add_parser("stats", help="Summarize per-stage latency from a trace file")
+    p_stats.add_argument("trace_file", help="JSONL written by --trace or TRACE_PATH")
+    p_stats.add_argument("--format", default="table", choices=("table", "jsonl", "prometheus"))
 
     args = parser.parse_args()
 
+    if getattr(args, "trace", None):
+        get_tracer().set_path(args.trace)
+
     if args.cmd == "ingest":
-        if not os.path.exists(args.file):
-            raise SystemExit(f"File not found: {args.file}")
+        from app.ingest.embed_store import engine_stats
+
+        if args.dir:
+            if not os.path.isdir(args.dir):
+                raise SystemExit(f"Directory not found: {args.dir}")
+
+            n_docs, stats, failed = ingest_dir(
+                args.dir, workers=args.workers, batch_docs=args.batch_docs, chunker=args.chunker
+            )
+            print(
+                f"docs={n_docs} chunks={stats.chunks} duplicates={stats.duplicates} "
+                f"replaced={stats.replaced} failed={len(failed)}"
+            )
+            for path in failed:
+                print(f"failed: {path}", file=sys.stderr)
+        else:
+            if not os.path.exists(args.file):
+                raise SystemExit(f"File not found: {args.file}")
+
+            stats = ingest_pdf(args.file, args.doc_id, args.chunker)
+            print(
+                f"doc_id={args.doc_id} chunks={stats.chunks} duplicates={stats.duplicates} replaced={stats.replaced}"
+            )
+
+        print(f"embedding_cache: hits={stats.cache_hits} misses={stats.cache_misses}")
+
+        if EMBED_BACKEND == "openai":
+            es = engine_stats()
+            print(
+                f"embedding_api: requests={es.requests} retries={es.retries} "
+                f"max_in_flight={es.max_in_flight} chunks_per_s={es.chunks_per_s:.1f}"
+            )
+        else:
+            print(f"embedding_backend={EMBED_BACKEND}")
+        print("Saved: data/chunks.bin, data/chunks.idx")
+        print("Saved: data/faiss.index, data/index_meta.json, data/lexical.npz")
+
+    elif args.cmd == "delete":
+        from app.ingest.embed_store import delete_document
 
-        n = ingest_pdf(args.file, args.doc_id)
+        n = delete_document(args.doc_id)
+        print(f"doc_id={args.doc_id} removed_chunks={n}")
 
-        print(f"doc_id={args.doc_id} chunks={n}")
-        print("Saved: data/chunks.jsonl")
-        print("Saved: data/faiss.index")
+    elif args.cmd == "reindex":
+        from app.ingest.embed_store import reindex
+
+        n = reindex(args.index_type)
+        print(f"index_type={args.index_type} vectors={n} embedding_backend={EMBED_BACKEND}")
+        print("Saved: data/faiss.index, data/index_meta.json, data/lexical.npz")
+
+    elif args.cmd == "migrate":
+        from app.ingest.chunk_store import migrate_jsonl
+
+        if migrate_jsonl(DATA_DIR):
+            print("Migrated: data/chunks.jsonl -> data/chunks.bin + data/chunks.idx (original kept as .bak)")
+        else:
+            print("Nothing to migrate")
 
     elif args.cmd == "analyze":
-        result = analyze_document(args.query, top_k=args.top_k)
+        from app.rag.extract import analyze_document
+
+        # With the default mode, analyze_document loads the shared retriever
+        # (faiss, numpy, the index) only once a query passes the policy gate.
+        retriever = None
+        if args.mode != RETRIEVAL_MODE:
+            from app.rag.retrieve import Retriever
+            retriever = Retriever(mode=args.mode)
+        if args.queries_file:
+            if not os.path.exists(args.queries_file):
+                raise SystemExit(f"File not found: {args.queries_file}")
+            raise SystemExit(analyze_batch(
+                args.queries_file,
+                args.out,
+                top_k=args.top_k,
+                concurrency=args.concurrency,
+                use_cache=not args.no_cache,
+                retriever=retriever,
+            ))
+
+        on_field = None
+        if args.stream:
+            def on_field(name: str, value: Any) -> None:
+                shown = value.model_dump() if hasattr(value, "model_dump") else value
+                if isinstance(shown, list):
+                    shown = [v.model_dump() if hasattr(v, "model_dump") else v for v in shown]
+                print(f"[field] {name}: {json.dumps(shown, ensure_ascii=False)}", file=sys.stderr, flush=True)
+
+        result = analyze_document(
+            args.query,
+            top_k=args.top_k,
+            retriever=retriever,
+            use_cache=not args.no_cache,
+            on_field=on_field,
+        )
         payload = result.model_dump()
 
         if args.out:
@@ -62,8 +359,40 @@ def main():
             print(f"Saved: {args.out}")
         else:
             print(json.dumps(payload, ensure_ascii=False, indent=2))
+    elif args.cmd == "serve":
+        import asyncio
+
+        from app.serve import serve_forever
+
+        print(f"Serving on http://{args.host}:{args.port} (POST /analyze, GET /health, GET /metrics)")
+        try:
+            asyncio.run(serve_forever(args.host, args.port, args.max_concurrency, args.timeout, args.mode))
+        except KeyboardInterrupt:
+            pass
+
     elif args.cmd == "eval":
-        raise SystemExit(run_all(top_k=args.top_k))
+        from app.eval.cassette import Cassette
+        from app.eval.run import run_all
+
+        cassette = None
+        if args.record:
+            cassette = Cassette(args.record, "record")
+        elif args.replay:
+            if not os.path.exists(args.replay):
+                raise SystemExit(f"File not found: {args.replay}")
+            cassette = Cassette(args.replay, "replay")
+        raise SystemExit(run_all(
+            top_k=args.top_k,
+            use_cache=not args.no_cache,
+            concurrency=args.concurrency,
+            cassette=cassette,
+            report_path=args.report,
+        ))
+
+    elif args.cmd == "stats":
+        if not os.path.exists(args.trace_file):
+            raise SystemExit(f"File not found: {args.trace_file}")
+        sys.stdout.write(trace_stats(args.trace_file, args.format))
 
 
 if __name__ == "__main__":
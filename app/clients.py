@@ -0,0 +1,236 @@
+"""
+Shared OpenAI API clients.
+
+One sync and one async client per process, used by ingest, retrieval and
+extraction alike:
+- one HTTP connection pool with keep-alive (OPENAI_MAX_CONNECTIONS,
+  OPENAI_KEEPALIVE_S), so bursts reuse warm connections
+- one timeout and retry policy (OPENAI_TIMEOUT_S, OPENAI_MAX_RETRIES)
+- single-flight coalescing: while a request is in flight, identical
+  requests (same endpoint and arguments, e.g. the same query embedding or
+  prompt) wait for it and share its response instead of calling the API
+  again. Streamed calls are never coalesced.
+
+Built on first use: importing this module does not import openai.
+"""
+import asyncio
+import hashlib
+import json
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from app.config import (
+    OPENAI_API_KEY,
+    OPENAI_TIMEOUT_S,
+    OPENAI_MAX_RETRIES,
+    OPENAI_MAX_CONNECTIONS,
+    OPENAI_KEEPALIVE_S,
+)
+
+# Endpoints whose create() calls are coalesced.
+COALESCED_ENDPOINTS = ("embeddings", "responses")
+
+
+def request_key(endpoint: str, kwargs: Dict[str, Any]) -> str:
+    """
+    Identity of an API request: endpoint + canonical JSON of its arguments.
+    """
+    blob = json.dumps({"endpoint": endpoint, **kwargs}, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class SingleFlight:
+    """
+    do(key, fn): the first caller for key runs fn; callers arriving while it
+    runs block and get the same result (or exception). Thread-safe.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, Future] = {}
+        self.calls = 0
+        self.shared = 0
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            fut = self._calls.get(key)
+            leader = fut is None
+            if leader:
+                fut = self._calls[key] = Future()
+                self.calls += 1
+            else:
+                self.shared += 1
+
+        if not leader:
+            return fut.result()
+
+        try:
+            result = fn()
+        except BaseException as e:
+            self._finish(key)
+            fut.set_exception(e)
+            raise
+        self._finish(key)
+        fut.set_result(result)
+        return result
+
+    def _finish(self, key: str) -> None:
+        with self._lock:
+            del self._calls[key]
+
+
+class AsyncSingleFlight:
+    """
+    SingleFlight for coroutines. The call runs as its own task, so a caller
+    that is cancelled (e.g. a request timeout) does not cancel it for the
+    others waiting on it.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Tuple[asyncio.AbstractEventLoop, str], asyncio.Task] = {}
+        self.calls = 0
+        self.shared = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        slot = (asyncio.get_running_loop(), key)
+        task = self._calls.get(slot)
+        if task is None:
+            task = self._calls[slot] = asyncio.ensure_future(fn())
+
+            def done(t: asyncio.Task) -> None:
+                self._calls.pop(slot, None)
+                if not t.cancelled():
+                    t.exception()  # mark retrieved, even if every caller gave up
+
+            task.add_done_callback(done)
+            self.calls += 1
+        else:
+            self.shared += 1
+        return await asyncio.shield(task)
+
+
+class _Endpoint:
+    def __init__(self, resource: Any, name: str, flight: SingleFlight):
+        self._resource = resource
+        self._name = name
+        self._flight = flight
+
+    def create(self, **kwargs: Any) -> Any:
+        if kwargs.get("stream"):
+            return self._resource.create(**kwargs)
+        return self._flight.do(request_key(self._name, kwargs), lambda: self._resource.create(**kwargs))
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._resource, name)
+
+
+class _AsyncEndpoint(_Endpoint):
+    async def create(self, **kwargs: Any) -> Any:
+        if kwargs.get("stream"):
+            return await self._resource.create(**kwargs)
+        return await self._flight.do(request_key(self._name, kwargs), lambda: self._resource.create(**kwargs))
+
+
+class CoalescingClient:
+    """
+    Wraps an OpenAI / AsyncOpenAI client: embeddings.create and
+    responses.create go through flight, everything else passes through.
+    """
+
+    def __init__(self, client: Any, flight: Any):
+        self.client = client
+        self.flight = flight
+        endpoint = _AsyncEndpoint if isinstance(flight, AsyncSingleFlight) else _Endpoint
+        for name in COALESCED_ENDPOINTS:
+            setattr(self, name, endpoint(getattr(client, name), name, flight))
+
+    def with_options(self, **options: Any) -> "CoalescingClient":
+        # Same connection pool and in-flight table, other per-request options.
+        return CoalescingClient(self.client.with_options(**options), self.flight)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.client, name)
+
+
+_lock = threading.Lock()
+_client: Optional[CoalescingClient] = None
+_aclient: Optional[CoalescingClient] = None
+_flight = SingleFlight()
+_aflight = AsyncSingleFlight()
+
+
+def _http_client(is_async: bool) -> Any:
+    try:
+        import httpx
+    except ImportError:  # SDK builds that ship their HTTP stack as httpx2
+        import httpx2 as httpx
+
+    limits = httpx.Limits(
+        max_connections=OPENAI_MAX_CONNECTIONS,
+        max_keepalive_connections=OPENAI_MAX_CONNECTIONS,
+        keepalive_expiry=OPENAI_KEEPALIVE_S,
+    )
+    timeout = httpx.Timeout(OPENAI_TIMEOUT_S, connect=min(5.0, OPENAI_TIMEOUT_S))
+    cls = httpx.AsyncClient if is_async else httpx.Client
+    return cls(limits=limits, timeout=timeout, follow_redirects=True)
+
+
+def _require_key() -> None:
+    # Clients assigned by callers (fakes, cassettes) never get here.
+    if not OPENAI_API_KEY:
+        raise RuntimeError("OPENAI_API_KEY is missing. Add it to .env")
+
+
+def get_openai_client() -> CoalescingClient:
+    """
+    The process-wide sync client.
+    """
+    global _client
+    if _client is None:
+        _require_key()
+        with _lock:
+            if _client is None:
+                from openai import OpenAI
+                _client = CoalescingClient(
+                    OpenAI(
+                        api_key=OPENAI_API_KEY,
+                        timeout=OPENAI_TIMEOUT_S,
+                        max_retries=OPENAI_MAX_RETRIES,
+                        http_client=_http_client(is_async=False),
+                    ),
+                    _flight,
+                )
+    return _client
+
+
+def get_async_openai_client() -> CoalescingClient:
+    """
+    The process-wide async client.
+    """
+    global _aclient
+    if _aclient is None:
+        _require_key()
+        with _lock:
+            if _aclient is None:
+                from openai import AsyncOpenAI
+                _aclient = CoalescingClient(
+                    AsyncOpenAI(
+                        api_key=OPENAI_API_KEY,
+                        timeout=OPENAI_TIMEOUT_S,
+                        max_retries=OPENAI_MAX_RETRIES,
+                        http_client=_http_client(is_async=True),
+                    ),
+                    _aflight,
+                )
+    return _aclient
+
+
+def coalescing_stats() -> Dict[str, int]:
+    """
+    Network calls made vs. requests served by joining an in-flight call.
+    """
+    return {
+        "calls": _flight.calls + _aflight.calls,
+        "shared": _flight.shared + _aflight.shared,
+    }
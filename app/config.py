@@ -7,3 +7,81 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
 EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
 DATA_DIR = os.getenv("DATA_DIR", "data")
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+
+# Chunking: chars (fixed character windows per page) | tokens (token budget,
+# cut at sentence/paragraph boundaries, may span pages)
+CHUNKERS = ("chars", "tokens")
+CHUNKER = os.getenv("CHUNKER", "tokens").lower()
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", "800"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "48"))
+
+# Near-duplicate chunks within a document: embedded and indexed once,
+# repeats kept as locations of the kept chunk
+DEDUP_ENABLED = os.getenv("DEDUP", "1") != "0"
+DEDUP_SIMILARITY = float(os.getenv("DEDUP_SIMILARITY", "0.9"))
+
+# Embedding cache (content-addressed by model + chunk text hash)
+EMBED_CACHE_ENABLED = os.getenv("EMBED_CACHE", "1") != "0"
+EMBED_CACHE_MAX_ENTRIES = int(os.getenv("EMBED_CACHE_MAX_ENTRIES", "200000"))
+
+# Embedding engine: requests kept in flight, token budget per request, retries
+EMBED_MAX_IN_FLIGHT = int(os.getenv("EMBED_MAX_IN_FLIGHT", "4"))
+EMBED_BATCH_TOKENS = int(os.getenv("EMBED_BATCH_TOKENS", "100000"))
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "6"))
+
+# Streaming ingest: chunks per embedding batch in the pipeline
+INGEST_BATCH_CHUNKS = int(os.getenv("INGEST_BATCH_CHUNKS", "256"))
+
+# Vector index: flat | ivf | hnsw | ivfpq, plus build/search knobs
+INDEX_TYPES = ("flat", "ivf", "hnsw", "ivfpq")
+INDEX_TYPE = os.getenv("INDEX_TYPE", "flat").lower()
+INDEX_TRAIN_SIZE = int(os.getenv("INDEX_TRAIN_SIZE", "50000"))
+IVF_NLIST = int(os.getenv("IVF_NLIST", "1024"))
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", "16"))
+IVFPQ_M = int(os.getenv("IVFPQ_M", "64"))
+HNSW_M = int(os.getenv("HNSW_M", "32"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "200"))
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "64"))
+
+# LLM response cache (keyed by model + system + prompt + generation params)
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE", "1") != "0"
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "10000"))
+LLM_CACHE_TTL_S = float(os.getenv("LLM_CACHE_TTL_S", str(7 * 24 * 3600))) or None
+
+# Batch analyze: concurrent LLM extractions
+ANALYZE_CONCURRENCY = int(os.getenv("ANALYZE_CONCURRENCY", "8"))
+
+# Local HTTP serving (app.cli serve)
+SERVE_HOST = os.getenv("SERVE_HOST", "127.0.0.1")
+SERVE_PORT = int(os.getenv("SERVE_PORT", "8000"))
+SERVE_MAX_CONCURRENCY = int(os.getenv("SERVE_MAX_CONCURRENCY", "256"))
+SERVE_TIMEOUT_S = float(os.getenv("SERVE_TIMEOUT_S", "60"))
+
+# Prompt context budget, in model tokens
+MAX_CONTEXT_TOKENS = int(os.getenv("MAX_CONTEXT_TOKENS", "3000"))
+
+# Exact token counts with tiktoken (optional) only when its cache dir is set:
+# tiktoken downloads encodings it has not cached there
+TIKTOKEN_CACHE_DIR = os.getenv("TIKTOKEN_CACHE_DIR", "")
+
+# Retrieval: vector (dense) | lexical (BM25, no network) | hybrid (RRF of both)
+RETRIEVAL_MODES = ("vector", "lexical", "hybrid")
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "vector").lower()
+RRF_K = int(os.getenv("RRF_K", "60"))
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "50"))
+
+# Embedding backend: openai | local (CPU model via sentence-transformers) | hashing (offline, deterministic)
+EMBED_BACKEND = os.getenv("EMBED_BACKEND", "openai").lower()
+LOCAL_EMBED_MODEL = os.getenv("LOCAL_EMBED_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+LOCAL_EMBED_BATCH = int(os.getenv("LOCAL_EMBED_BATCH", "64"))
+LOCAL_EMBED_THREADS = int(os.getenv("LOCAL_EMBED_THREADS", "0"))
+HASH_EMBED_DIM = int(os.getenv("HASH_EMBED_DIM", "512"))
+
+# Tracing: append every pipeline span as JSONL to this file ("" = off)
+TRACE_PATH = os.getenv("TRACE_PATH", "")
+
+# Shared OpenAI client (app.clients): one connection pool, timeout and retry policy
+OPENAI_TIMEOUT_S = float(os.getenv("OPENAI_TIMEOUT_S", "60"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "2"))
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "256"))
+OPENAI_KEEPALIVE_S = float(os.getenv("OPENAI_KEEPALIVE_S", "30"))
@@ -1,4 +1,4 @@
-from typing import List
+from typing import List, Tuple
 from app.rag.schema import DocumentSummary
 from app.rag.extract import analyze_document
 
@@ -32,7 +32,31 @@ def run_basic_eval(result: DocumentSummary) -> List[str]:
     return errors
 
 
-def eval_refusal_cases(cases, top_k: int = 5) -> int:
+def check_refusal(case, doc) -> Tuple[bool, str]:
+    """
+    Checks one adversarial / policy case against its result.
+    Returns (ok, reason for failure).
+    """
+    expected_refusal = case["expected_refusal"]
+    expected_reason = case.get("reason")
+
+    got_refusal = getattr(doc, "refusal", None)
+    got_reason = getattr(doc, "refusal_reason", None)
+
+    # Check refusal flag
+    if got_refusal is None:
+        return False, "missing 'refusal' field in output"
+    if got_refusal != expected_refusal:
+        return False, f"expected_refusal={expected_refusal} got={got_refusal}"
+
+    # Check refusal reason if applicable
+    if expected_refusal and expected_reason and got_reason != expected_reason:
+        return False, f"expected_reason={expected_reason} got={got_reason}"
+
+    return True, ""
+
+
+def eval_refusal_cases(cases, top_k: int = 5, retriever=None, use_cache: bool = True) -> int:
     """
     Runs adversarial / policy eval cases.
     Returns number of failed cases.
@@ -40,39 +64,13 @@ def eval_refusal_cases(cases, top_k: int = 5) -> int:
     failed = 0
 
     for c in cases:
-        doc = analyze_document(query=c["query"], top_k=top_k)
-
-        expected_refusal = c["expected_refusal"]
-        expected_reason = c.get("reason")
-
-        got_refusal = getattr(doc, "refusal", None)
-        got_reason = getattr(doc, "refusal_reason", None)
-
-        ok = True
-
-        # Check refusal flag
-        if got_refusal is None:
-            ok = False
-            print(f"[FAIL] {c['id']} missing 'refusal' field in output")
-        elif got_refusal != expected_refusal:
-            ok = False
-            print(
-                f"[FAIL] {c['id']} expected_refusal={expected_refusal} "
-                f"got={got_refusal}"
-            )
-
-        # Check refusal reason if applicable
-        if ok and expected_refusal and expected_reason:
-            if got_reason != expected_reason:
-                ok = False
-                print(
-                    f"[FAIL] {c['id']} expected_reason={expected_reason} "
-                    f"got={got_reason}"
-                )
+        doc = analyze_document(query=c["query"], top_k=top_k, retriever=retriever, use_cache=use_cache)
+        ok, why = check_refusal(c, doc)
 
         if ok:
-            print(f"[PASS] {c['id']} refusal={got_refusal}")
+            print(f"[PASS] {c['id']} refusal={doc.refusal}")
         else:
+            print(f"[FAIL] {c['id']} {why}")
             failed += 1
 
     return failed
@@ -0,0 +1,196 @@
+"""
+Record/replay of the OpenAI calls made during an eval run.
+
+    cassette = Cassette("data/eval.cassette.jsonl", "record")   # or "replay"
+    with use_cassette(cassette):
+        ...  # embeddings.create / responses.create go through the cassette
+
+Recording wraps the real clients and stores every response, keyed by
+endpoint + request arguments (model, input, params). Replay serves those
+responses with no network and no API key, so a regression eval is fast
+and gives the same result every run. A request the cassette has not seen
+(changed prompt, retrieved context or model) raises CassetteMiss instead
+of going to the API.
+
+Streamed responses are recorded whole (every event) and replayed as a
+stream. The async clients support non-streamed calls only, which is all
+the pipeline makes on them.
+"""
+import json
+import os
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from openai.types import CreateEmbeddingResponse
+from openai.types.responses import Response, ResponseStreamEvent
+from pydantic import TypeAdapter
+
+from app.clients import get_async_openai_client, get_openai_client, request_key
+
+CASSETTE_MODES = ("record", "replay")
+
+_RESPONSE_TYPES = {"embeddings": CreateEmbeddingResponse, "responses": Response}
+_stream_event = TypeAdapter(ResponseStreamEvent)
+
+
+class CassetteMiss(RuntimeError):
+    pass
+
+
+class Cassette:
+    def __init__(self, path: str, mode: str):
+        if mode not in CASSETTE_MODES:
+            raise ValueError(f"Unknown cassette mode: {mode} (expected one of {CASSETTE_MODES})")
+        self.path = path
+        self.mode = mode
+        self.entries: Dict[str, Any] = {}
+        self.hits = 0
+        self.recorded = 0
+        self._lock = threading.Lock()
+
+        if mode == "replay":
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"Cassette not found: {path} (record one with eval --record)")
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.entries[entry["key"]] = entry["response"]
+
+    @staticmethod
+    def key(endpoint: str, kwargs: Dict[str, Any]) -> str:
+        return request_key(endpoint, kwargs)
+
+    def lookup(self, endpoint: str, kwargs: Dict[str, Any]) -> Any:
+        key = self.key(endpoint, kwargs)
+        with self._lock:
+            if key not in self.entries:
+                raise CassetteMiss(
+                    f"No recorded {endpoint} response for this request in {self.path}; "
+                    "the prompt, retrieved context or model changed since recording. Re-record with eval --record"
+                )
+            self.hits += 1
+            return self.entries[key]
+
+    def store(self, endpoint: str, kwargs: Dict[str, Any], response: Any) -> None:
+        with self._lock:
+            self.entries[self.key(endpoint, kwargs)] = response
+            self.recorded += 1
+
+    def save(self) -> None:
+        """
+        Writes all entries, sorted by key so re-recording an unchanged run
+        gives an identical file.
+        """
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = self.path + ".tmp"
+        with self._lock, open(tmp, "w", encoding="utf-8") as f:
+            for key in sorted(self.entries):
+                f.write(json.dumps({"key": key, "response": self.entries[key]}, ensure_ascii=False) + "\n")
+        os.replace(tmp, self.path)
+
+
+class _ReplayStream:
+    """
+    Iterates recorded stream events; close() like the SDK's Stream.
+    """
+
+    def __init__(self, events: List[Dict[str, Any]]):
+        self._events = iter([_stream_event.validate_python(e) for e in events])
+
+    def __iter__(self):
+        return self._events
+
+    def close(self) -> None:
+        pass
+
+
+def _decode(endpoint: str, kwargs: Dict[str, Any], payload: Any) -> Any:
+    if kwargs.get("stream"):
+        return _ReplayStream(payload)
+    return _RESPONSE_TYPES[endpoint].model_validate(payload)
+
+
+class _Endpoint:
+    def __init__(self, cassette: Cassette, name: str, real: Optional[Callable[[], Any]]):
+        self.cassette = cassette
+        self.name = name
+        self._real = real
+
+    @property
+    def real(self) -> Any:
+        return getattr(self._real(), self.name)
+
+    def create(self, **kwargs: Any) -> Any:
+        if self.cassette.mode == "replay":
+            return _decode(self.name, kwargs, self.cassette.lookup(self.name, kwargs))
+
+        resp = self.real.create(**kwargs)
+        if kwargs.get("stream"):
+            # Record the whole stream, even if the caller stops early.
+            try:
+                payload = [event.model_dump(mode="json") for event in resp]
+            finally:
+                resp.close()
+        else:
+            payload = resp.model_dump(mode="json")
+        self.cassette.store(self.name, kwargs, payload)
+        return _decode(self.name, kwargs, payload)
+
+
+class _AsyncEndpoint(_Endpoint):
+    async def create(self, **kwargs: Any) -> Any:
+        if kwargs.get("stream"):
+            raise NotImplementedError("Cassettes do not support streamed calls on the async client")
+        if self.cassette.mode == "replay":
+            return _decode(self.name, kwargs, self.cassette.lookup(self.name, kwargs))
+
+        payload = (await self.real.create(**kwargs)).model_dump(mode="json")
+        self.cassette.store(self.name, kwargs, payload)
+        return _decode(self.name, kwargs, payload)
+
+
+class CassetteClient:
+    """
+    Stands in for OpenAI / AsyncOpenAI: .embeddings.create and
+    .responses.create. real returns the real client; it is only called
+    (and only needed) when a call is recorded.
+    """
+
+    def __init__(self, cassette: Cassette, real: Optional[Callable[[], Any]] = None, is_async: bool = False):
+        endpoint = _AsyncEndpoint if is_async else _Endpoint
+        self.embeddings = endpoint(cassette, "embeddings", real)
+        self.responses = endpoint(cassette, "responses", real)
+
+
+def _real(assigned: Any, shared: Callable[[], Any]) -> Callable[[], Any]:
+    # A module's own client if one was assigned, else the shared one, built on first call.
+    return (lambda: assigned) if assigned is not None else shared
+
+
+@contextmanager
+def use_cassette(cassette: Cassette) -> Iterator[Cassette]:
+    """
+    Routes the pipeline's query embeddings and LLM calls through cassette;
+    a recording is saved on exit.
+    """
+    from app.rag import extract, retrieve
+
+    modules = (retrieve, extract)
+    saved = [(m, m.client, m.aclient) for m in modules]
+    recording = cassette.mode == "record"
+    for m, sync_client, async_client in saved:
+        real, areal = (None, None)
+        if recording:
+            real, areal = _real(sync_client, get_openai_client), _real(async_client, get_async_openai_client)
+        m.client = CassetteClient(cassette, real)
+        m.aclient = CassetteClient(cassette, areal, is_async=True)
+    try:
+        yield cassette
+    finally:
+        for m, sync_client, async_client in saved:
+            m.client = sync_client
+            m.aclient = async_client
+        if recording:
+            cassette.save()
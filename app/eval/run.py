@@ -1,69 +1,182 @@
+import contextlib
+import contextvars
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.config import ANALYZE_CONCURRENCY
 from app.eval.cases import EVAL_CASES
 from app.eval.adversarial_cases import ADVERSARIAL_CASES
-from app.eval.basic_eval import eval_refusal_cases
-from app.rag.extract import analyze_document
-
-
-def run_all(top_k: int = 5) -> int:
-    passed = 0
-    total = 0
-
-    # --- Regular eval cases ---
-    for case in EVAL_CASES:
-        name = case["name"]
-        query = case["query"]
-        checks = case.get("checks", {})
-
-        total += 1
-
-        try:
-            doc = analyze_document(query=query, top_k=top_k)
-            data = doc.model_dump()
-        except Exception as e:
-            print(f"[ERROR] {name}: {e}")
-            continue
-
-        # If we got a refusal for a normal eval, treat it as a failure
-        if data.get("refusal") is True:
-            print(f"[FAIL] {name} (refused)")
-            continue
-
-        ok = True
-
-        if checks.get("email_contains_at"):
-            email = data.get("email")
-            ok = ok and ((email is None) or ("@" in email))
-
-        if "skills_min_len" in checks:
-            ok = ok and (len(data.get("skills") or []) >= checks["skills_min_len"])
-
-        if "experience_max_highlights" in checks:
-            for exp in (data.get("experience") or []):
-                ok = ok and (len(exp.get("highlights") or []) <= checks["experience_max_highlights"])
-
-        # NOTE:
-        # must_not_invent currently cannot be strongly verified unless you check a concrete field
-        # (e.g. phone) or compare against source text. Keep as a placeholder if you want.
-        if checks.get("must_not_invent"):
-            ok = ok and True
-
-        print(f"[{'PASS' if ok else 'FAIL'}] {name}")
-        if ok:
-            passed += 1
-
-    # --- Policy / adversarial cases (run ONCE) ---
+from app.eval.basic_eval import check_refusal
+from app.eval.cassette import Cassette, use_cassette
+from app.rag.extract import analyze_document, policy_refusal
+from app.rag.retrieve import Retriever, get_retriever
+
+
+@dataclass
+class CaseResult:
+    name: str
+    kind: str  # "eval" | "adversarial"
+    passed: bool
+    ms: float
+    path: str = "pipeline"  # "policy": answered by the policy gate, no retrieval or LLM call
+    detail: str = ""
+    error: Optional[str] = None
+
+
+def check_case(case: Dict[str, Any], data: Dict[str, Any]) -> Tuple[bool, str]:
+    """
+    Checks one regular eval case against its result.
+    Returns (ok, reason for failure).
+    """
+    # If we got a refusal for a normal eval, treat it as a failure
+    if data.get("refusal") is True:
+        return False, "refused"
+
+    checks = case.get("checks", {})
+
+    if checks.get("email_contains_at"):
+        email = data.get("email")
+        if email is not None and "@" not in email:
+            return False, f"email without @: {email}"
+
+    if "skills_min_len" in checks:
+        n = len(data.get("skills") or [])
+        if n < checks["skills_min_len"]:
+            return False, f"skills={n} < {checks['skills_min_len']}"
+
+    if "experience_max_highlights" in checks:
+        for exp in (data.get("experience") or []):
+            n = len(exp.get("highlights") or [])
+            if n > checks["experience_max_highlights"]:
+                return False, f"highlights={n} > {checks['experience_max_highlights']}"
+
+    # NOTE:
+    # must_not_invent currently cannot be strongly verified unless you check a concrete field
+    # (e.g. phone) or compare against source text. Keep as a placeholder if you want.
+    return True, ""
+
+
+def all_cases() -> List[Tuple[str, str, Dict[str, Any]]]:
+    """
+    (kind, name, case) for the regular and the policy / adversarial cases.
+    """
+    return [("eval", c["name"], c) for c in EVAL_CASES] + [("adversarial", c["id"], c) for c in ADVERSARIAL_CASES]
+
+
+def _check(kind: str, case: Dict[str, Any], doc) -> Tuple[bool, str]:
+    if kind == "adversarial":
+        return check_refusal(case, doc)
+    return check_case(case, doc.model_dump())
+
+
+def _run_case(kind: str, name: str, case: Dict[str, Any], top_k: int, retriever: Retriever, use_cache: bool) -> CaseResult:
+    t0 = time.perf_counter()
     try:
-        fails_adv = eval_refusal_cases(ADVERSARIAL_CASES, top_k=top_k)
+        doc = analyze_document(query=case["query"], top_k=top_k, retriever=retriever, use_cache=use_cache)
     except Exception as e:
-        # If adversarial eval crashes, count it as all failed (safer).
-        print(f"[ERROR] adversarial_eval: {e}")
-        fails_adv = len(ADVERSARIAL_CASES)
-
-    adv_total = len(ADVERSARIAL_CASES)
-    adv_passed = adv_total - fails_adv
-
-    passed += adv_passed
-    total += adv_total
+        ms = (time.perf_counter() - t0) * 1000
+        return CaseResult(name, kind, passed=False, ms=ms, error=f"{type(e).__name__}: {e}")
+
+    ok, detail = _check(kind, case, doc)
+    return CaseResult(name, kind, passed=ok, ms=(time.perf_counter() - t0) * 1000, detail=detail)
+
+
+def run_cases(
+    top_k: int = 5,
+    retriever: Optional[Retriever] = None,
+    use_cache: bool = True,
+    concurrency: int = ANALYZE_CONCURRENCY,
+) -> List[CaseResult]:
+    """
+    Runs every case; results come back in case order. Queries the policy
+    gate refuses are answered right away, the rest run through
+    analyze_document on up to `concurrency` threads. A failing case
+    records its error instead of stopping the run.
+    """
+    cases = all_cases()
+    results: List[Optional[CaseResult]] = [None] * len(cases)
+    pending: List[int] = []
+
+    # --- POLICY FAST PATH ---
+    for i, (kind, name, case) in enumerate(cases):
+        t0 = time.perf_counter()
+        refusal = policy_refusal(case["query"])
+        if refusal is None:
+            pending.append(i)
+            continue
+        ok, detail = _check(kind, case, refusal)
+        results[i] = CaseResult(name, kind, passed=ok, ms=(time.perf_counter() - t0) * 1000, path="policy", detail=detail)
+
+    # --- FULL PIPELINE (concurrent) ---
+    if pending:
+        retriever = retriever or get_retriever()
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+            futures = {
+                i: pool.submit(contextvars.copy_context().run, _run_case, *cases[i], top_k, retriever, use_cache)
+                for i in pending
+            }
+            for i, fut in futures.items():
+                results[i] = fut.result()
+
+    return results
+
+
+def format_result(r: CaseResult) -> str:
+    status = "ERROR" if r.error else ("PASS" if r.passed else "FAIL")
+    line = f"[{status}] {r.name} {r.ms:.0f} ms" + (" (policy)" if r.path == "policy" else "")
+    why = r.error or r.detail
+    return line + (f": {why}" if why else "")
+
+
+def run_all(
+    top_k: int = 5,
+    use_cache: bool = True,
+    concurrency: int = ANALYZE_CONCURRENCY,
+    cassette: Optional[Cassette] = None,
+    report_path: Optional[str] = None,
+    retriever: Optional[Retriever] = None,
+) -> int:
+    """
+    Runs the eval suite and prints one line per case with its latency.
+    With a cassette, embeddings and LLM calls are recorded to it or
+    replayed from it (the LLM cache is bypassed, so a recording captures
+    every call). report_path: JSON report with per-case timings.
+    """
+    if cassette is not None:
+        use_cache = False
+
+    # One resident index for the whole run instead of a reload per case.
+    retriever = retriever or get_retriever()
+
+    t0 = time.perf_counter()
+    with use_cassette(cassette) if cassette is not None else contextlib.nullcontext():
+        results = run_cases(top_k=top_k, retriever=retriever, use_cache=use_cache, concurrency=concurrency)
+    elapsed = time.perf_counter() - t0
+
+    for r in results:
+        print(format_result(r))
+
+    passed = sum(r.passed for r in results)
+    total = len(results)
+    print(f"\nResult: {passed}/{total} passed in {elapsed:.2f}s")
+    if cassette is not None:
+        print(f"Cassette ({cassette.mode}): {cassette.path} hits={cassette.hits} recorded={cassette.recorded}")
+
+    if report_path:
+        report = {
+            "passed": passed,
+            "total": total,
+            "elapsed_s": round(elapsed, 3),
+            "cassette": cassette.mode if cassette is not None else None,
+            "cases": [dict(asdict(r), ms=round(r.ms, 1)) for r in results],
+        }
+        os.makedirs(os.path.dirname(report_path) or ".", exist_ok=True)
+        with open(report_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Saved: {report_path}")
 
-    print(f"\nResult: {passed}/{total} passed")
     return 0 if passed == total else 1
@@ -0,0 +1,452 @@
+"""
+Random-access chunk store.
+
+Layout (all under DATA_DIR):
+- chunks.bin        append-only blob; one UTF-8 JSON row per record.
+                    Compaction writes the next generation as chunks.<n>.bin
+- chunks.idx        fixed-width records (RECORD dtype), sorted by vector_id,
+                    after a header record naming the blob generation
+- chunks.docs.json  doc_id table; records refer to docs by ordinal. Also
+                    keeps next_id, so ids of deleted rows are never reused
+- chunks.dups       fixed-width (canonical, alias) vector_id pairs (DUP
+                    dtype), sorted by canonical: near-duplicate chunks
+                    (app.ingest.dedup) are stored as alias records, with
+                    their location and dup_of but no text or vector
+
+Readers memory-map chunks.idx and chunks.bin, so fetching the top-k rows
+is k binary searches plus k small json.loads, with no parsing of the rest.
+doc_id / page_num filters are vectorized over the idx columns; an alias
+matching a filter selects its canonical record.
+
+Writers append new rows to the blob and publish a new chunks.idx by
+write-then-rename; deleted rows simply disappear from the idx and their
+bytes are reclaimed by compaction. The idx says which blob its offsets
+point into, so a reader always pairs an idx with its own blob: a
+compacted blob gets a new name, the idx pointing at it is published, and
+only then is the old blob removed.
+"""
+import glob
+import json
+import mmap
+import os
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+import numpy as np
+
+from app.config import DATA_DIR
+
+RECORD = np.dtype([
+    ("vector_id", "<i8"),
+    ("offset", "<i8"),
+    ("length", "<i4"),
+    ("page_num", "<i4"),
+    ("doc", "<i4"),
+])
+
+DUP = np.dtype([
+    ("canonical", "<i8"),
+    ("alias", "<i8"),
+])
+
+BLOB_NAME = "chunks.bin"
+IDX_NAME = "chunks.idx"
+DOCS_NAME = "chunks.docs.json"
+DUPS_NAME = "chunks.dups"
+LEGACY_JSONL_NAME = "chunks.jsonl"
+
+# Compact the blob once dead bytes outweigh live ones.
+COMPACT_GARBAGE_RATIO = 0.5
+
+# vector_id of the idx header record; its offset is the blob generation.
+# An idx without one (older stores) points at generation 0, chunks.bin.
+HEADER_ID = -1
+
+# A reader that loses the race with a compaction (its blob was just
+# removed) re-reads the idx this many times.
+OPEN_RETRIES = 3
+
+
+def store_paths(data_dir: str = DATA_DIR) -> Dict[str, str]:
+    return {
+        "blob": os.path.join(data_dir, BLOB_NAME),
+        "idx": os.path.join(data_dir, IDX_NAME),
+        "docs": os.path.join(data_dir, DOCS_NAME),
+        "dups": os.path.join(data_dir, DUPS_NAME),
+        "jsonl": os.path.join(data_dir, LEGACY_JSONL_NAME),
+    }
+
+
+def blob_path(data_dir: str, generation: int) -> str:
+    return os.path.join(data_dir, BLOB_NAME if generation == 0 else f"chunks.{generation}.bin")
+
+
+def blob_files(data_dir: str = DATA_DIR) -> List[str]:
+    """
+    Blobs of every generation present (normally just the current one).
+    """
+    paths = glob.glob(os.path.join(glob.escape(data_dir), "chunks.*.bin"))
+    return sorted(paths + [p for p in [blob_path(data_dir, 0)] if os.path.exists(p)])
+
+
+def store_exists(data_dir: str = DATA_DIR) -> bool:
+    paths = store_paths(data_dir)
+    return all(os.path.exists(paths[k]) for k in ("idx", "docs"))
+
+
+def _split_header(records: np.ndarray) -> Tuple[np.ndarray, int]:
+    """
+    (records without the header, blob generation).
+    """
+    if len(records) and records[0]["vector_id"] == HEADER_ID:
+        return records[1:], int(records[0]["offset"])
+    return records, 0
+
+
+def _read_docs_table(path: str) -> Dict[str, Any]:
+    if not os.path.exists(path):
+        return {"docs": []}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _read_docs(path: str) -> List[str]:
+    return _read_docs_table(path)["docs"]
+
+
+def _read_dups(path: str) -> np.ndarray:
+    if not os.path.exists(path):
+        return np.zeros(0, dtype=DUP)
+    return np.fromfile(path, dtype=DUP)
+
+
+LOCATION_FIELDS = ("doc_id", "chunk_id", "page_num", "page_end")
+
+
+def location(row: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: row[k] for k in LOCATION_FIELDS if k in row}
+
+
+def _header(generation: int) -> bytes:
+    return np.array([(HEADER_ID, generation, 0, 0, 0)], dtype=RECORD).tobytes()
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+class ChunkStoreReader:
+    """
+    Read-only, memory-mapped snapshot of the store.
+    """
+
+    def __init__(self, data_dir: str = DATA_DIR):
+        paths = store_paths(data_dir)
+
+        self.docs: List[str] = _read_docs(paths["docs"])
+        self._doc_ordinals = {d: i for i, d in enumerate(self.docs)}
+        self.dups = _read_dups(paths["dups"])
+        self._by_alias: Optional[np.ndarray] = None
+
+        self._blob: Optional[mmap.mmap] = None
+        for attempt in range(OPEN_RETRIES + 1):
+            if os.path.getsize(paths["idx"]) > 0:
+                records = np.memmap(paths["idx"], dtype=RECORD, mode="r")
+            else:
+                records = np.zeros(0, dtype=RECORD)
+            self.records, self.generation = _split_header(records)
+            try:
+                f = open(blob_path(data_dir, self.generation), "rb")
+            except FileNotFoundError:
+                # Compacted away after we read the idx: the new idx names its successor.
+                if attempt == OPEN_RETRIES:
+                    raise
+                continue
+            with f:
+                if os.fstat(f.fileno()).st_size > 0:
+                    self._blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            break
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    @property
+    def vectors(self) -> int:
+        """
+        Records with a vector (in faiss.index and the lexical index), i.e.
+        all but the duplicate aliases.
+        """
+        return len(self.records) - len(self.dups)
+
+    def _row(self, rec: np.void) -> Dict[str, Any]:
+        start = int(rec["offset"])
+        return json.loads(self._blob[start:start + int(rec["length"])])
+
+    def get(self, vector_id: int) -> Optional[Dict[str, Any]]:
+        ids = self.records["vector_id"]
+        pos = int(np.searchsorted(ids, vector_id))
+        if pos >= len(ids) or ids[pos] != vector_id:
+            return None
+        return self._row(self.records[pos])
+
+    def get_many(self, vector_ids: Iterable[int]) -> List[Optional[Dict[str, Any]]]:
+        return [self.get(v) for v in vector_ids]
+
+    def ids_matching(
+        self,
+        doc_id: Optional[str] = None,
+        page_num: Optional[int] = None,
+    ) -> np.ndarray:
+        """
+        vector_ids of records matching the metadata filters.
+        """
+        mask = np.ones(len(self.records), dtype=bool)
+        if doc_id is not None:
+            ordinal = self._doc_ordinals.get(doc_id)
+            if ordinal is None:
+                return np.zeros(0, dtype=np.int64)
+            mask &= self.records["doc"] == ordinal
+        if page_num is not None:
+            mask &= self.records["page_num"] == page_num
+        return self.canonical_ids(np.asarray(self.records["vector_id"][mask], dtype=np.int64))
+
+    def canonical_ids(self, ids: np.ndarray) -> np.ndarray:
+        """
+        ids with every alias replaced by its canonical vector_id (sorted, unique).
+        """
+        if not len(self.dups) or not len(ids):
+            return ids
+        if self._by_alias is None:
+            self._by_alias = np.sort(self.dups, order="alias")
+        aliases = self._by_alias["alias"]
+        pos = np.minimum(np.searchsorted(aliases, ids), len(aliases) - 1)
+        hit = aliases[pos] == ids
+        return np.unique(np.where(hit, self._by_alias["canonical"][pos], ids))
+
+    def aliases(self, vector_id: int) -> np.ndarray:
+        canonical = self.dups["canonical"]
+        lo, hi = np.searchsorted(canonical, vector_id, side="left"), np.searchsorted(canonical, vector_id, side="right")
+        return np.asarray(self.dups["alias"][lo:hi], dtype=np.int64)
+
+    def locations(self, vector_id: int) -> List[Dict[str, Any]]:
+        """
+        Where the chunk vector_id occurs: its own location, then those of
+        its duplicates (doc_id, chunk_id, page_num[, page_end]).
+        """
+        rows = self.get_many([vector_id] + self.aliases(vector_id).tolist())
+        return [location(r) for r in rows if r is not None]
+
+    def iter_rows(self) -> Iterator[Dict[str, Any]]:
+        for rec in self.records:
+            yield self._row(rec)
+
+    def vector_ids(self) -> np.ndarray:
+        ids = np.asarray(self.records["vector_id"], dtype=np.int64)
+        if not len(self.dups):
+            return ids
+        return ids[~np.isin(ids, self.dups["alias"])]
+
+    def iter_vector_rows(self) -> Iterator[Dict[str, Any]]:
+        """
+        Rows with a vector, in vector_id order (what faiss.index holds).
+        """
+        for row in self.iter_rows():
+            if "dup_of" not in row:
+                yield row
+
+    def close(self) -> None:
+        if self._blob is not None:
+            self._blob.close()
+            self._blob = None
+
+
+class ChunkStoreWriter:
+    """
+    Stages an update: remove_docs() and append() record changes in memory
+    (only the fixed-width idx records, never row text); commit() publishes
+    the new idx atomically. New row bytes go straight to the blob.
+    """
+
+    def __init__(self, data_dir: str = DATA_DIR):
+        self.data_dir = data_dir
+        self.paths = store_paths(data_dir)
+        os.makedirs(data_dir, exist_ok=True)
+
+        table = _read_docs_table(self.paths["docs"])
+        self.docs: List[str] = table["docs"]
+        self._doc_ordinals = {d: i for i, d in enumerate(self.docs)}
+
+        if os.path.exists(self.paths["idx"]):
+            self.records, self.generation = _split_header(np.fromfile(self.paths["idx"], dtype=RECORD))
+        else:
+            self.records, self.generation = np.zeros(0, dtype=RECORD), 0
+        # Stores written before next_id was kept fall back to the highest live id.
+        last = int(self.records["vector_id"].max()) if len(self.records) else -1
+        self._next_id = max(int(table.get("next_id", 0)), last + 1)
+        self._new: List[tuple] = []
+        self.dups = _read_dups(self.paths["dups"])
+        self._new_dups: List[tuple] = []
+        self._retired: List[str] = []
+
+        self._blob = open(blob_path(data_dir, self.generation), "ab")
+        self._blob_end = self._blob.seek(0, os.SEEK_END)
+
+    @property
+    def next_id(self) -> int:
+        return self._next_id
+
+    def remove_docs(self, doc_ids: Set[str]) -> np.ndarray:
+        """
+        Drops every record of doc_ids. Returns their vector_ids.
+        """
+        ordinals = [self._doc_ordinals[d] for d in doc_ids if d in self._doc_ordinals]
+        if not ordinals:
+            return np.zeros(0, dtype=np.int64)
+
+        mask = np.isin(self.records["doc"], ordinals)
+        removed = np.asarray(self.records["vector_id"][mask], dtype=np.int64)
+        self.records = self.records[~mask]
+        if len(self.dups):
+            keep = ~(np.isin(self.dups["alias"], removed) | np.isin(self.dups["canonical"], removed))
+            self.dups = self.dups[keep]
+        return removed
+
+    def append(self, row: Dict[str, Any]) -> None:
+        """
+        row must carry a vector_id not already in the store. A row with
+        dup_of is an alias of that (earlier) vector_id.
+        """
+        data = json.dumps(row, ensure_ascii=False).encode("utf-8")
+        self._blob.write(data)
+
+        doc_id = row["doc_id"]
+        if doc_id not in self._doc_ordinals:
+            self._doc_ordinals[doc_id] = len(self.docs)
+            self.docs.append(doc_id)
+
+        self._new.append((row["vector_id"], self._blob_end, len(data), row["page_num"], self._doc_ordinals[doc_id]))
+        self._blob_end += len(data)
+        self._next_id = max(self._next_id, row["vector_id"] + 1)
+        if "dup_of" in row:
+            self._new_dups.append((row["dup_of"], row["vector_id"]))
+
+    def commit(self) -> None:
+        self._blob.close()
+
+        if self._new:
+            self.records = np.concatenate([self.records, np.array(self._new, dtype=RECORD)])
+            self._new = []
+
+        ids = self.records["vector_id"]
+        if len(ids) > 1 and not np.all(ids[1:] > ids[:-1]):
+            self.records = np.sort(self.records, order="vector_id")
+
+        live = int(self.records["length"].sum())
+        if self._blob_end and (self._blob_end - live) / self._blob_end > COMPACT_GARBAGE_RATIO:
+            self._compact()
+
+        if self._new_dups:
+            self.dups = np.concatenate([self.dups, np.array(self._new_dups, dtype=DUP)])
+            self._new_dups = []
+        self.dups = np.sort(self.dups, order=["canonical", "alias"])
+
+        table = {"docs": self.docs, "next_id": self._next_id}
+        _write_atomic(self.paths["docs"], json.dumps(table, ensure_ascii=False).encode("utf-8"))
+        if len(self.dups) or os.path.exists(self.paths["dups"]):
+            _write_atomic(self.paths["dups"], self.dups.tobytes())
+        _write_atomic(self.paths["idx"], _header(self.generation) + self.records.tobytes())
+
+        # Only now that no new reader can pick the old blob: existing
+        # readers keep their mapping of it after the unlink.
+        for path in self._retired:
+            os.remove(path)
+        self._retired = []
+
+    def abort(self) -> None:
+        # Bytes already appended are unreferenced and get reclaimed by compaction.
+        self._blob.close()
+        self._new = []
+        self._new_dups = []
+
+    def _compact(self) -> None:
+        """
+        Copies the live records into the next generation's blob. The old
+        blob stays in place until commit() has published the idx that
+        points at the new one.
+        """
+        old = blob_path(self.data_dir, self.generation)
+        new = blob_path(self.data_dir, self.generation + 1)
+        tmp = new + ".tmp"
+        offsets = np.zeros(len(self.records), dtype=np.int64)
+        pos = 0
+
+        with open(old, "rb") as src, open(tmp, "wb") as dst:
+            for i, rec in enumerate(self.records):
+                src.seek(int(rec["offset"]))
+                dst.write(src.read(int(rec["length"])))
+                offsets[i] = pos
+                pos += int(rec["length"])
+
+        self.records["offset"] = offsets
+        os.replace(tmp, new)
+        self.generation += 1
+        self._retired.append(old)
+        self._blob_end = pos
+
+
+def publish_store(src_dir: str, dst_dir: str = DATA_DIR) -> None:
+    """
+    Moves the store committed in src_dir over the one in dst_dir (same
+    filesystem). Its blob takes a generation the live idx does not point
+    at, the idx is published last, and only then are the old blobs
+    removed, so a reader opens either the old store or the new one whole.
+    """
+    src, dst = store_paths(src_dir), store_paths(dst_dir)
+    records, src_generation = _split_header(np.fromfile(src["idx"], dtype=RECORD))
+    generation = src_generation
+    if os.path.exists(dst["idx"]):
+        live = _split_header(np.fromfile(dst["idx"], dtype=RECORD))[1]
+        generation = max(generation, live + 1)
+
+    blob = blob_path(dst_dir, generation)
+    os.replace(blob_path(src_dir, src_generation), blob)
+    if os.path.exists(src["dups"]):
+        os.replace(src["dups"], dst["dups"])
+    elif os.path.exists(dst["dups"]):
+        _write_atomic(dst["dups"], b"")
+    os.replace(src["docs"], dst["docs"])
+    _write_atomic(dst["idx"], _header(generation) + records.tobytes())
+
+    for path in blob_files(dst_dir):
+        if path != blob:
+            os.remove(path)
+
+
+def migrate_jsonl(data_dir: str = DATA_DIR) -> bool:
+    """
+    One-time conversion of a legacy chunks.jsonl into the binary store.
+    Rows without vector_id get their position (what the old flat index used).
+    The original file is kept as chunks.jsonl.bak. Returns True if migrated.
+    """
+    paths = store_paths(data_dir)
+    if store_exists(data_dir) or not os.path.exists(paths["jsonl"]):
+        return False
+
+    # Fresh files; a half-finished earlier attempt is simply overwritten.
+    for path in [paths[k] for k in ("idx", "docs", "dups")] + blob_files(data_dir):
+        if os.path.exists(path):
+            os.remove(path)
+
+    w = ChunkStoreWriter(data_dir)
+    with open(paths["jsonl"], "r", encoding="utf-8") as f:
+        for i, line in enumerate(f):
+            if line.strip():
+                r = json.loads(line)
+                r.setdefault("vector_id", i)
+                w.append(r)
+    w.commit()
+
+    os.replace(paths["jsonl"], paths["jsonl"] + ".bak")
+    return True
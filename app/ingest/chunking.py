@@ -1,14 +1,215 @@
-from dataclasses import dataclass
-from typing import List
+"""
+Chunking over a compact, zero-copy representation.
+
+Two chunkers (CHUNKER):
+- chars: fixed chunk_size-character windows per page with a character
+  overlap (chunk_document, iter_chunks)
+- tokens: chunks of up to CHUNK_TOKENS tokens cut at sentence and
+  paragraph boundaries, with whole sentences as overlap; chunks may span
+  page breaks and record the pages they cover (chunk_document_tokens,
+  iter_token_chunks)
+
+A document's page texts live in one TextBuffer (pages joined by "\\n",
+plus each page's start offset), and a chunk is only offsets into it:
+- Chunk: a __slots__ view (buffer, page, start, end, index); .text
+  slices the buffer only when read
+- DocChunks: every chunk of a document as parallel arrays, 24 bytes per
+  chunk; rows() materializes store rows one at a time
+
+So the overlap between neighbouring chunks is never stored twice, and no
+per-chunk string or dict exists until embedding (or display) needs it.
+"""
+import re
+from array import array
+from bisect import bisect_right
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from app.config import CHUNK_OVERLAP_TOKENS, CHUNK_TOKENS, CHUNKER
 from app.ingest.loaders import Page
+from app.tokens import CHARS_PER_TOKEN, estimate_tokens
+
+PAGE_SEP = "\n"
+
+
+class TextBuffer:
+    """
+    One document's page texts as a single string. page_starts[i] is the
+    offset of page i; page_nums[i] its 1-based page number.
+    """
+
+    __slots__ = ("doc_id", "text", "page_nums", "page_starts")
+
+    def __init__(self, doc_id: str, text: str, page_nums: Sequence[int], page_starts: Sequence[int]):
+        self.doc_id = doc_id
+        self.text = text
+        self.page_nums = array("I", page_nums)
+        self.page_starts = array("q", page_starts)
+
+    @classmethod
+    def from_pages(cls, doc_id: str, pages: Sequence[Page]) -> "TextBuffer":
+        starts, pos = [], 0
+        for p in pages:
+            starts.append(pos)
+            pos += len(p.text) + len(PAGE_SEP)
+        # A single page is used as-is (str.join returns the lone item).
+        return cls(doc_id, PAGE_SEP.join(p.text for p in pages), [p.page_num for p in pages], starts)
+
+    def page_bounds(self, i: int) -> Tuple[int, int]:
+        start = self.page_starts[i]
+        end = self.page_starts[i + 1] - len(PAGE_SEP) if i + 1 < len(self.page_starts) else len(self.text)
+        return start, end
+
+    def page_at(self, pos: int) -> int:
+        """
+        Index of the page containing offset pos.
+        """
+        return max(0, bisect_right(self.page_starts, pos) - 1)
+
+    def carry(self, pos: int, page: Page) -> "TextBuffer":
+        """
+        New buffer of text[pos:] (with its pages) followed by page.
+        """
+        first = self.page_at(pos)
+        head = self.text[pos:]
+        starts = [0] + [s - pos for s in self.page_starts[first + 1:]]
+        nums = list(self.page_nums[first:])
+        if head:
+            starts.append(len(head) + len(PAGE_SEP))
+            head += PAGE_SEP
+        else:
+            starts, nums = [0], []
+        nums.append(page.page_num)
+        return TextBuffer(self.doc_id, head + page.text, nums, starts)
 
 
-@dataclass
 class Chunk:
-    doc_id: str
-    chunk_id: str
-    page_num: int
-    text: str
+    """
+    View of one chunk: text, chunk_id etc. are derived from the buffer on
+    access.
+    """
+
+    __slots__ = ("buffer", "page", "start", "end", "index", "last")
+
+    def __init__(self, buffer: TextBuffer, page: int, start: int, end: int, index: int, last: Optional[int] = None):
+        self.buffer = buffer
+        self.page = page  # index into buffer.page_nums
+        self.start = start
+        self.end = end
+        self.index = index  # chunk number within its page (chars) or document (tokens)
+        self.last = page if last is None else last  # page index of the chunk's end
+
+    @property
+    def doc_id(self) -> str:
+        return self.buffer.doc_id
+
+    @property
+    def page_num(self) -> int:
+        return self.buffer.page_nums[self.page]
+
+    @property
+    def page_end(self) -> int:
+        return self.buffer.page_nums[self.last]
+
+    @property
+    def chunk_id(self) -> str:
+        return f"{self.buffer.doc_id}-p{self.page_num}-c{self.index}"
+
+    @property
+    def text(self) -> str:
+        return self.buffer.text[self.start:self.end]
+
+    def row(self) -> Dict[str, Any]:
+        row = {"doc_id": self.doc_id, "chunk_id": self.chunk_id, "page_num": self.page_num, "text": self.text}
+        if self.last != self.page:
+            row["page_end"] = self.page_end  # only for chunks spanning pages
+        return row
+
+    def __repr__(self) -> str:
+        return f"Chunk({self.chunk_id!r}, {self.start}:{self.end})"
+
+
+class DocChunks:
+    """
+    All chunks of one document: the TextBuffer plus parallel arrays of
+    (page, start, end, index, last page).
+    """
+
+    __slots__ = ("buffer", "pages", "starts", "ends", "indexes", "lasts")
+
+    def __init__(self, buffer: TextBuffer):
+        self.buffer = buffer
+        self.pages = array("I")
+        self.starts = array("q")
+        self.ends = array("q")
+        self.indexes = array("I")
+        self.lasts = array("I")
+
+    def append(self, page: int, start: int, end: int, index: int, last: int) -> None:
+        self.pages.append(page)
+        self.starts.append(start)
+        self.ends.append(end)
+        self.indexes.append(index)
+        self.lasts.append(last)
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def __getitem__(self, i: int) -> Chunk:
+        return Chunk(self.buffer, self.pages[i], self.starts[i], self.ends[i], self.indexes[i], self.lasts[i])
+
+    def __iter__(self) -> Iterator[Chunk]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def rows(self) -> Iterator[Dict[str, Any]]:
+        """
+        Store rows ({doc_id, chunk_id, page_num, text}), built lazily.
+        """
+        for c in self:
+            yield c.row()
+
+
+def window_spans(text: str, lo: int, hi: int, chunk_size: int, overlap: int) -> Iterator[Tuple[int, int, int]]:
+    """
+    (start, end, index) of fixed-size windows over text[lo:hi], trimmed of
+    surrounding whitespace without copying; empty windows are skipped but
+    still numbered. Same windows as slicing + .strip() per chunk.
+    """
+    start = lo
+    idx = 0
+    while start < hi:
+        end = min(start + chunk_size, hi)
+        s, e = start, end
+        while s < e and text[s].isspace():
+            s += 1
+        while e > s and text[e - 1].isspace():
+            e -= 1
+        if s < e:
+            yield s, e, idx
+
+        idx += 1
+        if end == hi:
+            break
+        start = max(lo, end - overlap)
+
+
+def chunk_document(
+    doc_id: str,
+    pages: Sequence[Page],
+    chunk_size: int = 2200,
+    overlap: int = 250
+) -> DocChunks:
+    """
+    Chunks of one document; the page texts are copied once into the
+    document's TextBuffer, so pages can be dropped afterwards.
+    """
+    doc = DocChunks(TextBuffer.from_pages(doc_id, pages))
+    buf = doc.buffer
+    for i in range(len(buf.page_starts)):
+        lo, hi = buf.page_bounds(i)
+        for s, e, idx in window_spans(buf.text, lo, hi, chunk_size, overlap):
+            doc.append(i, s, e, idx, i)
+    return doc
 
 
 def chunk_pages(
@@ -16,29 +217,254 @@ def chunk_pages(
     chunk_size: int = 2200,
     overlap: int = 250
 ) -> List[Chunk]:
-    chunks: List[Chunk] = []
+    return list(iter_chunks(pages, chunk_size=chunk_size, overlap=overlap))
+
 
+def iter_chunks(
+    pages: Iterable[Page],
+    chunk_size: int = 2200,
+    overlap: int = 250
+) -> Iterator[Chunk]:
+    """
+    Generator form of chunk_pages: consumes pages lazily, one page at a time.
+    Each chunk is a view into its page's text.
+    """
     for p in pages:
-        text = p.text
-        start = 0
-        idx = 0
-
-        while start < len(text):
-            end = min(start + chunk_size, len(text))
-            chunk_text = text[start:end].strip()
-
-            if chunk_text:
-                chunk_id = f"{p.doc_id}-p{p.page_num}-c{idx}"
-                chunks.append(Chunk(
-                    doc_id=p.doc_id,
-                    chunk_id=chunk_id,
-                    page_num=p.page_num,
-                    text=chunk_text
-                ))
-
-            idx += 1
-            if end == len(text):
-                break
-            start = max(0, end - overlap)
-
-    return chunks
+        buf = TextBuffer(p.doc_id, p.text, [p.page_num], [0])
+        for s, e, idx in window_spans(p.text, 0, len(p.text), chunk_size, overlap):
+            yield Chunk(buf, 0, s, e, idx)
+
+
+# --- token-budgeted chunking ---
+
+# Strength of the boundary after a segment; cuts prefer the strongest.
+WORD, SENTENCE, PARAGRAPH = 0, 1, 2
+
+# A chunk is cut at the strongest boundary that leaves it at least this
+# full (fraction of max_tokens), the latest such boundary on ties.
+MIN_FILL = 0.5
+
+_BOUNDARY_RE = re.compile(
+    r"(?P<para>\s*\n\s*)"                     # page break / blank line
+    r"|(?<=[.!?…])[\"'”’)\]]*(?P<sent>\s+)"   # end of sentence
+    r"|(?P<item>\s+)(?=[●•▪◦■])"              # list bullet
+)
+_WORD_RE = re.compile(r"\S+")
+
+# (start, end, tokens, strength of the boundary after it)
+Segment = Tuple[int, int, int, int]
+
+
+def _split_long(
+    text: str,
+    start: int,
+    end: int,
+    strength: int,
+    max_tokens: int,
+    count: Callable[[str], int],
+) -> Iterator[Segment]:
+    """
+    Pieces of at most max_tokens of an over-long sentence, cut between
+    words (or inside a word longer than the budget).
+    """
+    lo, hi, tokens = start, start, 0
+    for m in _WORD_RE.finditer(text, start, end):
+        ws, we = m.span()
+        n = count(m.group())
+        if n > max_tokens:
+            if tokens:
+                yield lo, hi, tokens, WORD
+            step = max_tokens * CHARS_PER_TOKEN
+            for s in range(ws, we, step):
+                lo, hi = s, min(s + step, we)
+                tokens = count(text[lo:hi])
+                if hi < we:
+                    yield lo, hi, tokens, WORD
+            continue
+        if tokens and tokens + n > max_tokens:
+            yield lo, hi, tokens, WORD
+            tokens = 0
+        if not tokens:
+            lo = ws
+        tokens += n
+        hi = we
+    if tokens:
+        yield lo, hi, tokens, strength
+
+
+def segments(
+    text: str,
+    lo: int,
+    hi: int,
+    max_tokens: int,
+    count: Callable[[str], int] = estimate_tokens,
+) -> Iterator[Segment]:
+    """
+    Sentences of text[lo:hi] (whitespace around them excluded), each with
+    its token count and the boundary that follows it; sentences over
+    max_tokens are split between words.
+    """
+    pos = lo
+    for m in _BOUNDARY_RE.finditer(text, lo, hi):
+        group = m.lastgroup
+        gap = m.start(group)
+        if gap > pos:
+            strength = PARAGRAPH if group == "para" else SENTENCE
+            yield from _segment(text, pos, gap, strength, max_tokens, count)
+        pos = m.end()
+    if hi > pos:
+        yield from _segment(text, pos, hi, PARAGRAPH, max_tokens, count)
+
+
+def _segment(
+    text: str,
+    start: int,
+    end: int,
+    strength: int,
+    max_tokens: int,
+    count: Callable[[str], int],
+) -> Iterator[Segment]:
+    n = count(text[start:end])
+    if n <= max_tokens:
+        yield start, end, n, strength
+    else:
+        yield from _split_long(text, start, end, strength, max_tokens, count)
+
+
+class TokenPacker:
+    """
+    Greedy single-pass packing of segments into chunks of at most
+    max_tokens. When the next segment does not fit, the pending chunk is
+    cut at its strongest boundary past MIN_FILL; what follows the cut
+    carries over. Up to overlap_tokens of trailing whole sentences are
+    repeated at the start of the next chunk, except after a paragraph
+    (or page) break.
+    """
+
+    def __init__(self, max_tokens: int, overlap_tokens: int):
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+        self.pending: List[Segment] = []
+        self.tokens = 0
+        self.repeated = 0  # leading pending segments already emitted (overlap)
+
+    def add(self, seg: Segment) -> Iterator[Tuple[int, int]]:
+        """
+        Adds seg; yields (start, end) of the chunks this completes.
+        """
+        while len(self.pending) > self.repeated and self.tokens + seg[2] > self.max_tokens:
+            yield self._cut(seg[2])
+        if self.repeated and self.tokens + seg[2] > self.max_tokens:
+            self._drop_overlap()
+        self.pending.append(seg)
+        self.tokens += seg[2]
+
+    def flush(self) -> Iterator[Tuple[int, int]]:
+        if len(self.pending) > self.repeated:
+            yield self.pending[0][0], self.pending[-1][1]
+        self.pending, self.tokens, self.repeated = [], 0, 0
+
+    def shift(self, offset: int) -> None:
+        """
+        Moves pending segments by -offset (their text was re-based).
+        """
+        self.pending = [(s - offset, e - offset, n, b) for s, e, n, b in self.pending]
+
+    def _cut_point(self) -> int:
+        best, best_key, cum = len(self.pending), None, 0
+        floor = MIN_FILL * self.max_tokens
+        for i, (_, _, n, strength) in enumerate(self.pending, start=1):
+            cum += n
+            if i > self.repeated and cum >= floor and (best_key is None or strength >= best_key):
+                best, best_key = i, strength
+        return best
+
+    def _cut(self, incoming: int) -> Tuple[int, int]:
+        n = self._cut_point()
+        out, rest = self.pending[:n], self.pending[n:]
+
+        overlap: List[Segment] = []
+        if out[-1][3] != PARAGRAPH:
+            budget = self.overlap_tokens
+            for seg in reversed(out[max(1, self.repeated):]):
+                if seg[2] > budget:
+                    break
+                overlap.insert(0, seg)
+                budget -= seg[2]
+            # Repeat only what fits next to the carried-over text.
+            if sum(seg[2] for seg in overlap + rest) + incoming > self.max_tokens:
+                overlap = []
+        self.pending = overlap + rest
+        self.tokens = sum(seg[2] for seg in self.pending)
+        self.repeated = len(overlap)
+        return out[0][0], out[-1][1]
+
+    def _drop_overlap(self) -> None:
+        self.pending = self.pending[self.repeated:]
+        self.tokens = sum(seg[2] for seg in self.pending)
+        self.repeated = 0
+
+
+def chunk_document_tokens(
+    doc_id: str,
+    pages: Sequence[Page],
+    max_tokens: int = CHUNK_TOKENS,
+    overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+    cross_pages: bool = True,
+    count: Callable[[str], int] = estimate_tokens,
+) -> DocChunks:
+    """
+    Token-budgeted chunks of one document in one pass over its text.
+    Chunks are numbered through the document (doc-p{first page}-c{n}); one
+    that spans pages records its last page as page_end. With
+    cross_pages=False every page is chunked on its own.
+    """
+    doc = DocChunks(TextBuffer.from_pages(doc_id, pages))
+    buf = doc.buffer
+    packer = TokenPacker(max_tokens, overlap_tokens)
+    ranges = [(0, len(buf.text))] if cross_pages else [buf.page_bounds(i) for i in range(len(buf.page_starts))]
+    for lo, hi in ranges:
+        for seg in segments(buf.text, lo, hi, max_tokens, count):
+            for s, e in packer.add(seg):
+                doc.append(buf.page_at(s), s, e, len(doc), buf.page_at(e - 1))
+        for s, e in packer.flush():
+            doc.append(buf.page_at(s), s, e, len(doc), buf.page_at(e - 1))
+    return doc
+
+
+def iter_token_chunks(
+    pages: Iterable[Page],
+    max_tokens: int = CHUNK_TOKENS,
+    overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+    count: Callable[[str], int] = estimate_tokens,
+) -> Iterator[Chunk]:
+    """
+    Generator form of chunk_document_tokens (cross_pages=True), consuming
+    pages lazily: only the text not yet emitted as a chunk is carried over
+    to the next page. Same chunks as chunk_document_tokens.
+    """
+    packer = TokenPacker(max_tokens, overlap_tokens)
+    buf: Optional[TextBuffer] = None
+    n = 0
+
+    def emit(s: int, e: int) -> Chunk:
+        nonlocal n
+        n += 1
+        return Chunk(buf, buf.page_at(s), s, e, n - 1, buf.page_at(e - 1))
+
+    for p in pages:
+        if buf is None:
+            buf = TextBuffer(p.doc_id, p.text, [p.page_num], [0])
+            lo = 0
+        else:
+            carry = packer.pending[0][0] if packer.pending else len(buf.text)
+            packer.shift(carry)
+            buf = buf.carry(carry, p)
+            lo = buf.page_starts[-1]
+        # The page break ends the previous page's last sentence as a paragraph.
+        for seg in segments(buf.text, lo, len(buf.text), max_tokens, count):
+            for s, e in packer.add(seg):
+                yield emit(s, e)
+    for s, e in packer.flush():
+        yield emit(s, e)
+
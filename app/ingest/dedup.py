@@ -0,0 +1,134 @@
+"""
+Exact and near-duplicate chunk detection at ingest.
+
+PDFs repeat headers, footers, disclaimers and boilerplate pages; each
+repetition would otherwise be embedded, stored and compete for top_k.
+Within one document, a chunk duplicates an earlier one when
+- exact: their normalized texts (casefolded words; punctuation and
+  whitespace ignored) are equal, or
+- near: the estimated Jaccard similarity of their word 3-shingle sets
+  is at least DEDUP_SIMILARITY, from MinHash signatures of NUM_PERM
+  hashes. Chunks under MIN_SHINGLES shingles are matched exactly only.
+
+Near candidates come from LSH over the signature (BANDS bands of ROWS
+hashes; chunks sharing any band are compared), so a lookup touches a
+few buckets instead of every earlier chunk.
+"""
+import hashlib
+import re
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.config import DEDUP_SIMILARITY
+
+_WORD_RE = re.compile(r"\w+")
+
+SHINGLE = 3
+MIN_SHINGLES = 8
+
+NUM_PERM = 128  # similarity estimates within ~0.03 (one standard deviation near 0.9)
+BANDS, ROWS = 32, 4  # P(candidate) = 1 - (1 - J**ROWS)**BANDS: ~1.0 at J=0.8, 0.17 at J=0.25
+
+_rng = np.random.default_rng(0x5EED)
+_A = _rng.integers(1, 2**63, size=NUM_PERM, dtype=np.uint64) | np.uint64(1)
+_B = _rng.integers(0, 2**63, size=NUM_PERM, dtype=np.uint64)
+# Per-position multipliers for combining word hashes into a shingle hash.
+_MIX = np.array([0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9], dtype=np.uint64)
+
+
+def words(text: str) -> List[str]:
+    return _WORD_RE.findall(text.casefold())
+
+
+def exact_key(tokens: List[str]) -> bytes:
+    return hashlib.sha1(" ".join(tokens).encode("utf-8")).digest()
+
+
+def _splitmix(h: np.ndarray) -> np.ndarray:
+    # splitmix64 finalizer: spreads the input over all 64 bits.
+    h = (h ^ (h >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    h = (h ^ (h >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return h ^ (h >> np.uint64(31))
+
+
+def shingle_hashes(tokens: List[str]) -> np.ndarray:
+    """
+    Distinct 64-bit hashes of the word 3-shingles of tokens.
+    """
+    w = np.fromiter((zlib.crc32(t.encode("utf-8")) for t in tokens), dtype=np.uint64, count=len(tokens))
+    n = len(w) - SHINGLE + 1
+    if n <= 0:
+        return np.zeros(0, dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        h = w[:n] * _MIX[0]
+        for i in range(1, SHINGLE):
+            h = h + w[i:i + n] * _MIX[i]
+        return np.unique(_splitmix(h))
+
+
+def minhash(shingles: np.ndarray) -> np.ndarray:
+    """
+    NUM_PERM-hash MinHash signature of a (non-empty) shingle hash set.
+    """
+    with np.errstate(over="ignore"):
+        return _splitmix(shingles[:, None] * _A + _B).min(axis=0)
+
+
+def similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """
+    Estimated Jaccard similarity of the sets behind two signatures.
+    """
+    return float(np.count_nonzero(a == b)) / NUM_PERM
+
+
+class Deduper:
+    """
+    check(text, vector_id) -> vector_id of the earlier chunk that text
+    duplicates, or None (text is then remembered as a kept chunk).
+    Keeps hashes and signatures only, never text; reset() between
+    documents.
+    """
+
+    def __init__(self, threshold: float = DEDUP_SIMILARITY):
+        self.threshold = threshold
+        self.reset()
+
+    def reset(self) -> None:
+        self._exact: Dict[bytes, int] = {}
+        self._signatures: Dict[int, np.ndarray] = {}
+        self._buckets: List[Dict[bytes, List[int]]] = [{} for _ in range(BANDS)]
+
+    def check(self, text: str, vector_id: int) -> Optional[int]:
+        tokens = words(text)
+        key = exact_key(tokens)
+        canonical = self._exact.get(key)
+        if canonical is not None:
+            return canonical
+
+        shingles = shingle_hashes(tokens)
+        if len(shingles) < MIN_SHINGLES:
+            self._exact[key] = vector_id
+            return None
+
+        sig = minhash(shingles)
+        bands = [sig[b * ROWS:(b + 1) * ROWS].tobytes() for b in range(BANDS)]
+        best: Tuple[float, Optional[int]] = (self.threshold, None)
+        seen = set()
+        for bucket, band in zip(self._buckets, bands):
+            for vid in bucket.get(band, ()):
+                if vid not in seen:
+                    seen.add(vid)
+                    s = similarity(sig, self._signatures[vid])
+                    if s >= best[0]:
+                        best = (s, vid)
+        if best[1] is not None:
+            self._exact[key] = best[1]  # later exact repeats skip the LSH lookup
+            return best[1]
+
+        self._exact[key] = vector_id
+        self._signatures[vector_id] = sig
+        for bucket, band in zip(self._buckets, bands):
+            bucket.setdefault(band, []).append(vector_id)
+        return None
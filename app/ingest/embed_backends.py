@@ -0,0 +1,272 @@
+"""
+Embedding backends: what turns chunk and query text into vectors.
+
+- openai:  the embeddings API (EMBEDDING_MODEL)
+- local:   a sentence-transformers model on CPU, batched inference
+- hashing: signed feature hashing of words and word bigrams; deterministic,
+           no model and no network, for offline tests and benchmarks
+
+EMBED_BACKEND picks one. Every index records the backend, model, dim and
+normalization it was built with in index_meta.json next to faiss.index,
+so a mismatched backend is caught on load instead of returning garbage.
+"""
+import asyncio
+import json
+import os
+import threading
+import zlib
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from app.config import (
+    EMBEDDING_MODEL,
+    EMBED_BACKEND,
+    LOCAL_EMBED_MODEL,
+    LOCAL_EMBED_BATCH,
+    LOCAL_EMBED_THREADS,
+    HASH_EMBED_DIM,
+)
+from app.ingest.lexical import tokenize
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI, OpenAI
+
+    from app.ingest.embed_engine import EmbeddingEngine
+
+EMBED_BACKENDS = ("openai", "local", "hashing")
+
+INDEX_META_NAME = "index_meta.json"
+
+
+def l2_normalize(vecs: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vecs, axis=1, keepdims=True)
+    np.maximum(norms, 1e-12, out=norms)
+    return (vecs / norms).astype(np.float32, copy=False)
+
+
+class EmbeddingBackend:
+    """
+    embed() returns an (N, D) float32 matrix, rows in input order and
+    L2-normalized (the FAISS indexes use inner product as cosine).
+    """
+
+    name = ""
+    model = ""
+    # Worth storing in the embedding cache (false when recomputing is cheaper).
+    cacheable = True
+
+    @property
+    def cache_namespace(self) -> str:
+        return f"{self.name}/{self.model}"
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        raise NotImplementedError
+
+    async def embed_async(self, texts: List[str]) -> np.ndarray:
+        return await asyncio.to_thread(self.embed, texts)
+
+    def meta(self, dim: int) -> Dict[str, Any]:
+        return {"backend": self.name, "model": self.model, "dim": int(dim), "normalized": True}
+
+
+class OpenAIBackend(EmbeddingBackend):
+    """
+    With an engine (ingest), batches are token-sized, concurrent and retried;
+    without one (queries), texts go out in as few requests as possible.
+    Clients come from the factories on first use, so building a backend
+    (e.g. to check index metadata) never builds a client, and sync-only
+    callers never build the async one.
+    """
+
+    name = "openai"
+
+    def __init__(
+        self,
+        client_factory: Callable[[], "OpenAI"],
+        aclient_factory: Optional[Callable[[], "AsyncOpenAI"]] = None,
+        engine: Optional["EmbeddingEngine"] = None,
+        model: str = EMBEDDING_MODEL,
+    ):
+        self.client_factory = client_factory
+        self.aclient_factory = aclient_factory
+        self.engine = engine
+        self.model = model
+
+    @property
+    def cache_namespace(self) -> str:
+        # Bare model name: keeps caches written before backends existed valid.
+        return self.model
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+
+        if self.engine is not None:
+            return l2_normalize(self.engine.embed(texts))
+
+        # Not at module level: it imports openai, which the other backends never need.
+        from app.ingest.embed_engine import MAX_BATCH_ITEMS
+
+        rows: List[List[float]] = []
+        for i in range(0, len(texts), MAX_BATCH_ITEMS):
+            resp = self.client_factory().embeddings.create(model=self.model, input=texts[i:i + MAX_BATCH_ITEMS])
+            rows.extend(d.embedding for d in sorted(resp.data, key=lambda d: d.index))
+        return l2_normalize(np.array(rows, dtype=np.float32))
+
+    async def embed_async(self, texts: List[str]) -> np.ndarray:
+        if self.aclient_factory is None:
+            return await super().embed_async(texts)
+
+        resp = await self.aclient_factory().embeddings.create(model=self.model, input=texts)
+        rows = [d.embedding for d in sorted(resp.data, key=lambda d: d.index)]
+        return l2_normalize(np.array(rows, dtype=np.float32))
+
+
+class LocalBackend(EmbeddingBackend):
+    """
+    sentence-transformers model on CPU (optional dependency). One batched
+    forward pass at a time: torch already spreads a batch over the cores,
+    so concurrent callers would only contend.
+    """
+
+    name = "local"
+
+    def __init__(
+        self,
+        model: str = LOCAL_EMBED_MODEL,
+        batch_size: int = LOCAL_EMBED_BATCH,
+        threads: int = LOCAL_EMBED_THREADS,
+    ):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise RuntimeError(
+                "EMBED_BACKEND=local needs sentence-transformers: pip install sentence-transformers"
+            ) from e
+
+        if threads > 0:
+            import torch
+            torch.set_num_threads(threads)
+
+        self.model = model
+        self.batch_size = batch_size
+        self._model = SentenceTransformer(model, device="cpu")
+        self._lock = threading.Lock()
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        with self._lock:
+            vecs = self._model.encode(
+                texts,
+                batch_size=self.batch_size,
+                convert_to_numpy=True,
+                normalize_embeddings=True,
+                show_progress_bar=False,
+            )
+        return np.asarray(vecs, dtype=np.float32)
+
+
+class HashingBackend(EmbeddingBackend):
+    """
+    Signed hashing vectorizer over the lexical tokenizer's terms plus word
+    bigrams, log-scaled counts. Texts sharing words get similar vectors,
+    which is enough for offline tests and benchmarks.
+    """
+
+    name = "hashing"
+    cacheable = False
+
+    def __init__(self, dim: int = HASH_EMBED_DIM):
+        self.dim = dim
+        self.model = f"hashing-{dim}"
+
+    def _row(self, text: str) -> np.ndarray:
+        tokens = tokenize(text)
+        feats = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        row = np.zeros(self.dim, dtype=np.float32)
+        if not feats:
+            return row
+        h = np.fromiter((zlib.crc32(f.encode("utf-8")) for f in feats), dtype=np.int64, count=len(feats))
+        signs = np.where(h & 0x80000000, 1.0, -1.0).astype(np.float32)
+        np.add.at(row, h % self.dim, signs)
+        return np.sign(row) * np.log1p(np.abs(row))
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return l2_normalize(np.stack([self._row(t) for t in texts]))
+
+
+_shared: Dict[str, EmbeddingBackend] = {}
+_shared_lock = threading.Lock()
+
+
+def get_backend(
+    name: str = EMBED_BACKEND,
+    client_factory: Optional[Callable[[], "OpenAI"]] = None,
+    aclient_factory: Optional[Callable[[], "AsyncOpenAI"]] = None,
+    engine: Optional["EmbeddingEngine"] = None,
+) -> EmbeddingBackend:
+    """
+    Backend for name. openai wraps the given client factories (cheap, per caller);
+    local and hashing are process-wide so a model is loaded once.
+    """
+    if name == "openai":
+        if client_factory is None:
+            raise ValueError("the openai backend needs an OpenAI client factory")
+        return OpenAIBackend(client_factory, aclient_factory=aclient_factory, engine=engine)
+
+    if name not in EMBED_BACKENDS:
+        raise ValueError(f"Unknown EMBED_BACKEND {name!r}; expected one of {', '.join(EMBED_BACKENDS)}")
+
+    if name not in _shared:
+        with _shared_lock:
+            if name not in _shared:
+                _shared[name] = LocalBackend() if name == "local" else HashingBackend()
+    return _shared[name]
+
+
+# --- index metadata ---
+
+def index_meta_path(index_path: str) -> str:
+    return os.path.join(os.path.dirname(index_path), INDEX_META_NAME)
+
+
+def read_index_meta(index_path: str) -> Optional[Dict[str, Any]]:
+    """
+    None for indexes written before index_meta.json existed.
+    """
+    path = index_meta_path(index_path)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_index_meta(index_path: str, meta: Dict[str, Any]) -> None:
+    path = index_meta_path(index_path)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp, path)
+
+
+def check_index_meta(meta: Optional[Dict[str, Any]], backend: EmbeddingBackend, dim: Optional[int] = None) -> None:
+    """
+    Raises ValueError if vectors from backend (of width dim, when known)
+    don't belong in the index described by meta.
+    """
+    if meta is None:
+        return
+    if (meta.get("backend"), meta.get("model")) != (backend.name, backend.model):
+        raise ValueError(
+            f"Index was built with embedding backend {meta.get('backend')}/{meta.get('model')}, "
+            f"but {backend.name}/{backend.model} is configured. "
+            "Switch back, or run `python -m app.cli reindex` to re-embed the corpus."
+        )
+    if dim is not None and meta.get("dim") != dim:
+        raise ValueError(f"Embedding dim {dim} does not match index dim {meta.get('dim')}")
+    if not meta.get("normalized", True):
+        raise ValueError("Index holds unnormalized vectors; run `python -m app.cli reindex`")
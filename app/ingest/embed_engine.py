@@ -0,0 +1,187 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+import numpy as np
+from openai import (
+    OpenAI,
+    APIConnectionError,
+    APIStatusError,
+    InternalServerError,
+    RateLimitError,
+)
+
+from app.config import (
+    EMBEDDING_MODEL,
+    EMBED_BATCH_TOKENS,
+    EMBED_MAX_IN_FLIGHT,
+    EMBED_MAX_RETRIES,
+)
+from app.tokens import estimate_tokens
+
+# The embeddings endpoint rejects requests with more inputs than this.
+MAX_BATCH_ITEMS = 2048
+
+RETRYABLE_ERRORS = (RateLimitError, APIConnectionError, InternalServerError)
+
+
+@dataclass
+class EngineStats:
+    chunks: int = 0
+    tokens: int = 0
+    requests: int = 0
+    retries: int = 0
+    in_flight: int = 0
+    max_in_flight: int = 0
+    # Wall time with at least one embed() call running: overlapping calls
+    # count once, idle gaps between calls not at all.
+    elapsed_s: float = 0.0
+
+    @property
+    def chunks_per_s(self) -> float:
+        return self.chunks / self.elapsed_s if self.elapsed_s > 0 else 0.0
+
+
+class EmbeddingEngine:
+    """
+    Concurrent embeddings client.
+    - batches are sized by (estimated) token count, not item count
+    - up to max_in_flight requests run at once on a thread pool; the cap
+      holds across concurrent embed() calls, which share the slots
+    - rate limits / transient errors are retried with exponential backoff
+      (honouring Retry-After when the server sends it)
+    - output rows are in input order
+    """
+
+    def __init__(
+        self,
+        client: OpenAI,
+        model: str = EMBEDDING_MODEL,
+        max_in_flight: int = EMBED_MAX_IN_FLIGHT,
+        max_batch_tokens: int = EMBED_BATCH_TOKENS,
+        max_retries: int = EMBED_MAX_RETRIES,
+        backoff_base: float = 0.5,
+        backoff_max: float = 30.0,
+    ):
+        # Retries are ours; the SDK's own retry loop would hide them from stats.
+        self.client = client.with_options(max_retries=0)
+        self.model = model
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_batch_tokens = max_batch_tokens
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self.stats = EngineStats()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_in_flight)
+        self._calls = 0
+        self._busy_since = 0.0
+
+    def plan_batches(self, texts: List[str]) -> List[Tuple[int, int]]:
+        """
+        Splits texts into contiguous [start, end) slices whose estimated
+        token total stays under max_batch_tokens (a single oversized text
+        still gets its own batch).
+        """
+        batches: List[Tuple[int, int]] = []
+        start = 0
+        tokens = 0
+
+        for i, t in enumerate(texts):
+            n = estimate_tokens(t)
+            full = i > start and (tokens + n > self.max_batch_tokens or i - start >= MAX_BATCH_ITEMS)
+            if full:
+                batches.append((start, i))
+                start, tokens = i, 0
+            tokens += n
+
+        if start < len(texts):
+            batches.append((start, len(texts)))
+        return batches
+
+    def _sleep_before_retry(self, attempt: int, err: Exception) -> None:
+        delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        if isinstance(err, APIStatusError):
+            retry_after = err.response.headers.get("retry-after")
+            try:
+                delay = max(delay, float(retry_after))
+            except (TypeError, ValueError):
+                pass
+        # Jitter so parallel workers don't retry in lockstep.
+        time.sleep(delay * (0.5 + random.random() / 2))
+
+    def _embed_batch(self, batch: List[str]) -> List[List[float]]:
+        # A slot is held through retries, so backoff also eases the load.
+        with self._slots:
+            return self._embed_batch_in_slot(batch)
+
+    def _embed_batch_in_slot(self, batch: List[str]) -> List[List[float]]:
+        with self._lock:
+            self.stats.in_flight += 1
+            self.stats.max_in_flight = max(self.stats.max_in_flight, self.stats.in_flight)
+
+        try:
+            attempt = 0
+            while True:
+                try:
+                    resp = self.client.embeddings.create(model=self.model, input=batch)
+                    break
+                except RETRYABLE_ERRORS as e:
+                    if attempt >= self.max_retries:
+                        raise
+                    with self._lock:
+                        self.stats.retries += 1
+                    self._sleep_before_retry(attempt, e)
+                    attempt += 1
+        finally:
+            with self._lock:
+                self.stats.in_flight -= 1
+                self.stats.requests += 1
+
+        return [d.embedding for d in sorted(resp.data, key=lambda d: d.index)]
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """
+        Returns (N, D) float32 embeddings matrix, rows in input order.
+        """
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+
+        with self._lock:
+            if self._calls == 0:
+                self._busy_since = time.perf_counter()
+            self._calls += 1
+
+        try:
+            batches = self.plan_batches(texts)
+            with ThreadPoolExecutor(max_workers=min(self.max_in_flight, len(batches))) as pool:
+                results = list(pool.map(self._embed_batch, [texts[s:e] for s, e in batches]))
+            vectors = np.array([v for part in results for v in part], dtype=np.float32)
+        finally:
+            with self._lock:
+                self._calls -= 1
+                if self._calls == 0:
+                    self.stats.elapsed_s += time.perf_counter() - self._busy_since
+
+        with self._lock:
+            self.stats.chunks += len(texts)
+            self.stats.tokens += sum(estimate_tokens(t) for t in texts)
+
+        return vectors
+
+
+_default_engine: Optional[EmbeddingEngine] = None
+_default_lock = threading.Lock()
+
+
+def get_engine(client: OpenAI) -> EmbeddingEngine:
+    global _default_engine
+    if _default_engine is None:
+        with _default_lock:
+            if _default_engine is None:
+                _default_engine = EmbeddingEngine(client)
+    return _default_engine
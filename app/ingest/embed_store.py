@@ -1,25 +1,95 @@
 import os
 import json
-from typing import List, Dict, Any
+import hashlib
+import shutil
+import tempfile
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from itertools import chain, islice
+from typing import TYPE_CHECKING, List, Dict, Any, Deque, Iterable, Iterator, Optional, Set, Tuple
 
 import numpy as np
 import faiss
-from openai import OpenAI
 
-from app.config import OPENAI_API_KEY, EMBEDDING_MODEL, DATA_DIR
+from app.cache import DiskCache
+from app.ingest.chunk_store import (
+    ChunkStoreReader,
+    ChunkStoreWriter,
+    blob_files,
+    location,
+    migrate_jsonl,
+    publish_store,
+    store_paths,
+)
+from app.ingest.dedup import Deduper
+from app.ingest.index_types import build_index, make_index, remove_ids
+from app.ingest.lexical import LexicalBuilder, LexicalIndex, lexical_path, load_lexical, rows_text
+from app.ingest.embed_engine import EmbeddingEngine, EngineStats, get_engine
+from app.ingest.embed_backends import (
+    EmbeddingBackend,
+    check_index_meta,
+    get_backend,
+    index_meta_path,
+    read_index_meta,
+    write_index_meta,
+)
+from app.config import (
+    EMBEDDING_MODEL,
+    EMBED_BACKEND,
+    DATA_DIR,
+    EMBED_CACHE_ENABLED,
+    EMBED_CACHE_MAX_ENTRIES,
+    DEDUP_ENABLED,
+    EMBED_MAX_IN_FLIGHT,
+    INGEST_BATCH_CHUNKS,
+    INDEX_TYPE,
+    INDEX_TRAIN_SIZE,
+)
 
+if TYPE_CHECKING:
+    from openai import OpenAI
+
+# None: use the shared client from app.clients (built on first use).
+# Tests assign fakes here.
+client: Optional["OpenAI"] = None
+
+
+def get_client() -> "OpenAI":
+    if client is not None:
+        return client
+    from app.clients import get_openai_client
+    return get_openai_client()
 
-client = OpenAI(api_key=OPENAI_API_KEY)
 
-CHUNKS_PATH = os.path.join(DATA_DIR, "chunks.jsonl")
 INDEX_PATH = os.path.join(DATA_DIR, "faiss.index")
+EMBED_CACHE_PATH = os.path.join(DATA_DIR, "embed_cache.sqlite")
+
+
+@dataclass
+class EmbedStats:
+    chunks: int = 0
+    cache_hits: int = 0
+    cache_misses: int = 0
+    replaced: int = 0
+    duplicates: int = 0  # chunks stored as locations of an earlier, near-identical chunk
+
+    def add(self, other: "EmbedStats") -> None:
+        self.chunks += other.chunks
+        self.cache_hits += other.cache_hits
+        self.cache_misses += other.cache_misses
+        self.replaced += other.replaced
+        self.duplicates += other.duplicates
 
 
 def save_jsonl(path: str, rows: List[Dict[str, Any]]) -> None:
     os.makedirs(os.path.dirname(path), exist_ok=True)
-    with open(path, "w", encoding="utf-8") as f:
+    # Write-then-rename so a running Retriever never reads a half-written file.
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
         for r in rows:
             f.write(json.dumps(r, ensure_ascii=False) + "\n")
+    os.replace(tmp, path)
 
 
 def load_jsonl(path: str) -> List[Dict[str, Any]]:
@@ -27,47 +97,396 @@ def load_jsonl(path: str) -> List[Dict[str, Any]]:
         return [json.loads(line) for line in f if line.strip()]
 
 
-def embed_texts(texts: List[str], batch_size: int = 64) -> np.ndarray:
+def ingest_backend(engine: Optional[EmbeddingEngine] = None) -> EmbeddingBackend:
     """
-    Returns (N, D) float32 embeddings matrix.
+    The configured EMBED_BACKEND; for openai, requests go through the
+    concurrent EmbeddingEngine.
     """
-    if not OPENAI_API_KEY:
-        raise RuntimeError("OPENAI_API_KEY is missing. Add it to .env")
+    if EMBED_BACKEND == "openai":
+        return get_backend("openai", client_factory=get_client, engine=engine or get_engine(get_client()))
+    return get_backend(EMBED_BACKEND)
+
+
+def embed_texts(texts: List[str], engine: Optional[EmbeddingEngine] = None) -> np.ndarray:
+    """
+    Returns (N, D) float32 embeddings matrix, L2-normalized.
+    With the openai backend, batches are token-sized and sent concurrently
+    with retry (see EmbeddingEngine).
+    """
+    return ingest_backend(engine).embed(texts)
+
 
-    vectors: List[List[float]] = []
-    for i in range(0, len(texts), batch_size):
-        batch = texts[i:i + batch_size]
-        resp = client.embeddings.create(model=EMBEDDING_MODEL, input=batch)
-        vectors.extend([d.embedding for d in resp.data])
+def engine_stats() -> EngineStats:
+    return get_engine(get_client()).stats
 
-    arr = np.array(vectors, dtype=np.float32)
-    return arr
 
+def embedding_cache_key(text: str, model: str = EMBEDDING_MODEL) -> str:
+    h = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    return f"{model}:{h}"
 
-def build_faiss_index(vectors: np.ndarray) -> faiss.Index:
+
+def open_embed_cache(path: str = EMBED_CACHE_PATH) -> Optional[DiskCache]:
+    if not EMBED_CACHE_ENABLED:
+        return None
+    return DiskCache(path, max_entries=EMBED_CACHE_MAX_ENTRIES)
+
+
+def embed_texts_cached(
+    texts: List[str],
+    cache: Optional[DiskCache] = None,
+) -> Tuple[np.ndarray, EmbedStats]:
+    """
+    Like embed_texts(), but only embeds texts whose (backend model, sha256(text))
+    key is not already in the cache. Returns (N, D) float32 + hit/miss stats.
+    """
+    stats = EmbedStats(chunks=len(texts))
+    if not texts:
+        return np.zeros((0, 0), dtype=np.float32), stats
+    backend = ingest_backend()
+    if cache is None or not backend.cacheable:
+        stats.cache_misses = len(texts)
+        return embed_texts(texts), stats
+
+    keys = [embedding_cache_key(t, backend.cache_namespace) for t in texts]
+    cached = cache.get_many(keys)
+
+    # Unique misses only: repeated boilerplate chunks are embedded once.
+    missing: Dict[str, str] = {}
+    for k, t in zip(keys, texts):
+        if k not in cached and k not in missing:
+            missing[k] = t
+
+    fresh: Dict[str, bytes] = {}
+    if missing:
+        vecs = embed_texts(list(missing.values()))
+        fresh = {k: v.tobytes() for k, v in zip(missing.keys(), vecs)}
+        cache.put_many(fresh)
+
+    stats.cache_hits = sum(1 for k in keys if k in cached)
+    stats.cache_misses = len(keys) - stats.cache_hits
+
+    rows = [np.frombuffer(cached.get(k) or fresh[k], dtype=np.float32) for k in keys]
+    if not rows:
+        return np.zeros((0, 0), dtype=np.float32), stats
+    return np.vstack(rows), stats
+
+
+def build_faiss_index(
+    vectors: np.ndarray,
+    ids: Optional[np.ndarray] = None,
+    index_type: str = INDEX_TYPE,
+) -> faiss.Index:
     """
     Uses inner product with L2-normalized vectors (cosine similarity).
+    The index is wrapped in an IndexIDMap2 so every vector carries a
+    stable id (row["vector_id"]) that survives deletes of other documents.
+    IVF index types are trained on these vectors.
     """
     if vectors.ndim != 2:
         raise ValueError("vectors must be a 2D array")
 
+    if ids is None:
+        ids = np.arange(len(vectors), dtype=np.int64)
+
     faiss.normalize_L2(vectors)
-    dim = vectors.shape[1]
-    index = faiss.IndexFlatIP(dim)
-    index.add(vectors)
-    return index
+    return build_index(vectors, ids, index_type=index_type)
 
 
 def persist_index(index: faiss.Index, path: str) -> None:
     os.makedirs(os.path.dirname(path), exist_ok=True)
-    faiss.write_index(index, path)
+    # New inode via rename: readers that memory-mapped the old file keep a valid view.
+    tmp = path + ".tmp"
+    faiss.write_index(index, tmp)
+    os.replace(tmp, path)
+
+
+def build_and_persist(chunks_rows: Iterable[Dict[str, Any]]) -> EmbedStats:
+    """
+    Saves the chunk store, faiss.index and the lexical index to disk,
+    replacing the whole store.
+    Everything is built in a staging directory under DATA_DIR and moved
+    over the live files only once the update has succeeded, so a failed
+    or interrupted run leaves the previous store and indexes in place.
+    Embeddings are served from the on-disk cache where possible;
+    returns cache hit/miss stats.
+    """
+    os.makedirs(DATA_DIR, exist_ok=True)
+    # Same filesystem as the live files, so publishing is a series of renames.
+    staging = tempfile.mkdtemp(prefix=".build-", dir=DATA_DIR)
+    try:
+        staged_index = os.path.join(staging, os.path.basename(INDEX_PATH))
+        stats = upsert_stream(set(), chunks_rows, data_dir=staging, index_path=staged_index)
+
+        artifacts = [(staged_index, INDEX_PATH),
+                     (index_meta_path(staged_index), index_meta_path(INDEX_PATH)),
+                     (lexical_path(staging), lexical_path(DATA_DIR))]
+        if not os.path.exists(staged_index):
+            # No rows: the replacement is an empty store.
+            for path in list(store_paths(DATA_DIR).values()) + blob_files(DATA_DIR) + [d for _, d in artifacts]:
+                if os.path.exists(path):
+                    os.remove(path)
+            return stats
+
+        # Same order as an in-place update: indexes first, the chunk store's idx last.
+        for src, dst in artifacts:
+            os.replace(src, dst)
+        publish_store(staging, DATA_DIR)
+        return stats
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+
+def open_index_for_update(index_path: Optional[str] = None) -> Optional[faiss.Index]:
+    """
+    Reads the persisted index for an in-place update (None if there is none yet).
+    Indexes written before vector ids existed (plain IndexFlatIP, rows
+    addressed by position) are converted: vector i gets id i.
+    """
+    index_path = index_path or INDEX_PATH
+    if not os.path.exists(index_path):
+        return None
+
+    index = faiss.read_index(index_path)
+    if not isinstance(index, faiss.IndexIDMap2):
+        vectors = index.reconstruct_n(0, index.ntotal)
+        index = faiss.IndexIDMap2(faiss.IndexFlatIP(index.d))
+        index.add_with_ids(vectors, np.arange(len(vectors), dtype=np.int64))
+    return index
+
+
+def lexical_base(have_store: bool, data_dir: Optional[str] = None) -> LexicalIndex:
+    """
+    The persisted lexical index to update. Stores ingested before it existed
+    get one built from their rows first, so it always covers the whole store.
+    """
+    data_dir = data_dir or DATA_DIR
+    path = lexical_path(data_dir)
+    if os.path.exists(path) or not have_store:
+        return load_lexical(data_dir)
 
+    store = ChunkStoreReader(data_dir)
+    try:
+        return LexicalIndex().updated([], rows_text(store.iter_vector_rows()))
+    finally:
+        store.close()
 
-def build_and_persist(chunks_rows: List[Dict[str, Any]]) -> None:
+
+def embed_stream(
+    rows: Iterable[Dict[str, Any]],
+    batch_size: int = INGEST_BATCH_CHUNKS,
+    cache: Optional[DiskCache] = None,
+) -> Iterator[Tuple[List[Dict[str, Any]], np.ndarray, EmbedStats]]:
     """
-    Saves chunks.jsonl and faiss.index to disk.
+    Pulls rows in batches of batch_size and yields (batch_rows, vectors, stats)
+    in input order; vectors has one row per batch row without dup_of
+    (duplicates are not embedded). At most EMBED_MAX_IN_FLIGHT batches are being embedded at
+    once; the upstream iterator is only advanced when a slot frees up, so
+    memory stays bounded by a few batches whatever the document size.
+    Concurrent batches share the engine's request slots, so no more than
+    EMBED_MAX_IN_FLIGHT embeddings requests are ever in flight in total.
     """
-    save_jsonl(CHUNKS_PATH, chunks_rows)
-    vectors = embed_texts([r["text"] for r in chunks_rows])
-    index = build_faiss_index(vectors)
+    pending: Deque[Tuple[List[Dict[str, Any]], Future]] = deque()
+
+    with ThreadPoolExecutor(max_workers=EMBED_MAX_IN_FLIGHT) as pool:
+        it = iter(rows)
+        while True:
+            batch = list(islice(it, batch_size))
+            if batch:
+                texts = [r["text"] for r in batch if "dup_of" not in r]
+                fut = pool.submit(embed_texts_cached, texts, cache)
+                pending.append((batch, fut))
+
+            if pending and (not batch or len(pending) >= EMBED_MAX_IN_FLIGHT):
+                done_rows, fut = pending.popleft()
+                vectors, stats = fut.result()
+                yield done_rows, vectors, stats
+
+            if not batch and not pending:
+                break
+
+
+def upsert_stream(
+    doc_ids: Set[str],
+    rows: Iterable[Dict[str, Any]],
+    data_dir: Optional[str] = None,
+    index_path: Optional[str] = None,
+) -> EmbedStats:
+    """
+    Streaming store update: drops every chunk of doc_ids, then embeds and adds
+    the new rows batch by batch. New rows are appended to the chunk store as
+    their vectors are added, so the incoming document is never held in memory
+    as a whole and other documents' rows are never rewritten.
+    The BM25 index (lexical.npz) is updated alongside from the same rows.
+    With DEDUP_ENABLED, a chunk duplicating an earlier one of its document
+    is not embedded or indexed: it is stored as an alias (location and
+    dup_of, no text) that search expands hits to.
+    data_dir / index_path default to DATA_DIR / INDEX_PATH.
+    """
+    data_dir = data_dir or DATA_DIR
+    index_path = index_path or INDEX_PATH
+    migrate_jsonl(data_dir)
+
+    index = open_index_for_update(index_path)
+    meta = read_index_meta(index_path) if index is not None else None
+    backend = ingest_backend()
+    store = ChunkStoreWriter(data_dir)
+    stats = EmbedStats()
+
+    cache = open_embed_cache()
+    try:
+        # Ids are never reused, even for the vectors being removed.
+        next_id = store.next_id
+
+        # 1) drop the documents being replaced
+        removed = store.remove_docs(doc_ids)
+        if len(removed):
+            index = remove_ids(index, removed)
+        stats.replaced = len(removed)
+        lexical = LexicalBuilder(lexical_base(index is not None, data_dir), removed.tolist())
+
+        # A new index of a trained type (IVF) is built once INDEX_TRAIN_SIZE
+        # vectors (or the whole stream, if shorter) are available to train on.
+        untrained: List[Tuple[List[Dict[str, Any]], np.ndarray]] = []
+        n_untrained = 0
+
+        def add(batch: List[Dict[str, Any]], vectors: np.ndarray) -> None:
+            if len(vectors):
+                ids = [r["vector_id"] for r in batch if "dup_of" not in r]
+                index.add_with_ids(vectors, np.asarray(ids, dtype=np.int64))
+            for r in batch:
+                store.append(r)
+                if "dup_of" not in r:
+                    lexical.add(r["vector_id"], r["text"])
+
+        def build_from_untrained() -> faiss.Index:
+            vectors = np.vstack([v for _, v in untrained if len(v)])
+            new_index = make_index(vectors.shape[1], n_train=len(vectors))
+            new_index.train(vectors)
+            return new_index
+
+        deduper = Deduper() if DEDUP_ENABLED else None
+        dedup_doc: Optional[str] = None
+
+        def numbered(rows: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+            # Ids are assigned in stream order, before embedding, so a duplicate
+            # can point at its canonical chunk while that is still in flight.
+            nonlocal next_id, dedup_doc
+            for n, r in enumerate(rows):
+                if n == 0:
+                    # Before the first embedding request, not on deletes (no rows).
+                    check_index_meta(meta, backend)
+                r = dict(r, vector_id=next_id)
+                next_id += 1
+                if deduper is not None:
+                    if r["doc_id"] != dedup_doc:
+                        deduper.reset()  # duplicates are only looked for within a document
+                        dedup_doc = r["doc_id"]
+                    canonical = deduper.check(r["text"], r["vector_id"])
+                    if canonical is not None:
+                        r = dict(location(r), vector_id=r["vector_id"], dup_of=canonical)
+                        stats.duplicates += 1
+                yield r
+
+        # 2) pages -> chunks -> dedup -> embedding batches -> index adds -> row writes
+        for batch, vectors, batch_stats in embed_stream(numbered(rows), cache=cache):
+            stats.add(batch_stats)
+            if len(vectors):
+                faiss.normalize_L2(vectors)
+
+            if index is None:
+                untrained.append((batch, vectors))
+                n_untrained += len(vectors)
+                if n_untrained and (INDEX_TYPE == "flat" or n_untrained >= INDEX_TRAIN_SIZE):
+                    index = build_from_untrained()
+                    for b, v in untrained:
+                        add(b, v)
+                    untrained = []
+                continue
+
+            if len(vectors) and vectors.shape[1] != index.d:
+                raise ValueError(
+                    f"Embedding dim {vectors.shape[1]} does not match index dim {index.d}. "
+                    "Run `python -m app.cli reindex` after changing the embedding model."
+                )
+            add(batch, vectors)
+
+        if untrained:
+            # A document's first chunk is never a duplicate, so there are vectors.
+            index = build_from_untrained()
+            for b, v in untrained:
+                add(b, v)
+    except BaseException:
+        store.abort()
+        raise
+    finally:
+        if cache is not None:
+            cache.close()
+
+    if index is None:
+        store.abort()
+        return stats
+
+    persist_index(index, index_path)
+    # A delete-only update keeps the metadata of the vectors that remain.
+    if meta is None or stats.chunks:
+        write_index_meta(index_path, backend.meta(index.d))
+    lexical.build().save(lexical_path(data_dir))
+    store.commit()
+    return stats
+
+
+def reindex(index_type: str = INDEX_TYPE) -> int:
+    """
+    Rebuilds faiss.index as index_type from the chunk store, keeping every
+    vector_id, and rebuilds the lexical index. Vectors come from the embedding
+    cache, so this normally makes no API calls; after changing EMBED_BACKEND
+    it re-embeds the corpus with the new backend. Returns the number of vectors indexed.
+    """
+    migrate_jsonl(DATA_DIR)
+    store = ChunkStoreReader(DATA_DIR)
+    try:
+        ids = store.vector_ids()
+        if not len(ids):
+            return 0
+
+        cache = open_embed_cache()
+        try:
+            parts = [v for _, v, _ in embed_stream(store.iter_vector_rows(), cache=cache)]
+        finally:
+            if cache is not None:
+                cache.close()
+
+        LexicalIndex().updated([], rows_text(store.iter_vector_rows())).save(lexical_path(DATA_DIR))
+    finally:
+        store.close()
+
+    index = build_faiss_index(np.vstack(parts), ids=ids, index_type=index_type)
     persist_index(index, INDEX_PATH)
+    write_index_meta(INDEX_PATH, ingest_backend().meta(index.d))
+    return index.ntotal
+
+
+def upsert_documents(docs: Dict[str, Iterable[Dict[str, Any]]]) -> EmbedStats:
+    """
+    Adds each doc_id in docs to the store, replacing its previous chunks if
+    present. Batching many documents into one call amortizes the store rewrite.
+    Each document's rows may be a generator; they are consumed in order.
+    """
+    return upsert_stream(set(docs), chain.from_iterable(docs.values()))
+
+
+def upsert_document(doc_id: str, chunks_rows: Iterable[Dict[str, Any]]) -> EmbedStats:
+    """
+    Adds doc_id to the store, replacing its previous chunks if present.
+    chunks_rows may be a generator; it is consumed batch by batch.
+    """
+    return upsert_stream({doc_id}, chunks_rows)
+
+
+def delete_document(doc_id: str) -> int:
+    """
+    Removes doc_id from the store. Returns the number of chunks removed.
+    """
+    if not os.path.exists(INDEX_PATH):
+        return 0
+    return upsert_stream({doc_id}, []).replaced
@@ -0,0 +1,146 @@
+"""
+FAISS index construction for the selectable index types.
+
+- flat:  exact inner-product search (IndexFlatIP), O(N) per query
+- ivf:   inverted file over flat vectors; nprobe trades recall for speed
+- hnsw:  graph index; efSearch trades recall for speed. FAISS cannot delete
+         from HNSW in place, so deletes rebuild the graph from stored vectors
+- ivfpq: inverted file over product-quantized codes; smallest memory
+
+Every index is wrapped in IndexIDMap2 so vectors keep stable ids.
+IVF types need training; build_index() trains on the vectors it is given.
+"""
+import logging
+import math
+from typing import Optional
+
+import numpy as np
+import faiss
+
+from app.config import (
+    INDEX_TYPE,
+    INDEX_TYPES,
+    IVF_NLIST,
+    IVF_NPROBE,
+    HNSW_M,
+    HNSW_EF_CONSTRUCTION,
+    HNSW_EF_SEARCH,
+    IVFPQ_M,
+)
+
+# FAISS k-means wants ~39 training points per centroid.
+POINTS_PER_CENTROID = 39
+
+logger = logging.getLogger("llm_doc_assistant")
+
+
+def _pq_subquantizers(dim: int, target: int) -> int:
+    # Sub-quantizer count must divide the dimension.
+    for m in range(min(target, dim), 0, -1):
+        if dim % m == 0:
+            return m
+    return 1
+
+
+def make_index(
+    dim: int,
+    index_type: str = INDEX_TYPE,
+    n_train: int = 0,
+    nlist: int = IVF_NLIST,
+) -> faiss.Index:
+    """
+    Empty IndexIDMap2-wrapped index of the given type. For IVF types nlist is
+    clamped to what n_train training vectors can support.
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type {index_type!r}; expected one of {INDEX_TYPES}")
+
+    if index_type == "flat":
+        inner = faiss.IndexFlatIP(dim)
+
+    elif index_type == "hnsw":
+        inner = faiss.IndexHNSWFlat(dim, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        inner.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        inner.hnsw.efSearch = HNSW_EF_SEARCH
+
+    else:
+        nlist = max(1, min(nlist, n_train // POINTS_PER_CENTROID))
+        quantizer = faiss.IndexFlatIP(dim)
+        if index_type == "ivf":
+            inner = faiss.IndexIVFFlat(quantizer, dim, nlist, faiss.METRIC_INNER_PRODUCT)
+        else:
+            # 8-bit codes need 256 centroids per sub-quantizer; shrink for tiny corpora.
+            nbits = min(8, max(1, int(math.log2(max(2, n_train)))))
+            m = _pq_subquantizers(dim, IVFPQ_M)
+            inner = faiss.IndexIVFPQ(quantizer, dim, nlist, m, nbits, faiss.METRIC_INNER_PRODUCT)
+        inner.nprobe = min(IVF_NPROBE, nlist)
+
+    return faiss.IndexIDMap2(inner)
+
+
+def build_index(
+    vectors: np.ndarray,
+    ids: np.ndarray,
+    index_type: str = INDEX_TYPE,
+) -> faiss.Index:
+    """
+    New index trained (if needed) on and filled with normalized vectors.
+    """
+    index = make_index(vectors.shape[1], index_type=index_type, n_train=len(vectors))
+    if not index.is_trained:
+        index.train(vectors)
+    index.add_with_ids(vectors, np.asarray(ids, dtype=np.int64))
+    return index
+
+
+def index_type_of(index: faiss.Index) -> str:
+    inner = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap2) else index
+    if isinstance(inner, faiss.IndexHNSWFlat):
+        return "hnsw"
+    if isinstance(inner, faiss.IndexIVFPQ):
+        return "ivfpq"
+    if isinstance(inner, faiss.IndexIVFFlat):
+        return "ivf"
+    return "flat"
+
+
+def remove_ids(index: faiss.Index, ids: np.ndarray) -> faiss.Index:
+    """
+    Removes ids and returns the (possibly new) index. HNSW does not support
+    removal, so its graph is rebuilt from the remaining stored vectors.
+    """
+    if index_type_of(index) != "hnsw":
+        index.remove_ids(np.asarray(ids, dtype=np.int64))
+        return index
+
+    all_ids = faiss.vector_to_array(index.id_map)
+    keep = ~np.isin(all_ids, ids)
+    vectors = index.index.reconstruct_n(0, index.ntotal)[keep]
+
+    logger.info(f"index: rebuilding hnsw after delete (kept={int(keep.sum())})")
+    return build_index(vectors, all_ids[keep], index_type="hnsw")
+
+
+def search_params(
+    index: faiss.Index,
+    nprobe: Optional[int] = None,
+    ef_search: Optional[int] = None,
+    sel: Optional[faiss.IDSelector] = None,
+) -> Optional[faiss.SearchParameters]:
+    """
+    Per-query search parameters (knobs that don't apply to the index type are ignored).
+    """
+    kind = index_type_of(index)
+
+    if kind in ("ivf", "ivfpq") and nprobe is not None:
+        params = faiss.SearchParametersIVF(nprobe=nprobe)
+    elif kind == "hnsw" and ef_search is not None:
+        params = faiss.SearchParametersHNSW(efSearch=ef_search)
+    elif sel is not None:
+        params = faiss.SearchParameters()
+    else:
+        return None
+
+    if sel is not None:
+        params.sel = sel
+    return params
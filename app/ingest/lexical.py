@@ -0,0 +1,256 @@
+"""
+BM25 inverted index over chunk text, persisted next to faiss.index.
+
+Layout (lexical.npz, flat numpy arrays, no pickle):
+- vocab          terms joined by "\n" (UTF-8 bytes), sorted
+- term_offsets   postings of term t are [term_offsets[t], term_offsets[t+1])
+- post_ids       vector_id per posting, grouped by term
+- post_tf        term frequency per posting
+- doc_ids        vector_ids (sorted) and doc_lens, their token counts
+
+A query touches only the postings of its own terms; scoring and top-k are
+vectorized numpy. Updates (remove vector_ids, add rows) are array
+filters + one stable sort, so ingest never re-tokenizes the existing corpus.
+"""
+import os
+import re
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from app.config import DATA_DIR
+
+LEXICAL_NAME = "lexical.npz"
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+# Words, plus identifier-like runs joined by . _ @ + - (emails, versions,
+# file names). Compound tokens are indexed alongside their parts.
+_TOKEN_RE = re.compile(r"\w+(?:[.@+\-]\w+)*")
+_PART_RE = re.compile(r"[^\W_]+|\d+")
+
+
+def lexical_path(data_dir: str = DATA_DIR) -> str:
+    return os.path.join(data_dir, LEXICAL_NAME)
+
+
+def tokenize(text: str) -> List[str]:
+    tokens: List[str] = []
+    for tok in _TOKEN_RE.findall((text or "").lower()):
+        tokens.append(tok)
+        if not tok.isalnum():
+            parts = _PART_RE.findall(tok)
+            if len(parts) > 1:
+                tokens.extend(parts)
+    return tokens
+
+
+class LexicalIndex:
+    def __init__(
+        self,
+        vocab: Optional[List[str]] = None,
+        term_offsets: Optional[np.ndarray] = None,
+        post_ids: Optional[np.ndarray] = None,
+        post_tf: Optional[np.ndarray] = None,
+        doc_ids: Optional[np.ndarray] = None,
+        doc_lens: Optional[np.ndarray] = None,
+    ):
+        self.vocab: List[str] = vocab or []
+        self.term_offsets = term_offsets if term_offsets is not None else np.zeros(1, dtype=np.int64)
+        self.post_ids = post_ids if post_ids is not None else np.zeros(0, dtype=np.int64)
+        self.post_tf = post_tf if post_tf is not None else np.zeros(0, dtype=np.int32)
+        self.doc_ids = doc_ids if doc_ids is not None else np.zeros(0, dtype=np.int64)
+        self.doc_lens = doc_lens if doc_lens is not None else np.zeros(0, dtype=np.int32)
+
+        self._term_index: Dict[str, int] = {t: i for i, t in enumerate(self.vocab)}
+        self._avgdl = float(self.doc_lens.mean()) if len(self.doc_lens) else 0.0
+
+    def __len__(self) -> int:
+        return len(self.doc_ids)
+
+    # --- persistence ---
+
+    @classmethod
+    def load(cls, path: str) -> "LexicalIndex":
+        with np.load(path, allow_pickle=False) as z:
+            raw = z["vocab"].tobytes().decode("utf-8")
+            return cls(
+                vocab=raw.split("\n") if raw else [],
+                term_offsets=z["term_offsets"],
+                post_ids=z["post_ids"],
+                post_tf=z["post_tf"],
+                doc_ids=z["doc_ids"],
+                doc_lens=z["doc_lens"],
+            )
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # Write-then-rename, like faiss.index and the chunk store.
+        tmp = path + ".tmp.npz"
+        np.savez(
+            tmp,
+            vocab=np.frombuffer("\n".join(self.vocab).encode("utf-8"), dtype=np.uint8),
+            term_offsets=self.term_offsets,
+            post_ids=self.post_ids,
+            post_tf=self.post_tf,
+            doc_ids=self.doc_ids,
+            doc_lens=self.doc_lens,
+        )
+        os.replace(tmp, path)
+
+    # --- updates ---
+
+    def updated(self, remove_ids: Iterable[int], rows: Iterable[Tuple[int, str]]) -> "LexicalIndex":
+        """
+        New index without remove_ids and with rows [(vector_id, text)] added.
+        """
+        builder = LexicalBuilder(self, remove_ids)
+        for vector_id, text in rows:
+            builder.add(vector_id, text)
+        return builder.build()
+
+    # --- search ---
+
+    def search(
+        self,
+        query: str,
+        top_k: int = 5,
+        allowed: Optional[np.ndarray] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        (scores, vector_ids) of the top_k BM25 matches, best first.
+        allowed restricts results to those vector_ids.
+        """
+        n_docs = len(self.doc_ids)
+        hits_ids: List[np.ndarray] = []
+        hits_scores: List[np.ndarray] = []
+
+        for term, qtf in Counter(tokenize(query)).items():
+            t = self._term_index.get(term)
+            if t is None:
+                continue
+            lo, hi = int(self.term_offsets[t]), int(self.term_offsets[t + 1])
+            ids = self.post_ids[lo:hi]
+            tf = self.post_tf[lo:hi].astype(np.float32)
+
+            df = hi - lo
+            idf = np.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+            dl = self.doc_lens[np.searchsorted(self.doc_ids, ids)]
+            norm = K1 * (1.0 - B + B * dl / max(self._avgdl, 1e-9))
+            hits_ids.append(ids)
+            hits_scores.append(qtf * idf * tf * (K1 + 1.0) / (tf + norm))
+
+        if not hits_ids:
+            return np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.int64)
+
+        ids = np.concatenate(hits_ids)
+        scores = np.concatenate(hits_scores)
+        uniq, inverse = np.unique(ids, return_inverse=True)
+        totals = np.bincount(inverse, weights=scores).astype(np.float32)
+
+        if allowed is not None:
+            mask = np.isin(uniq, allowed)
+            uniq, totals = uniq[mask], totals[mask]
+
+        if len(uniq) > top_k:
+            part = np.argpartition(-totals, top_k)[:top_k]
+            uniq, totals = uniq[part], totals[part]
+        order = np.argsort(-totals, kind="stable")
+        return totals[order], uniq[order]
+
+
+class LexicalBuilder:
+    """
+    Incremental form of LexicalIndex.updated(): rows are tokenized as they
+    are added (ingest feeds it batch by batch), so only their postings are
+    kept, never the text.
+    """
+
+    def __init__(self, base: LexicalIndex, remove_ids: Iterable[int] = ()):
+        self.base = base
+        self.remove = np.asarray(list(remove_ids), dtype=np.int64)
+        self.vocab = list(base.vocab)
+        self.term_index = dict(base._term_index)
+        self.terms: List[int] = []
+        self.ids: List[int] = []
+        self.tfs: List[int] = []
+        self.doc_ids: List[int] = []
+        self.doc_lens: List[int] = []
+
+    def add(self, vector_id: int, text: str) -> None:
+        counts = Counter(tokenize(text))
+        self.doc_ids.append(vector_id)
+        self.doc_lens.append(sum(counts.values()))
+        for term, tf in counts.items():
+            t = self.term_index.get(term)
+            if t is None:
+                t = self.term_index[term] = len(self.vocab)
+                self.vocab.append(term)
+            self.terms.append(t)
+            self.ids.append(vector_id)
+            self.tfs.append(tf)
+
+    def build(self) -> LexicalIndex:
+        base, vocab = self.base, self.vocab
+
+        # Existing postings as (term, id, tf) triplets, minus removed ids.
+        terms = np.repeat(np.arange(len(base.vocab), dtype=np.int64), np.diff(base.term_offsets))
+        ids, tfs = base.post_ids, base.post_tf
+        doc_ids, doc_lens = base.doc_ids, base.doc_lens
+        if len(self.remove):
+            keep = ~np.isin(ids, self.remove)
+            terms, ids, tfs = terms[keep], ids[keep], tfs[keep]
+            keep_docs = ~np.isin(doc_ids, self.remove)
+            doc_ids, doc_lens = doc_ids[keep_docs], doc_lens[keep_docs]
+
+        terms = np.concatenate([terms, np.asarray(self.terms, dtype=np.int64)])
+        ids = np.concatenate([ids, np.asarray(self.ids, dtype=np.int64)])
+        tfs = np.concatenate([tfs, np.asarray(self.tfs, dtype=np.int32)])
+        doc_ids = np.concatenate([doc_ids, np.asarray(self.doc_ids, dtype=np.int64)])
+        doc_lens = np.concatenate([doc_lens, np.asarray(self.doc_lens, dtype=np.int32)])
+
+        # Re-number terms in sorted vocab order and drop terms without postings.
+        order = sorted(range(len(vocab)), key=vocab.__getitem__)
+        rank = np.empty(len(vocab), dtype=np.int64)
+        rank[order] = np.arange(len(vocab))
+        terms = rank[terms] if len(terms) else terms
+        live = np.unique(terms)
+        remap = np.full(len(vocab), -1, dtype=np.int64)
+        remap[live] = np.arange(len(live))
+        sorted_vocab = [vocab[order[t]] for t in live.tolist()]
+        terms = remap[terms]
+
+        # Stable (radix) sort: ids stay in insertion order within a term,
+        # which scoring doesn't care about.
+        by_term = np.argsort(terms, kind="stable")
+        terms, ids, tfs = terms[by_term], ids[by_term], tfs[by_term]
+        offsets = np.zeros(len(sorted_vocab) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(terms, minlength=len(sorted_vocab)), out=offsets[1:])
+
+        by_doc = np.argsort(doc_ids, kind="stable")
+        return LexicalIndex(sorted_vocab, offsets, ids, tfs, doc_ids[by_doc], doc_lens[by_doc])
+
+
+def load_lexical(data_dir: str = DATA_DIR) -> LexicalIndex:
+    path = lexical_path(data_dir)
+    return LexicalIndex.load(path) if os.path.exists(path) else LexicalIndex()
+
+
+def rrf_fuse(rankings: List[List[int]], k: int = 60) -> List[Tuple[int, float]]:
+    """
+    Reciprocal rank fusion: score(id) = sum over rankings of 1 / (k + rank).
+    Returns [(id, score)] best first.
+    """
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, vid in enumerate(ranking, start=1):
+            scores[vid] = scores.get(vid, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda kv: -kv[1])
+
+
+def rows_text(rows: Iterable[Dict[str, Any]]) -> Iterable[Tuple[int, str]]:
+    for r in rows:
+        yield r["vector_id"], r["text"]
@@ -1,32 +1,194 @@
+import logging
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 from dataclasses import dataclass
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple
+
 import fitz  # PyMuPDF
 
+logger = logging.getLogger("llm_doc_assistant")
+
+# Large PDFs are split into page ranges of this size across workers.
+PAGES_PER_TASK = 50
+
 
 @dataclass
 class Page:
+    __slots__ = ("doc_id", "page_num", "text")
+
     doc_id: str
     page_num: int
     text: str
 
 
+def read_page(doc: "fitz.Document", i: int, doc_id: str) -> Optional[Page]:
+    """
+    Cleaned text of page i (0-based), or None for pages without text.
+    """
+    raw_text = doc[i].get_text("text") or ""
+    cleaned_text = " ".join(raw_text.split())
+
+    if not cleaned_text.strip():
+        return None
+    return Page(doc_id=doc_id, page_num=i + 1, text=cleaned_text)
+
+
+def open_pdf(path: str) -> "fitz.Document":
+    """
+    fitz.open, refusing encrypted PDFs up front instead of failing (or
+    returning empty text) page by page.
+    """
+    doc = fitz.open(path)
+    if doc.needs_pass:
+        doc.close()
+        raise ValueError(f"encrypted PDF: {path}")
+    return doc
+
+
+def extract_page_range(path: str, doc_id: str, start: int, end: int) -> list[Page]:
+    """
+    Extract cleaned text for pages [start, end) (0-based) of one PDF.
+    Top-level so it can run in a worker process.
+    """
+    with open_pdf(path) as doc:
+        pages = [read_page(doc, i, doc_id) for i in range(start, min(end, len(doc)))]
+    return [p for p in pages if p is not None]
+
+
+def iter_pdf_pages(path: str, doc_id: str) -> Iterator[Page]:
+    """
+    Yield pages with cleaned text one at a time; only the current page's
+    text is held in memory.
+    """
+    with open_pdf(path) as doc:
+        for i in range(len(doc)):
+            page = read_page(doc, i, doc_id)
+            if page is not None:
+                yield page
+
+
 def load_pdf(path: str, doc_id: str) -> list[Page]:
     """
     Load a PDF file and return a list of pages with cleaned text.
     """
-    doc = fitz.open(path)
-    pages: list[Page] = []
-
-    for i in range(len(doc)):
-        raw_text = doc[i].get_text("text") or ""
-        cleaned_text = " ".join(raw_text.split())
-
-        if cleaned_text.strip():
-            pages.append(
-                Page(
-                    doc_id=doc_id,
-                    page_num=i + 1,
-                    text=cleaned_text
-                )
-            )
-
-    return pages
+    return list(iter_pdf_pages(path, doc_id))
+
+
+def find_pdfs(root: str) -> List[str]:
+    """
+    All *.pdf files under root (recursive), in stable order.
+    """
+    found: List[str] = []
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            if name.lower().endswith(".pdf"):
+                found.append(os.path.join(dirpath, name))
+    return sorted(found)
+
+
+def doc_id_for_path(path: str, root: str) -> str:
+    """
+    docs/reports/q1.pdf under root=docs -> "reports/q1".
+    """
+    rel = os.path.relpath(path, root)
+    return os.path.splitext(rel)[0].replace(os.sep, "/")
+
+
+def doc_ids_for_paths(paths: List[str], root: str) -> List[Tuple[str, str]]:
+    """
+    [(path, doc_id), ...] with unique doc_ids. doc_id_for_path drops the
+    extension, so q1.pdf and q1.PDF would share one id and the later file
+    would silently replace the earlier; a later file in such a collision
+    keeps its extension in the id instead (with a warning).
+    """
+    files: List[Tuple[str, str]] = []
+    taken: Set[str] = set()
+    for path in paths:
+        doc_id = doc_id_for_path(path, root)
+        if doc_id in taken:
+            rel = os.path.relpath(path, root).replace(os.sep, "/")
+            unique, n = rel, 2
+            while unique in taken:
+                unique, n = f"{rel}#{n}", n + 1
+            logger.warning(f"ingest: doc_id {doc_id!r} is taken; using {unique!r} for {path}")
+            doc_id = unique
+        taken.add(doc_id)
+        files.append((path, doc_id))
+    return files
+
+
+def page_ranges(n_pages: int, pages_per_task: int = PAGES_PER_TASK) -> List[Tuple[int, int]]:
+    return [(s, min(s + pages_per_task, n_pages)) for s in range(0, n_pages, pages_per_task)]
+
+
+def load_pdfs_parallel(
+    files: List[Tuple[str, str]],
+    workers: Optional[int] = None,
+    pages_per_task: int = PAGES_PER_TASK,
+    on_error: Optional[Callable[[str, str, Exception], None]] = None,
+) -> Iterator[Tuple[str, list[Page]]]:
+    """
+    Extract many PDFs on a process pool.
+    files: [(path, doc_id), ...]. Each PDF is split into page ranges so one
+    large file is spread across workers. Yields (doc_id, pages) as each
+    document completes (not necessarily in input order). Only a bounded
+    number of tasks is queued at once, so huge directories don't pile up
+    results in memory.
+    A file that cannot be read (corrupt, encrypted) is logged, passed to
+    on_error(path, doc_id, error) and skipped; the other files go on.
+    """
+    workers = workers or os.cpu_count() or 1
+    max_pending = workers * 4
+
+    paths: Dict[str, str] = {}
+    remaining: Dict[str, int] = {}
+    parts: Dict[str, List[Page]] = {}
+    pending = {}
+
+    def fail(doc_id: str, err: Exception) -> None:
+        # The document's other ranges are dropped as they complete.
+        remaining.pop(doc_id, None)
+        parts.pop(doc_id, None)
+        logger.warning(f"ingest: skipping {paths[doc_id]}: {type(err).__name__}: {err}")
+        if on_error is not None:
+            on_error(paths[doc_id], doc_id, err)
+
+    def collect() -> Iterator[Tuple[str, list[Page]]]:
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for fut in done:
+            doc_id = pending.pop(fut)
+            if doc_id not in parts:
+                continue
+            try:
+                parts[doc_id].extend(fut.result())
+            except Exception as e:
+                fail(doc_id, e)
+                continue
+            remaining[doc_id] -= 1
+            if remaining[doc_id] == 0:
+                del remaining[doc_id]
+                yield doc_id, sorted(parts.pop(doc_id), key=lambda p: p.page_num)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for path, doc_id in files:
+            while len(pending) >= max_pending:
+                yield from collect()
+
+            paths[doc_id] = path
+            try:
+                with open_pdf(path) as doc:
+                    n = len(doc)
+            except Exception as e:
+                fail(doc_id, e)
+                continue
+
+            # All ranges of one file are queued together, so a document is
+            # complete as soon as its outstanding range count drops to zero.
+            ranges = page_ranges(n, pages_per_task) or [(0, 0)]
+            remaining[doc_id] = len(ranges)
+            parts[doc_id] = []
+            for s, e in ranges:
+                pending[pool.submit(extract_page_range, path, doc_id, s, e)] = doc_id
+
+        while pending:
+            yield from collect()
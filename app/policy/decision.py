@@ -1,5 +1,5 @@
 from enum import Enum
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
 
 class Decision(Enum):
@@ -11,3 +11,5 @@ class Decision(Enum):
 class PolicyResult:
     decision: Decision
     reasons: list[str]
+    # RuleMatch objects from the policy engine (rule, category, priority, span)
+    matches: list = field(default_factory=list)
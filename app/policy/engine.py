@@ -0,0 +1,134 @@
+"""
+Compiled multi-pattern policy engine.
+
+All rules are compiled once into ONE scanner regex: literal phrases are
+folded into a prefix trie (so shared prefixes like "ignore ..." or
+"print ..." are tested once per position) and regex rules are appended as
+extra alternatives. Scanning walks the lower-cased text a single time in
+the C regex engine, stopping only where some rule starts; each such
+position is resolved to every rule that matches there (walking the trie
+for literals), so overlapping rules such as "api key" inside "print the
+api key" are all reported.
+
+Rules are matched case-insensitively (text is lower-cased once; literal
+phrases are lower-cased and escaped, regex rules must be written in lower
+case). Match spans refer to the lower-cased text.
+"""
+import re
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Sequence
+
+# Trie node: char -> child; the END key holds the rule ending at that node.
+_END = ""
+
+
+@dataclass(frozen=True)
+class Rule:
+    pattern: str
+    category: str
+    priority: int
+    regex: bool = False
+
+
+@dataclass(frozen=True)
+class RuleMatch:
+    rule: Rule
+    start: int
+    end: int
+
+    @property
+    def category(self) -> str:
+        return self.rule.category
+
+    @property
+    def priority(self) -> int:
+        return self.rule.priority
+
+
+def literal_rules(phrases: Iterable[str], category: str, priority: int) -> List[Rule]:
+    return [Rule(p, category, priority) for p in phrases]
+
+
+def regex_rules(patterns: Iterable[str], category: str, priority: int) -> List[Rule]:
+    return [Rule(p, category, priority, regex=True) for p in patterns]
+
+
+def _trie_pattern(node: Dict) -> str:
+    branches = [re.escape(ch) + _trie_pattern(child) for ch, child in sorted(node.items()) if ch != _END]
+    if not branches:
+        return ""
+    body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+    # A phrase may end here while longer ones continue.
+    return f"(?:{body})?" if _END in node else body
+
+
+class PolicyEngine:
+    def __init__(self, rules: Sequence[Rule]):
+        self.rules = list(rules)
+
+        self._trie: Dict = {}
+        self._regex_rules = []
+        for rule in self.rules:
+            if rule.regex:
+                self._regex_rules.append((rule, re.compile(rule.pattern)))
+                continue
+            node = self._trie
+            for ch in rule.pattern.lower():
+                node = node.setdefault(ch, {})
+            node.setdefault(_END, []).append(rule)
+
+        alternatives = [p for p in [_trie_pattern(self._trie)] if p]
+        alternatives += [f"(?:{c.pattern})" for _, c in self._regex_rules]
+        self._scanner: Optional[re.Pattern] = re.compile("|".join(alternatives)) if alternatives else None
+
+    def _literals_at(self, text: str, pos: int) -> Iterable[RuleMatch]:
+        node = self._trie
+        i = pos
+        while True:
+            for rule in node.get(_END, ()):
+                yield RuleMatch(rule, pos, i)
+            if i >= len(text) or text[i] not in node:
+                return
+            node = node[text[i]]
+            i += 1
+
+    def scan(self, text: str) -> List[RuleMatch]:
+        """
+        Every (rule, span) match in text, in text order.
+        """
+        if not text or self._scanner is None:
+            return []
+
+        text = text.lower()
+        matches: List[RuleMatch] = []
+        search = self._scanner.search
+        hit = search(text)
+        while hit:
+            pos = hit.start()
+            matches.extend(self._literals_at(text, pos))
+            for rule, compiled in self._regex_rules:
+                m = compiled.match(text, pos)
+                if m:
+                    matches.append(RuleMatch(rule, pos, m.end()))
+            # Resume one char later so overlapping rules are not skipped.
+            hit = search(text, pos + 1)
+        return matches
+
+    def matched_rules(self, text: str) -> List[Rule]:
+        """
+        Distinct matched rules, highest priority first.
+        """
+        seen = {}
+        for m in self.scan(text):
+            seen.setdefault(m.rule, None)
+        return sorted(seen, key=lambda r: -r.priority)
+
+    def categories(self, text: str) -> List[str]:
+        """
+        Matched categories, highest priority first.
+        """
+        out: List[str] = []
+        for r in self.matched_rules(text):
+            if r.category not in out:
+                out.append(r.category)
+        return out
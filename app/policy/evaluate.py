@@ -1,5 +1,32 @@
 from app.policy.decision import Decision, PolicyResult
-from app.policy.rules import detect_prompt_injection
+from app.policy.engine import PolicyEngine, literal_rules
+from app.policy.rules import INJECTION_RULES, INJECTION_ENGINE
+
+SECRET_KEYWORDS = [
+    # API keys
+    "api key",
+    "apikey",
+    "openai_api_key",
+    "openai key",
+    "sk-",
+    # Environment / secrets access
+    "environment variable",
+    "env var",
+    "dotenv",
+    ".env",
+    "os.environ",
+    "process.env",
+    "read environment",
+    "from the environment variable",
+    "print the api key",
+    "show the api key",
+    "dump env",
+]
+
+SECRET_RULES = literal_rules(SECRET_KEYWORDS, category="unsafe_request", priority=10)
+
+# Prompt injection (priority 20) wins over secret exfiltration (priority 10).
+QUERY_ENGINE = PolicyEngine(INJECTION_RULES + SECRET_RULES)
 
 
 def detect_secret_exfiltration(query: str) -> bool:
@@ -7,46 +34,28 @@ def detect_secret_exfiltration(query: str) -> bool:
     Detect attempts to extract secrets (API keys, env vars, .env contents, etc.).
     This should map to Decision.REFUSE with reason 'unsafe_request'.
     """
-    q = (query or "").lower()
-
-    SECRET_KEYWORDS = [
-        # API keys
-        "api key",
-        "apikey",
-        "openai_api_key",
-        "openai key",
-        "sk-",
-        # Environment / secrets access
-        "environment variable",
-        "env var",
-        "dotenv",
-        ".env",
-        "os.environ",
-        "process.env",
-        "read environment",
-        "from the environment variable",
-        "print the api key",
-        "show the api key",
-        "dump env",
-    ]
-
-    return any(k in q for k in SECRET_KEYWORDS)
+    return "unsafe_request" in QUERY_ENGINE.categories(query or "")
 
 
 def evaluate_policy(query: str) -> PolicyResult:
     """
     Lightweight policy gate for the CLI.
-    Priority:
+    One scan over the query reports every matched rule; the highest
+    priority category decides:
       1) Prompt injection (more specific): refuse with 'prompt_injection'
       2) Secret exfiltration / unsafe requests: refuse with 'unsafe_request'
       3) Otherwise allow
     """
-    # 1) Prompt injection should win (more specific)
-    if detect_prompt_injection(query):
-        return PolicyResult(Decision.REFUSE, ["prompt_injection"])
+    matches = QUERY_ENGINE.scan(query or "")
+    if not matches:
+        return PolicyResult(Decision.ALLOW, [])
 
-    # 2) Secret exfiltration / unsafe requests
-    if detect_secret_exfiltration(query):
-        return PolicyResult(Decision.REFUSE, ["unsafe_request"])
+    top = max(matches, key=lambda m: m.priority)
+    return PolicyResult(Decision.REFUSE, [top.category], matches)
 
-    return PolicyResult(Decision.ALLOW, [])
+
+def scan_context(context: str) -> list[str]:
+    """
+    Injection-like phrases found in retrieved context (matched patterns).
+    """
+    return [r.pattern for r in INJECTION_ENGINE.matched_rules(context or "")]
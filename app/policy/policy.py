@@ -1,10 +1,11 @@
 from __future__ import annotations
 
-import re
 from dataclasses import dataclass
 from enum import Enum
 from typing import List, Optional
 
+from app.policy.engine import PolicyEngine, regex_rules
+
 
 class Decision(str, Enum):
     ALLOW = "allow"
@@ -40,14 +41,16 @@ UNSAFE_REQUEST_PATTERNS = [
 ]
 
 
+INJECTION_ENGINE = PolicyEngine(regex_rules(INJECTION_PATTERNS, "prompt_injection_in_context", priority=20))
+UNSAFE_ENGINE = PolicyEngine(regex_rules(UNSAFE_REQUEST_PATTERNS, "unsafe_request", priority=10))
+
+
 def detect_prompt_injection(text: str) -> bool:
-    t = (text or "").lower()
-    return any(re.search(p, t) for p in INJECTION_PATTERNS)
+    return bool(INJECTION_ENGINE.scan(text or ""))
 
 
 def detect_unsafe_request(query: str) -> bool:
-    q = (query or "").lower()
-    return any(re.search(p, q) for p in UNSAFE_REQUEST_PATTERNS)
+    return bool(UNSAFE_ENGINE.scan(query or ""))
 
 
 def decide(query: str, context: str) -> PolicyDecision:
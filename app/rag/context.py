@@ -0,0 +1,217 @@
+"""
+Token-budgeted context packing.
+
+1. Chunks that are adjacent on the same page (consecutive chunk indexes,
+   e.g. doc-p3-c1 and doc-p3-c2) are merged, dropping the text the chunker
+   repeated as overlap.
+2. Which chunks to include is a 0/1 knapsack: maximize total retrieval
+   score subject to the token budget (exact, via a Pareto frontier of
+   (tokens, score) states; top_k is small). A chunk next to an already
+   selected neighbour only costs its non-overlapping tokens, so after
+   merging, freed budget is refilled by re-running the knapsack on what
+   is left.
+
+Blocks are emitted in descending score order, like build_context did.
+"""
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.tokens import count_tokens
+
+SEPARATOR = "\n\n---\n\n"
+
+_CHUNK_INDEX_RE = re.compile(r"-c(\d+)$")
+
+# Longest overlap we look for between neighbouring chunks (chars).
+MAX_OVERLAP_CHARS = 2000
+
+
+@dataclass
+class Block:
+    doc_id: str
+    page_num: int
+    first: int
+    last: int
+    text: str
+    score: float
+    chunk_ids: List[str] = field(default_factory=list)
+    page_end: Optional[int] = None  # last page, for text spanning pages
+
+    def render(self) -> str:
+        pages = f"{self.page_num}-{self.page_end}" if self.page_end and self.page_end != self.page_num else self.page_num
+        return f"[chunk_id={','.join(self.chunk_ids)} page={pages}]\n{self.text}"
+
+
+def chunk_index(chunk_id: str) -> Optional[int]:
+    m = _CHUNK_INDEX_RE.search(chunk_id or "")
+    return int(m.group(1)) if m else None
+
+
+def merge_overlap(a: str, b: str, max_overlap: int = MAX_OVERLAP_CHARS) -> str:
+    """
+    a + b without the longest suffix of a that is also a prefix of b.
+    Without any overlap the texts are joined with a space.
+    """
+    if not a or not b:
+        return a or b
+
+    probe = b[:min(len(b), 16)]
+    start = max(0, len(a) - max_overlap)
+    pos = a.find(probe, start)
+    while pos != -1:
+        tail = a[pos:]
+        if b.startswith(tail):
+            return a + b[len(tail):]
+        pos = a.find(probe, pos + 1)
+
+    # Overlaps shorter than the probe
+    for k in range(min(len(probe), len(a)) - 1, 0, -1):
+        if a.endswith(b[:k]):
+            return a + b[k:]
+    return a + " " + b
+
+
+def _key(c: Dict[str, Any]) -> Tuple[Any, Any]:
+    return c.get("doc_id"), c.get("page_num")
+
+
+def merge_adjacent(chunks: List[Dict[str, Any]]) -> List[Block]:
+    """
+    Groups chunks into blocks of consecutive chunk indexes on the same page.
+    Chunks without a parseable index stay on their own.
+    """
+    groups: Dict[Tuple[Any, Any], List[Tuple[int, Dict[str, Any]]]] = {}
+    blocks: List[Block] = []
+
+    for c in chunks:
+        idx = chunk_index(c.get("chunk_id", ""))
+        if idx is None:
+            blocks.append(Block(c.get("doc_id"), c["page_num"], -1, -1, c["text"], c["score"], [c["chunk_id"]],
+                                c.get("page_end")))
+        else:
+            groups.setdefault(_key(c), []).append((idx, c))
+
+    for members in groups.values():
+        members.sort(key=lambda m: m[0])
+        block: Optional[Block] = None
+        for idx, c in members:
+            if block is not None and idx == block.last + 1:
+                block.text = merge_overlap(block.text, c["text"])
+                block.last = idx
+                block.score = max(block.score, c["score"])
+                block.chunk_ids.append(c["chunk_id"])
+                block.page_end = max(block.page_end or block.page_num, c.get("page_end") or c["page_num"])
+                continue
+            if block is not None and idx == block.last:
+                continue  # duplicate hit
+            if block is not None:
+                blocks.append(block)
+            block = Block(c.get("doc_id"), c["page_num"], idx, idx, c["text"], c["score"], [c["chunk_id"]],
+                          c.get("page_end"))
+        if block is not None:
+            blocks.append(block)
+
+    return blocks
+
+
+def knapsack(costs: List[int], values: List[float], budget: int) -> List[int]:
+    """
+    Indexes maximizing sum(values) with sum(costs) <= budget.
+    Keeps only Pareto-optimal (cost, value) states, so it stays cheap for
+    the handful of retrieved chunks regardless of the budget size.
+    """
+    # states: (cost, value, chosen) sorted by cost, strictly increasing value
+    states: List[Tuple[int, float, Tuple[int, ...]]] = [(0, 0.0, ())]
+    for i, (c, v) in enumerate(zip(costs, values)):
+        if c > budget:
+            continue
+        extended = [(sc + c, sv + v, ch + (i,)) for sc, sv, ch in states if sc + c <= budget]
+        merged = sorted(states + extended, key=lambda s: (s[0], -s[1]))
+        states = []
+        for s in merged:
+            if not states or s[1] > states[-1][1]:
+                states.append(s)
+    return list(max(states, key=lambda s: s[1])[2])
+
+
+def _block_tokens(b: Block) -> int:
+    return count_tokens(b.render()) + count_tokens(SEPARATOR)
+
+
+def _packed_tokens(blocks: List[Block]) -> int:
+    return sum(_block_tokens(b) for b in blocks)
+
+
+def _standalone_tokens(c: Dict[str, Any]) -> int:
+    return _block_tokens(Block(c.get("doc_id"), c["page_num"], 0, 0, c["text"], c["score"], [c["chunk_id"]],
+                               c.get("page_end")))
+
+
+def _marginal_tokens(c: Dict[str, Any], selected: Dict[Tuple[Any, Any, int], Dict[str, Any]]) -> int:
+    """
+    Tokens c adds to the current selection: only its non-overlapping text
+    (plus its id in the block header) when a same-page neighbour is already
+    selected, its standalone block otherwise.
+    """
+    idx = chunk_index(c.get("chunk_id", ""))
+    if idx is None:
+        return _standalone_tokens(c)
+
+    doc_id, page_num = _key(c)
+    prev = selected.get((doc_id, page_num, idx - 1))
+    nxt = selected.get((doc_id, page_num, idx + 1))
+    if prev is not None:
+        extra = merge_overlap(prev["text"], c["text"])[len(prev["text"]):]
+    elif nxt is not None:
+        extra = merge_overlap(c["text"], nxt["text"])[:-len(nxt["text"])]
+    else:
+        return _standalone_tokens(c)
+    return count_tokens(extra) + count_tokens("," + c["chunk_id"])
+
+
+def pack_context(chunks: List[Dict[str, Any]], max_tokens: int) -> str:
+    """
+    Context string of at most max_tokens (by count_tokens), choosing chunks
+    to maximize total retrieval score and merging same-page neighbours.
+    """
+    if not chunks or max_tokens <= 0:
+        return ""
+
+    # Rank-based scores if the caller's chunks don't carry any.
+    chunks = [
+        c if "score" in c else {**c, "score": float(len(chunks) - i)}
+        for i, c in enumerate(chunks)
+    ]
+    # Scores may be negative (inner product); the knapsack needs positive values.
+    floor = min(c["score"] for c in chunks)
+    shift = (1e-6 - floor) if floor <= 0 else 0.0
+
+    selected: List[Dict[str, Any]] = []
+    remaining = list(chunks)
+    used = 0
+
+    while remaining and used < max_tokens:
+        by_pos = {
+            (*_key(c), chunk_index(c["chunk_id"])): c
+            for c in selected
+            if chunk_index(c.get("chunk_id", "")) is not None
+        }
+        costs = [_marginal_tokens(c, by_pos) for c in remaining]
+        picked = set(knapsack(costs, [c["score"] + shift for c in remaining], max_tokens - used))
+        if not picked:
+            break
+
+        selected += [c for i, c in enumerate(remaining) if i in picked]
+        remaining = [c for i, c in enumerate(remaining) if i not in picked]
+
+        # Marginal costs are computed against the previous selection, so two
+        # picks around one gap can be off by a few header tokens; drop the
+        # lowest-scored pick until the real packed size fits.
+        used = _packed_tokens(merge_adjacent(selected))
+        while selected and used > max_tokens:
+            selected.remove(min(selected, key=lambda c: c["score"]))
+            used = _packed_tokens(merge_adjacent(selected))
+
+    blocks = sorted(merge_adjacent(selected), key=lambda b: -b.score)
+    return SEPARATOR.join(b.render() for b in blocks)
@@ -0,0 +1,294 @@
+"""
+Local, deterministic repair of almost-JSON model output.
+
+Handles the mechanical failures we see from the extraction call:
+- prose or ```json fences around the object
+- trailing commas, missing commas
+- single-quoted strings, unquoted keys/words, Python True/False/None
+- raw newlines/tabs inside strings
+- output truncated at max_output_tokens (the incomplete trailing member is
+  dropped and open arrays/objects are closed)
+
+parse_lenient() is a tolerant recursive-descent parser that builds Python
+values directly; coerce_summary() then fits them to DocumentSummary,
+dropping only the fields/items that cannot be made valid. Every fix
+applied is reported by name.
+"""
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from pydantic import TypeAdapter, ValidationError
+
+from app.rag.schema import DocumentSummary, ExperienceItem
+
+_NUMBER_RE = re.compile(r"-?\d+(\.\d+)?([eE][+-]?\d+)?$")
+_BARE_RE = re.compile(r"[^\s,:\[\]{}\"']+")
+
+_ESCAPES = {"n": "\n", "t": "\t", "r": "\r", "b": "\b", "f": "\f", "/": "/", "\\": "\\", '"': '"', "'": "'"}
+# Deepest array/object nesting accepted; deeper input is rejected rather than
+# recursing until RecursionError.
+MAX_DEPTH = 200
+
+_LITERALS = {"true": True, "false": False, "null": None, "True": True, "False": False, "None": None}
+
+_FIELD_ADAPTERS: Dict[str, TypeAdapter] = {
+    name: TypeAdapter(f.annotation) for name, f in DocumentSummary.model_fields.items()
+}
+
+
+class RepairError(Exception):
+    pass
+
+
+class _Incomplete(Exception):
+    """Input ended inside a value."""
+
+
+@dataclass
+class RepairResult:
+    summary: DocumentSummary
+    fixes: List[str] = field(default_factory=list)
+
+
+class _Parser:
+    def __init__(self, text: str):
+        self.s = text
+        self.i = 0
+        self.depth = 0
+        self.fixes: Set[str] = set()
+
+    def _ws(self) -> None:
+        while self.i < len(self.s) and self.s[self.i].isspace():
+            self.i += 1
+
+    def _peek(self) -> Optional[str]:
+        self._ws()
+        return self.s[self.i] if self.i < len(self.s) else None
+
+    def value(self) -> Any:
+        ch = self._peek()
+        if ch is None:
+            raise _Incomplete()
+        if ch in "{[":
+            if self.depth >= MAX_DEPTH:
+                raise RepairError(f"nested deeper than {MAX_DEPTH} levels")
+            self.depth += 1
+            try:
+                return self.obj() if ch == "{" else self.arr()
+            finally:
+                self.depth -= 1
+        if ch in "\"'":
+            return self.string()
+        return self.bare()
+
+    def obj(self) -> Dict[str, Any]:
+        self.i += 1
+        out: Dict[str, Any] = {}
+        expect_comma = False
+        while True:
+            ch = self._peek()
+            if ch is None:
+                self.fixes.add("closed_truncated")
+                return out
+            if ch == "}":
+                self.i += 1
+                return out
+            if ch == ",":
+                self.i += 1
+                if self._peek() == "}":
+                    self.fixes.add("trailing_comma")
+                expect_comma = False
+                continue
+            if expect_comma:
+                self.fixes.add("missing_comma")
+
+            try:
+                key = self.string() if ch in "\"'" else self.bare(as_key=True)
+                if self._peek() != ":":
+                    raise _Incomplete() if self._peek() is None else RepairError(f"expected ':' after key {key!r}")
+                self.i += 1
+                out[str(key)] = self.value()
+            except _Incomplete:
+                # Truncated inside this member: drop it and close the object.
+                self.fixes.add("closed_truncated")
+                return out
+            expect_comma = True
+
+    def arr(self) -> List[Any]:
+        self.i += 1
+        out: List[Any] = []
+        expect_comma = False
+        while True:
+            ch = self._peek()
+            if ch is None:
+                self.fixes.add("closed_truncated")
+                return out
+            if ch == "]":
+                self.i += 1
+                return out
+            if ch == ",":
+                self.i += 1
+                if self._peek() == "]":
+                    self.fixes.add("trailing_comma")
+                expect_comma = False
+                continue
+            if ch == "}":
+                raise RepairError("mismatched '}' in array")
+            if expect_comma:
+                self.fixes.add("missing_comma")
+            try:
+                out.append(self.value())
+            except _Incomplete:
+                self.fixes.add("closed_truncated")
+                return out
+            expect_comma = True
+
+    def string(self) -> str:
+        quote = self.s[self.i]
+        if quote == "'":
+            self.fixes.add("single_quotes")
+        self.i += 1
+        buf: List[str] = []
+        while self.i < len(self.s):
+            ch = self.s[self.i]
+            if ch == "\\":
+                if self.i + 1 >= len(self.s):
+                    break
+                nxt = self.s[self.i + 1]
+                if nxt == "u" and self.i + 6 <= len(self.s):
+                    try:
+                        buf.append(chr(int(self.s[self.i + 2:self.i + 6], 16)))
+                        self.i += 6
+                        continue
+                    except ValueError:
+                        pass
+                buf.append(_ESCAPES.get(nxt, nxt))
+                self.i += 2
+                continue
+            if ch == quote:
+                self.i += 1
+                return "".join(buf)
+            if ch in "\n\r\t":
+                self.fixes.add("raw_control_chars")
+            buf.append(ch)
+            self.i += 1
+        raise _Incomplete()
+
+    def bare(self, as_key: bool = False) -> Any:
+        m = _BARE_RE.match(self.s, self.i)
+        if not m:
+            raise RepairError(f"unexpected {self.s[self.i]!r} at {self.i}")
+        word = m.group(0)
+        self.i = m.end()
+        if self.i >= len(self.s) and not as_key:
+            # A literal/number cut off by truncation may be incomplete ("tr", "12").
+            raise _Incomplete()
+        if as_key:
+            self.fixes.add("unquoted_keys")
+            return word
+        if word in _LITERALS:
+            if word[0].isupper():
+                self.fixes.add("python_literals")
+            return _LITERALS[word]
+        if _NUMBER_RE.match(word):
+            return float(word) if any(c in word for c in ".eE") else int(word)
+        self.fixes.add("unquoted_strings")
+        return word
+
+
+def parse_lenient(text: str) -> Tuple[Any, List[str]]:
+    """
+    Tolerantly parse the first JSON object (or array) in text.
+    Returns (value, fixes). Raises RepairError if there is nothing usable.
+    """
+    if not text:
+        raise RepairError("empty output")
+
+    # DocumentSummary is an object; only fall back to an array (e.g. [{...}]) without one.
+    start = text.find("{")
+    if start == -1:
+        start = text.find("[")
+    if start == -1:
+        raise RepairError("no JSON object in output")
+
+    p = _Parser(text)
+    p.i = start
+    if text[:start].strip():
+        p.fixes.add("stripped_prose")
+
+    try:
+        value = p.value()
+    except _Incomplete:
+        raise RepairError("output truncated before any value")
+
+    if text[p.i:].strip().strip("`").strip():
+        p.fixes.add("stripped_prose")
+    return value, sorted(p.fixes)
+
+
+def _coerce_field(name: str, value: Any) -> Tuple[bool, Any]:
+    adapter = _FIELD_ADAPTERS[name]
+    try:
+        return True, adapter.validate_python(value)
+    except ValidationError:
+        pass
+
+    if name == "experience" and isinstance(value, list):
+        items = []
+        for item in value:
+            try:
+                items.append(ExperienceItem.model_validate(item))
+            except ValidationError:
+                continue
+        return True, items
+
+    if isinstance(value, (str, int, float)) and name in ("summary_points", "skills"):
+        return True, [str(value)]
+    if isinstance(value, list) and name in ("summary_points", "skills"):
+        return True, [str(v) for v in value if isinstance(v, (str, int, float))]
+    if isinstance(value, (int, float)) and not isinstance(value, bool) and name in (
+        "refusal_reason", "candidate_name", "location", "email"
+    ):
+        return True, str(value)
+    return False, None
+
+
+def coerce_summary(data: Any) -> Tuple[DocumentSummary, List[str]]:
+    """
+    Fit a parsed value to DocumentSummary field by field. Raises
+    RepairError if it is not an object.
+    """
+    if isinstance(data, list) and len(data) == 1 and isinstance(data[0], dict):
+        data = data[0]
+    if not isinstance(data, dict):
+        raise RepairError("top-level value is not an object")
+
+    try:
+        return DocumentSummary.model_validate(data), []
+    except ValidationError:
+        pass
+
+    fixes: List[str] = []
+    clean: Dict[str, Any] = {}
+    for name in DocumentSummary.model_fields:
+        if name not in data:
+            continue
+        ok, value = _coerce_field(name, data[name])
+        if ok:
+            clean[name] = value
+            if value != data[name]:
+                fixes.append(f"coerced:{name}")
+        else:
+            fixes.append(f"dropped:{name}")
+    return DocumentSummary.model_validate(clean), fixes
+
+
+def repair_summary(raw: str) -> RepairResult:
+    """
+    Local repair of raw model output into a DocumentSummary.
+    Raises RepairError when no valid model can be produced locally.
+    """
+    value, fixes = parse_lenient(raw)
+    summary, coerce_fixes = coerce_summary(value)
+    return RepairResult(summary=summary, fixes=fixes + coerce_fixes)
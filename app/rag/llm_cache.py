@@ -0,0 +1,46 @@
+"""
+Persistent cache for deterministic (temperature=0) LLM calls.
+
+Keys hash everything that can change the output: model, system prompt,
+user prompt and generation params. Entries expire after LLM_CACHE_TTL_S
+and the least recently used are evicted past LLM_CACHE_MAX_ENTRIES.
+"""
+import hashlib
+import json
+import os
+import threading
+from typing import Any, Dict, Optional
+
+from app.cache import DiskCache
+from app.config import DATA_DIR, LLM_CACHE_ENABLED, LLM_CACHE_MAX_ENTRIES, LLM_CACHE_TTL_S
+
+LLM_CACHE_PATH = os.path.join(DATA_DIR, "llm_cache.sqlite")
+
+_cache: Optional[DiskCache] = None
+_cache_lock = threading.Lock()
+
+
+def llm_cache_key(model: str, system: str, prompt: str, params: Dict[str, Any]) -> str:
+    payload = json.dumps(
+        {"model": model, "system": system, "prompt": prompt, "params": params},
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def open_llm_cache(path: str = LLM_CACHE_PATH) -> Optional[DiskCache]:
+    if not LLM_CACHE_ENABLED:
+        return None
+    return DiskCache(path, max_entries=LLM_CACHE_MAX_ENTRIES, ttl_seconds=LLM_CACHE_TTL_S)
+
+
+def get_llm_cache() -> Optional[DiskCache]:
+    """
+    Process-wide cache, opened on first use.
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = open_llm_cache()
+        return _cache
@@ -1,50 +1,431 @@
+import asyncio
 import os
-from typing import List, Dict, Any, Tuple
+import threading
+from typing import TYPE_CHECKING, List, Dict, Any, Iterable, Optional, Tuple
 
 import numpy as np
 import faiss
-from openai import OpenAI
 
-from app.config import OPENAI_API_KEY, EMBEDDING_MODEL, DATA_DIR
-from app.ingest.embed_store import load_jsonl
+from app.config import (
+    EMBED_BACKEND,
+    DATA_DIR,
+    RETRIEVAL_MODE,
+    RETRIEVAL_MODES,
+    RRF_K,
+    HYBRID_CANDIDATES,
+)
+from app.ingest.chunk_store import ChunkStoreReader, migrate_jsonl, store_exists, store_paths
+from app.ingest.embed_backends import EmbeddingBackend, check_index_meta, get_backend, index_meta_path, read_index_meta
+from app.ingest.index_types import search_params
+from app.ingest.lexical import LexicalIndex, lexical_path, rrf_fuse
+from app.tracing import span
 
-client = OpenAI(api_key=OPENAI_API_KEY)
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI, OpenAI
+
+# None: use the shared clients from app.clients (built on first use).
+# Tests assign fakes here.
+client: Optional["OpenAI"] = None
+aclient: Optional["AsyncOpenAI"] = None
+
+
+def get_client() -> "OpenAI":
+    if client is not None:
+        return client
+    from app.clients import get_openai_client
+    return get_openai_client()
+
+
+def get_aclient() -> "AsyncOpenAI":
+    if aclient is not None:
+        return aclient
+    from app.clients import get_async_openai_client
+    return get_async_openai_client()
 
-CHUNKS_PATH = os.path.join(DATA_DIR, "chunks.jsonl")
 INDEX_PATH = os.path.join(DATA_DIR, "faiss.index")
 
+# Memory-map the index instead of copying it into RAM where FAISS supports it.
+# IO_FLAG_MMAP_IFC (flat codes) only exists in newer FAISS builds.
+MMAP_FLAGS = faiss.IO_FLAG_MMAP | getattr(faiss, "IO_FLAG_MMAP_IFC", 0)
+
+
+def query_backend() -> EmbeddingBackend:
+    """
+    The configured EMBED_BACKEND, over this module's clients for openai
+    (each built only when a query first needs it).
+    """
+    if EMBED_BACKEND == "openai":
+        return get_backend("openai", client_factory=get_client, aclient_factory=get_aclient)
+    return get_backend(EMBED_BACKEND)
+
+
+def embed_queries(queries: List[str], backend: Optional[EmbeddingBackend] = None) -> np.ndarray:
+    """
+    (N, D) normalized query vectors; with openai, one embeddings request
+    (more only past the API's per-request input limit).
+    """
+    return (backend or query_backend()).embed(queries)
+
 
 def embed_query(query: str) -> np.ndarray:
-    if not OPENAI_API_KEY:
-        raise RuntimeError("OPENAI_API_KEY is missing. Add it to .env")
-
-    resp = client.embeddings.create(model=EMBEDDING_MODEL, input=[query])
-    vec = np.array(resp.data[0].embedding, dtype=np.float32).reshape(1, -1)
-    faiss.normalize_L2(vec)
-    return vec
-
-
-def search(query: str, top_k: int = 5) -> List[Dict[str, Any]]:
-    if not os.path.exists(CHUNKS_PATH) or not os.path.exists(INDEX_PATH):
-        raise RuntimeError("Index not found. Run ingestion first to create chunks.jsonl and faiss.index")
-
-    rows = load_jsonl(CHUNKS_PATH)
-    index = faiss.read_index(INDEX_PATH)
-
-    qvec = embed_query(query)
-    scores, ids = index.search(qvec, top_k)
-
-    results: List[Dict[str, Any]] = []
-    for score, idx in zip(scores[0].tolist(), ids[0].tolist()):
-        if idx == -1:
-            continue
-        r = rows[idx]
-        results.append({
-            "score": float(score),
-            "doc_id": r["doc_id"],
-            "chunk_id": r["chunk_id"],
-            "page_num": r["page_num"],
-            "text": r["text"],
-        })
-
-    return results
+    return embed_queries([query])
+
+
+async def embed_query_async(query: str, backend: Optional[EmbeddingBackend] = None) -> np.ndarray:
+    return await (backend or query_backend()).embed_async([query])
+
+
+def read_index(path: str, mmap: bool = True) -> faiss.Index:
+    if mmap:
+        # Not every index type supports every mmap mode (e.g. IVF lists
+        # reject MMAP_IFC combined with MMAP); try the richest first.
+        for flags in (MMAP_FLAGS, faiss.IO_FLAG_MMAP):
+            try:
+                return faiss.read_index(path, flags)
+            except RuntimeError:
+                pass
+    return faiss.read_index(path)
+
+
+class Retriever:
+    """
+    Long-lived view over the chunk store + faiss.index + lexical index.
+    Memory-maps the store and index once and only reloads when the on-disk
+    artifacts change (mtime/size). Hits are resolved by vector id, so only
+    the top-k rows are ever decoded. A hit on a chunk that was deduplicated
+    at ingest lists every place it occurs under "locations".
+
+    mode picks the retrieval path: "vector" (dense, one embedding per
+    query), "lexical" (BM25 only, no embeddings) or "hybrid" (both, fused
+    with reciprocal rank fusion). Queries are embedded with backend
+    (default: EMBED_BACKEND), which must match index_meta.json.
+    """
+
+    def __init__(
+        self,
+        data_dir: str = DATA_DIR,
+        index_path: str = INDEX_PATH,
+        mmap: bool = True,
+        mode: str = RETRIEVAL_MODE,
+        backend: Optional[EmbeddingBackend] = None,
+    ):
+        if mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Unknown retrieval mode {mode!r}; expected one of {', '.join(RETRIEVAL_MODES)}")
+
+        self.data_dir = data_dir
+        self.index_path = index_path
+        self.mmap = mmap
+        self.mode = mode
+        self.backend = backend
+
+        # (store, index, lexical, index meta) swapped as one tuple so readers
+        # never mix generations.
+        self._state: Tuple[
+            Optional[ChunkStoreReader], Optional[faiss.Index], Optional[LexicalIndex], Optional[Dict[str, Any]]
+        ] = (None, None, None, None)
+
+        self._stamp: Optional[Tuple[int, ...]] = None
+        self._lock = threading.Lock()
+
+    @property
+    def store(self) -> Optional[ChunkStoreReader]:
+        return self._state[0]
+
+    @property
+    def index(self) -> Optional[faiss.Index]:
+        return self._state[1]
+
+    @property
+    def lexical(self) -> Optional[LexicalIndex]:
+        return self._state[2]
+
+    def query_backend(self) -> EmbeddingBackend:
+        return self.backend or query_backend()
+
+    def _disk_stamp(self) -> Tuple[int, ...]:
+        paths = store_paths(self.data_dir)
+        stamp: Tuple[int, ...] = ()
+        for path in (paths["idx"], paths["docs"], self.index_path):
+            st = os.stat(path)
+            stamp += (st.st_mtime_ns, st.st_size)
+        # Optional: stores ingested before they existed have none of these.
+        for path in (lexical_path(self.data_dir), index_meta_path(self.index_path), paths["dups"]):
+            if os.path.exists(path):
+                st = os.stat(path)
+                stamp += (st.st_mtime_ns, st.st_size)
+        return stamp
+
+    def ensure_loaded(self) -> None:
+        if not store_exists(self.data_dir) and os.path.exists(store_paths(self.data_dir)["jsonl"]):
+            with self._lock:
+                migrate_jsonl(self.data_dir)
+
+        if not store_exists(self.data_dir) or not os.path.exists(self.index_path):
+            raise RuntimeError("Index not found. Run ingestion first to create the chunk store and faiss.index")
+
+        stamp = self._disk_stamp()
+        if stamp == self._stamp:
+            return
+
+        with self._lock:
+            if stamp == self._stamp:
+                return
+
+            store = ChunkStoreReader(self.data_dir)
+            index = read_index(self.index_path, mmap=self.mmap)
+            lex = lexical_path(self.data_dir)
+            lexical = LexicalIndex.load(lex) if os.path.exists(lex) else None
+            meta = read_index_meta(self.index_path)
+            if meta is not None and meta.get("dim") != index.d:
+                raise RuntimeError(
+                    f"{self.index_path} has dim {index.d} but index_meta.json says {meta.get('dim')}; "
+                    "run `python -m app.cli reindex`"
+                )
+
+            self._state = (store, index, lexical, meta)
+            # An ingest may be halfway through replacing the files;
+            # only remember the stamp once they agree, so the next call retries.
+            consistent = index.ntotal == store.vectors and (lexical is None or len(lexical) == store.vectors)
+            self._stamp = stamp if consistent else None
+
+    @staticmethod
+    def _hits(store: ChunkStoreReader, scored: Iterable[Tuple[float, int]]) -> List[Dict[str, Any]]:
+        results: List[Dict[str, Any]] = []
+        for score, idx in scored:
+            if idx == -1:
+                continue
+            r = store.get(idx)
+            if r is None:
+                continue
+            hit = {
+                "score": float(score),
+                "doc_id": r["doc_id"],
+                "chunk_id": r["chunk_id"],
+                "page_num": r["page_num"],
+                "text": r["text"],
+            }
+            if "page_end" in r:
+                hit["page_end"] = r["page_end"]
+            if len(store.dups) and len(store.aliases(idx)):
+                # Deduplicated at ingest: every place this text occurs.
+                hit["locations"] = store.locations(idx)
+            results.append(hit)
+        return results
+
+    def _search(
+        self,
+        queries: List[str],
+        qvecs: Optional[np.ndarray],
+        mode: str,
+        top_k: int,
+        doc_id: Optional[str],
+        page_num: Optional[int],
+        nprobe: Optional[int],
+        ef_search: Optional[int],
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Shared body of every search entry point. qvecs is None in lexical mode.
+        """
+        with span("search", mode=mode, queries=len(queries), top_k=top_k) as s:
+            results = self._search_loaded(queries, qvecs, mode, top_k, doc_id, page_num, nprobe, ef_search)
+            s.set(hits=sum(len(r) for r in results))
+        return results
+
+    def _search_loaded(
+        self,
+        queries: List[str],
+        qvecs: Optional[np.ndarray],
+        mode: str,
+        top_k: int,
+        doc_id: Optional[str],
+        page_num: Optional[int],
+        nprobe: Optional[int],
+        ef_search: Optional[int],
+    ) -> List[List[Dict[str, Any]]]:
+        self.ensure_loaded()
+        store, index, lexical, meta = self._state
+
+        if qvecs is not None:
+            check_index_meta(meta, self.query_backend(), qvecs.shape[1])
+            if qvecs.shape[1] != index.d:
+                raise ValueError(f"Query embedding dim {qvecs.shape[1]} does not match index dim {index.d}")
+
+        if mode != "vector" and lexical is None:
+            raise RuntimeError("Lexical index not found. Run `python -m app.cli reindex` to build it")
+
+        allowed = None
+        if doc_id is not None or page_num is not None:
+            allowed = store.ids_matching(doc_id=doc_id, page_num=page_num)
+            if not len(allowed):
+                return [[] for _ in queries]
+
+        if mode == "lexical":
+            return [
+                self._hits(store, zip(*(a.tolist() for a in lexical.search(q, top_k, allowed=allowed))))
+                for q in queries
+            ]
+
+        # Hybrid draws a deeper candidate list from each side before fusing.
+        k = top_k if mode == "vector" else max(top_k, HYBRID_CANDIDATES)
+        sel = faiss.IDSelectorBatch(allowed) if allowed is not None else None
+        params = search_params(index, nprobe=nprobe, ef_search=ef_search, sel=sel)
+        scores, ids = index.search(qvecs, k, params=params)
+
+        if mode == "vector":
+            return [self._hits(store, zip(s, i)) for s, i in zip(scores.tolist(), ids.tolist())]
+
+        all_results: List[List[Dict[str, Any]]] = []
+        for q, dense_ids in zip(queries, ids.tolist()):
+            _, lex_ids = lexical.search(q, k, allowed=allowed)
+            fused = rrf_fuse([[i for i in dense_ids if i != -1], lex_ids.tolist()], k=RRF_K)[:top_k]
+            all_results.append(self._hits(store, ((score, vid) for vid, score in fused)))
+        return all_results
+
+    def _mode(self, mode: Optional[str]) -> str:
+        mode = mode or self.mode
+        if mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Unknown retrieval mode {mode!r}; expected one of {', '.join(RETRIEVAL_MODES)}")
+        return mode
+
+    def search_vectors(
+        self,
+        qvecs: np.ndarray,
+        top_k: int = 5,
+        doc_id: Optional[str] = None,
+        page_num: Optional[int] = None,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Dense hits for each row of qvecs from a single matrix index.search.
+        nprobe (ivf, ivfpq) and ef_search (hnsw) override the index defaults
+        for this call only.
+        """
+        return self._search(
+            [""] * len(qvecs), qvecs, "vector", top_k, doc_id, page_num, nprobe, ef_search,
+        )
+
+    def search_vector(
+        self,
+        qvec: np.ndarray,
+        top_k: int = 5,
+        doc_id: Optional[str] = None,
+        page_num: Optional[int] = None,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        return self.search_vectors(
+            qvec.reshape(1, -1),
+            top_k=top_k,
+            doc_id=doc_id,
+            page_num=page_num,
+            nprobe=nprobe,
+            ef_search=ef_search,
+        )[0]
+
+    def search(
+        self,
+        query: str,
+        top_k: int = 5,
+        doc_id: Optional[str] = None,
+        page_num: Optional[int] = None,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        mode: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        return self.search_many(
+            [query],
+            top_k=top_k,
+            doc_id=doc_id,
+            page_num=page_num,
+            nprobe=nprobe,
+            ef_search=ef_search,
+            mode=mode,
+        )[0]
+
+    async def search_async(
+        self,
+        query: str,
+        top_k: int = 5,
+        doc_id: Optional[str] = None,
+        page_num: Optional[int] = None,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        mode: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        search() for asyncio: async embedding request (skipped in lexical
+        mode); loading and the index searches run in a worker thread so the
+        event loop is never blocked.
+        """
+        mode = self._mode(mode)
+        qvec = None
+        if mode != "lexical":
+            backend = self.query_backend()
+            with span("embed", queries=1, backend=backend.name):
+                qvec = await embed_query_async(query, backend)
+        results = await asyncio.to_thread(
+            self._search, [query], qvec, mode, top_k, doc_id, page_num, nprobe, ef_search,
+        )
+        return results[0]
+
+    def search_many(
+        self,
+        queries: List[str],
+        top_k: int = 5,
+        doc_id: Optional[str] = None,
+        page_num: Optional[int] = None,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        mode: Optional[str] = None,
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Batched search: one embeddings request and one index.search for all
+        queries (neither in lexical mode).
+        """
+        mode = self._mode(mode)
+        if not queries:
+            return []
+        self.ensure_loaded()
+        qvecs = None
+        if mode != "lexical":
+            backend = self.query_backend()
+            with span("embed", queries=len(queries), backend=backend.name):
+                qvecs = embed_queries(queries, backend)
+        return self._search(queries, qvecs, mode, top_k, doc_id, page_num, nprobe, ef_search)
+
+
+_default_retriever: Optional[Retriever] = None
+_default_lock = threading.Lock()
+
+
+def get_retriever() -> Retriever:
+    """
+    Process-wide Retriever over the default DATA_DIR artifacts.
+    """
+    global _default_retriever
+    if _default_retriever is None:
+        with _default_lock:
+            if _default_retriever is None:
+                _default_retriever = Retriever()
+    return _default_retriever
+
+
+def search(
+    query: str,
+    top_k: int = 5,
+    doc_id: Optional[str] = None,
+    page_num: Optional[int] = None,
+    nprobe: Optional[int] = None,
+    ef_search: Optional[int] = None,
+    mode: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    return get_retriever().search(
+        query,
+        top_k=top_k,
+        doc_id=doc_id,
+        page_num=page_num,
+        nprobe=nprobe,
+        ef_search=ef_search,
+        mode=mode,
+    )
@@ -0,0 +1,161 @@
+"""
+Incremental validation of a streamed DocumentSummary JSON object.
+
+FieldStreamParser.feed() takes raw text deltas as they arrive. It tracks
+the top-level object with a small state machine, so each field is
+validated against its DocumentSummary annotation as soon as its value is
+complete. Output that can no longer become a valid object (prose where a
+key should be, a malformed value or separator, no '{' after a short
+preamble) raises StreamAbort immediately, so the caller can stop the
+generation and go straight to repair. A well-formed value that fails its
+field's validation (e.g. a string where a list belongs) is only recorded
+in `invalid`; the stream is consumed to the end so later fields are kept,
+and the final parse or repair deals with the bad field.
+"""
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+from pydantic import TypeAdapter, ValidationError
+
+from app.rag.schema import DocumentSummary
+
+# Tolerated text before the opening '{' (e.g. a ```json fence or "Here is the JSON:").
+MAX_PREAMBLE_CHARS = 200
+
+_FIELD_ADAPTERS: Dict[str, TypeAdapter] = {
+    name: TypeAdapter(f.annotation) for name, f in DocumentSummary.model_fields.items()
+}
+
+_WS = " \t\r\n"
+
+# States
+_PREAMBLE, _KEY_OR_END, _KEY, _COLON, _VALUE, _AFTER_VALUE, _DONE = range(7)
+
+
+class StreamAbort(Exception):
+    pass
+
+
+class FieldStreamParser:
+    def __init__(self):
+        self.text = ""
+        self.fields: Dict[str, Any] = {}
+        self.invalid: Dict[str, str] = {}  # field -> validation error
+        self.done = False
+
+        self._state = _PREAMBLE
+        self._pos = 0
+        self._key_start = 0
+        self._key: Optional[str] = None
+        self._value_start = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, delta: str) -> List[Tuple[str, Any]]:
+        """
+        Consume a text delta; returns the (field, validated value) pairs
+        completed by it. Raises StreamAbort on unrecoverable structure.
+        """
+        self.text += delta
+        completed: List[Tuple[str, Any]] = []
+        text = self.text
+
+        while self._pos < len(text):
+            ch = text[self._pos]
+            state = self._state
+
+            if state == _PREAMBLE:
+                if ch == "{":
+                    self._state = _KEY_OR_END
+                elif self._pos >= MAX_PREAMBLE_CHARS:
+                    raise StreamAbort("no JSON object at start of output")
+
+            elif state == _KEY_OR_END:
+                if ch == '"':
+                    self._state = _KEY
+                    self._key_start = self._pos
+                elif ch == "}":
+                    self._finish()
+                elif ch not in _WS:
+                    raise StreamAbort(f"expected a key, got {ch!r}")
+
+            elif state == _KEY:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._key = json.loads(text[self._key_start:self._pos + 1])
+                    self._state = _COLON
+
+            elif state == _COLON:
+                if ch == ":":
+                    self._state = _VALUE
+                    self._value_start = self._pos + 1
+                    self._depth = 0
+                elif ch not in _WS:
+                    raise StreamAbort(f"expected ':' after {self._key!r}, got {ch!r}")
+
+            elif state == _VALUE:
+                if self._in_string:
+                    if self._escape:
+                        self._escape = False
+                    elif ch == "\\":
+                        self._escape = True
+                    elif ch == '"':
+                        self._in_string = False
+                elif ch == '"':
+                    self._in_string = True
+                elif ch in "[{":
+                    self._depth += 1
+                elif ch in "]}" and self._depth > 0:
+                    self._depth -= 1
+                elif self._depth == 0 and ch in ",}":
+                    completed.append(self._complete_value(text[self._value_start:self._pos]))
+                    if ch == ",":
+                        self._state = _KEY_OR_END
+                    else:
+                        self._finish()
+
+            elif state == _DONE:
+                break
+
+            self._pos += 1
+
+        return [c for c in completed if c is not None]
+
+    def _complete_value(self, raw: str) -> Optional[Tuple[str, Any]]:
+        key = self._key
+        try:
+            value = json.loads(raw)
+        except json.JSONDecodeError:
+            raise StreamAbort(f"invalid JSON value for {key!r}: {raw.strip()[:40]!r}")
+
+        adapter = _FIELD_ADAPTERS.get(key)
+        if adapter is None:
+            # Unknown keys are ignored by the schema as well.
+            return None
+        try:
+            value = adapter.validate_python(value)
+        except ValidationError as e:
+            self.invalid[key] = e.errors()[0]["msg"]
+            return None
+
+        self.fields[key] = value
+        return key, value
+
+    def _finish(self) -> None:
+        self._state = _DONE
+        self.done = True
+
+    def result(self) -> DocumentSummary:
+        """
+        The complete object, once done (raises StreamAbort if the stream
+        ended early or a field failed validation).
+        """
+        if not self.done:
+            raise StreamAbort("output ended before the JSON object was closed")
+        if self.invalid:
+            raise StreamAbort(f"invalid fields: {', '.join(sorted(self.invalid))}")
+        return DocumentSummary.model_validate(self.fields)
@@ -0,0 +1,177 @@
+"""
+Local HTTP front end for analyze_document_async (stdlib asyncio only).
+
+    POST /analyze  {"query": "...", "top_k": 5, "no_cache": false}
+                   -> 200 DocumentSummary JSON
+    GET  /health   -> {"status": "ok", "in_flight": n, "coalescing": {"calls": n, "shared": n}}
+    GET  /metrics  -> per-stage latency summaries, Prometheus text format
+
+Each request is bounded by a timeout (504 when exceeded). At most
+max_concurrency analyses run at once; further requests wait for a slot
+within their own timeout. One request per connection.
+"""
+import asyncio
+import json
+import logging
+from typing import Any, Dict, Optional, Tuple
+
+from app.clients import coalescing_stats
+from app.config import SERVE_HOST, SERVE_PORT, SERVE_MAX_CONCURRENCY, SERVE_TIMEOUT_S
+from app.rag.extract import analyze_document_async
+from app.rag.retrieve import Retriever, get_retriever
+from app.tracing import get_tracer, prometheus_text
+
+logger = logging.getLogger("llm_doc_assistant")
+
+MAX_BODY_BYTES = 1_000_000
+READ_TIMEOUT_S = 10.0
+
+REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+    504: "Gateway Timeout",
+}
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+async def read_request(reader: asyncio.StreamReader) -> Tuple[str, str, bytes]:
+    request_line = (await reader.readline()).decode("latin-1").strip()
+    parts = request_line.split()
+    if len(parts) != 3:
+        raise HTTPError(400, "malformed request line")
+    method, path, _ = parts
+
+    headers: Dict[str, str] = {}
+    while True:
+        line = (await reader.readline()).decode("latin-1").strip()
+        if not line:
+            break
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    length = int(headers.get("content-length") or 0)
+    if length > MAX_BODY_BYTES:
+        raise HTTPError(413, "request body too large")
+    body = await reader.readexactly(length) if length else b""
+    return method, path.split("?", 1)[0], body
+
+
+def write_response(writer: asyncio.StreamWriter, status: int, payload: Any) -> None:
+    # str payloads are plain text (the Prometheus exposition format), the rest JSON.
+    if isinstance(payload, str):
+        body, content_type = payload.encode("utf-8"), "text/plain; version=0.0.4"
+    else:
+        body, content_type = json.dumps(payload, ensure_ascii=False).encode("utf-8"), "application/json"
+    head = (
+        f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+        f"Content-Type: {content_type}\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        "Connection: close\r\n\r\n"
+    )
+    writer.write(head.encode("latin-1") + body)
+
+
+def parse_analyze_body(body: bytes) -> Dict[str, Any]:
+    try:
+        req = json.loads(body or b"{}")
+    except json.JSONDecodeError:
+        raise HTTPError(400, "body must be JSON")
+    if not isinstance(req, dict) or not isinstance(req.get("query"), str) or not req["query"].strip():
+        raise HTTPError(400, "'query' must be a non-empty string")
+    top_k = req.get("top_k", 5)
+    if not isinstance(top_k, int) or not 1 <= top_k <= 100:
+        raise HTTPError(400, "'top_k' must be an integer in [1, 100]")
+    return {"query": req["query"], "top_k": top_k, "use_cache": not req.get("no_cache", False)}
+
+
+class AnalyzeServer:
+    def __init__(
+        self,
+        retriever: Optional[Retriever] = None,
+        max_concurrency: int = SERVE_MAX_CONCURRENCY,
+        timeout_s: float = SERVE_TIMEOUT_S,
+    ):
+        self.retriever = retriever
+        self.timeout_s = timeout_s
+        self.in_flight = 0
+        self._slots = asyncio.Semaphore(max_concurrency)
+
+    async def analyze(self, query: str, top_k: int, use_cache: bool) -> Dict[str, Any]:
+        async with self._slots:
+            self.in_flight += 1
+            try:
+                result = await analyze_document_async(
+                    query,
+                    top_k=top_k,
+                    retriever=self.retriever or get_retriever(),
+                    use_cache=use_cache,
+                )
+            finally:
+                self.in_flight -= 1
+        return result.model_dump()
+
+    async def route(self, method: str, path: str, body: bytes) -> Tuple[int, Any]:
+        if path == "/health":
+            return 200, {"status": "ok", "in_flight": self.in_flight, "coalescing": coalescing_stats()}
+        if path == "/metrics":
+            return 200, prometheus_text(get_tracer().summaries())
+        if path != "/analyze":
+            raise HTTPError(404, "not found")
+        if method != "POST":
+            raise HTTPError(405, "use POST")
+
+        req = parse_analyze_body(body)
+        try:
+            # The timeout covers waiting for a slot as well as the analysis.
+            return 200, await asyncio.wait_for(self.analyze(**req), timeout=self.timeout_s)
+        except asyncio.TimeoutError:
+            raise HTTPError(504, f"analysis exceeded {self.timeout_s:g}s")
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            try:
+                try:
+                    method, path, body = await asyncio.wait_for(read_request(reader), timeout=READ_TIMEOUT_S)
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError):
+                    # Client-side only: errors raised by the pipeline are server faults (500).
+                    raise HTTPError(400, "incomplete or malformed request")
+                status, payload = await self.route(method, path, body)
+            except HTTPError as e:
+                status, payload = e.status, {"error": str(e)}
+            except Exception as e:
+                logger.exception("serve: analyze failed")
+                status, payload = 500, {"error": f"{type(e).__name__}: {e}"}
+
+            write_response(writer, status, payload)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host: str = SERVE_HOST, port: int = SERVE_PORT) -> asyncio.AbstractServer:
+        return await asyncio.start_server(self.handle, host, port, backlog=1024)
+
+
+async def serve_forever(
+    host: str = SERVE_HOST,
+    port: int = SERVE_PORT,
+    max_concurrency: int = SERVE_MAX_CONCURRENCY,
+    timeout_s: float = SERVE_TIMEOUT_S,
+    mode: Optional[str] = None,
+) -> None:
+    retriever = Retriever(mode=mode) if mode else None
+    app = AnalyzeServer(retriever=retriever, max_concurrency=max_concurrency, timeout_s=timeout_s)
+    server = await app.start(host, port)
+    logger.info(f"serve: listening on http://{host}:{port} max_concurrency={max_concurrency} timeout_s={timeout_s:g}")
+    async with server:
+        await server.serve_forever()
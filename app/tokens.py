@@ -0,0 +1,51 @@
+import re
+from functools import lru_cache
+
+from app.config import TIKTOKEN_CACHE_DIR
+
+# Rough GPT-style pre-tokenization: words, numbers and single punctuation marks.
+_PIECE_RE = re.compile(r"\w+|[^\w\s]")
+
+# Average characters per BPE token for long words (~4 for English).
+CHARS_PER_TOKEN = 4
+
+
+# Encoding of the gpt-4.1 / gpt-4o models the pipeline calls (MODEL in
+# app.rag.extract).
+ENCODING = "o200k_base"
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    """
+    Exact tokenizer, only when tiktoken is installed and TIKTOKEN_CACHE_DIR
+    is configured; None otherwise, and counting falls back to the estimator.
+    tiktoken downloads an encoding it has not cached, so token counting
+    only uses it where a cache directory was set up for it (pre-fill it to
+    run offline). A failed load also means the estimator.
+    """
+    if not TIKTOKEN_CACHE_DIR:
+        return None
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(ENCODING)
+    except Exception:
+        return None
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Fast approximate token count: one token per short word/punctuation mark,
+    long words split every CHARS_PER_TOKEN characters.
+    """
+    n = 0
+    for m in _PIECE_RE.finditer(text):
+        n += 1 + (m.end() - m.start() - 1) // CHARS_PER_TOKEN
+    return n
+
+
+def count_tokens(text: str) -> int:
+    enc = _encoding()
+    if enc is not None:
+        return len(enc.encode(text, disallowed_special=()))
+    return estimate_tokens(text)
@@ -0,0 +1,245 @@
+"""
+Per-stage tracing for the analyze pipeline (stdlib only).
+
+    with span("llm", streamed=False) as s:
+        raw = call_llm(prompt)
+        s.set(raw_chars=len(raw))
+
+Spans nest through a ContextVar, so they follow asyncio tasks and
+asyncio.to_thread; thread pools need contextvars.copy_context().run.
+Every finished span:
+- feeds a per-name latency histogram (p50/p95/p99, exported as JSONL
+  or Prometheus text)
+- is logged as one "name: ms=... key=value" line
+- is appended to TRACE_PATH as one JSON line, when set
+
+`python -m app.cli stats trace.jsonl` summarizes such a file.
+"""
+import json
+import logging
+import math
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from app.config import TRACE_PATH
+
+logger = logging.getLogger("llm_doc_assistant")
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+# Log-spaced histogram buckets: bucket i covers up to MIN_MS * GROWTH**i,
+# so a quantile is off by at most GROWTH (5%) whatever the magnitude.
+MIN_MS = 0.01
+GROWTH = 1.05
+N_BUCKETS = 400  # ~0.01 ms .. ~3 h
+
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str] = None
+    start: float = 0.0  # unix time, seconds
+    duration_ms: float = 0.0
+    attrs: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+
+    def set(self, **attrs: Any) -> None:
+        self.attrs.update(attrs)
+
+
+class LatencyHistogram:
+    def __init__(self):
+        self.buckets = [0] * (N_BUCKETS + 1)
+        self.count = 0
+        self.sum_ms = 0.0
+        self.min_ms = math.inf
+        self.max_ms = 0.0
+
+    def add(self, ms: float) -> None:
+        i = 0 if ms <= MIN_MS else min(N_BUCKETS, int(math.ceil(math.log(ms / MIN_MS, GROWTH))))
+        self.buckets[i] += 1
+        self.count += 1
+        self.sum_ms += ms
+        self.min_ms = min(self.min_ms, ms)
+        self.max_ms = max(self.max_ms, ms)
+
+    def quantile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if n and seen >= rank:
+                # Geometric midpoint of the bucket, clamped to observed values.
+                upper = MIN_MS * GROWTH ** i
+                return min(self.max_ms, max(self.min_ms, upper / math.sqrt(GROWTH)))
+        return self.max_ms
+
+    def summary(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {"count": self.count, "sum_ms": round(self.sum_ms, 3)}
+        for q in QUANTILES:
+            out[f"p{int(q * 100)}_ms"] = round(self.quantile(q), 3)
+        out["max_ms"] = round(self.max_ms, 3)
+        return out
+
+
+class Tracer:
+    def __init__(self, path: Optional[str] = TRACE_PATH or None):
+        self.path = path
+        self.histograms: Dict[str, LatencyHistogram] = {}
+        self._lock = threading.Lock()
+        self._file = None
+
+    def set_path(self, path: Optional[str]) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            self.path = path
+
+    def record(self, span: Span) -> None:
+        attrs = " ".join(f"{k}={v}" for k, v in span.attrs.items())
+        logger.info(f"{span.name}: ms={span.duration_ms:.1f}" + (f" {attrs}" if attrs else ""))
+
+        line = json.dumps(asdict(span), ensure_ascii=False, default=str) if self.path else None
+        with self._lock:
+            hist = self.histograms.get(span.name)
+            if hist is None:
+                hist = self.histograms[span.name] = LatencyHistogram()
+            hist.add(span.duration_ms)
+
+            if line is not None:
+                if self._file is None:
+                    os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                    self._file = open(self.path, "a", encoding="utf-8", buffering=1)
+                self._file.write(line + "\n")
+
+    def summaries(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {name: h.summary() for name, h in sorted(self.histograms.items())}
+
+    def reset(self) -> None:
+        with self._lock:
+            self.histograms.clear()
+
+
+_current: ContextVar[Optional[Span]] = ContextVar("llm_doc_span", default=None)
+_tracer = Tracer()
+
+
+def get_tracer() -> Tracer:
+    return _tracer
+
+
+def _new_id() -> str:
+    return f"{random.getrandbits(64):016x}"
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+def annotate(**attrs: Any) -> None:
+    """
+    Adds attributes to the innermost open span (no-op outside one).
+    """
+    s = _current.get()
+    if s is not None:
+        s.set(**attrs)
+
+
+@contextmanager
+def span(name: str, **attrs: Any) -> Iterator[Span]:
+    parent = _current.get()
+    s = Span(
+        name=name,
+        trace_id=parent.trace_id if parent is not None else _new_id(),
+        span_id=_new_id(),
+        parent_id=parent.span_id if parent is not None else None,
+        start=time.time(),
+        attrs=dict(attrs),
+    )
+    token = _current.set(s)
+    t0 = time.perf_counter()
+    try:
+        yield s
+    except BaseException as e:
+        s.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        s.duration_ms = (time.perf_counter() - t0) * 1000
+        _current.reset(token)
+        _tracer.record(s)
+
+
+# --- export ---
+
+def read_trace(path: str) -> Iterator[Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def histograms_from_spans(spans: Iterable[Dict[str, Any]]) -> Dict[str, LatencyHistogram]:
+    hists: Dict[str, LatencyHistogram] = {}
+    for s in spans:
+        hists.setdefault(s["name"], LatencyHistogram()).add(float(s["duration_ms"]))
+    return hists
+
+
+def summaries_jsonl(summaries: Dict[str, Dict[str, Any]]) -> str:
+    return "".join(json.dumps({"span": name, **summary}) + "\n" for name, summary in summaries.items())
+
+
+def _prom_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def prometheus_text(summaries: Dict[str, Dict[str, Any]], metric: str = "llm_doc_span_duration_ms") -> str:
+    """
+    Prometheus text exposition: one summary metric, labelled by span.
+    """
+    lines: List[str] = [
+        f"# HELP {metric} Duration of analyze pipeline stages in milliseconds.",
+        f"# TYPE {metric} summary",
+    ]
+    for name, s in summaries.items():
+        label = f'span="{_prom_label(name)}"'
+        for q in QUANTILES:
+            lines.append(f'{metric}{{{label},quantile="{q:g}"}} {s[f"p{int(q * 100)}_ms"]}')
+        lines.append(f"{metric}_sum{{{label}}} {s['sum_ms']}")
+        lines.append(f"{metric}_count{{{label}}} {s['count']}")
+    return "\n".join(lines) + "\n"
+
+
+def attribute_rates(spans: Iterable[Dict[str, Any]]) -> Dict[str, Dict[str, float]]:
+    """
+    Per span name, the share of spans where each boolean attribute was true
+    (e.g. llm cache_hit) and the error rate.
+    """
+    totals: Dict[str, int] = {}
+    trues: Dict[str, Dict[str, int]] = {}
+    for s in spans:
+        name = s["name"]
+        totals[name] = totals.get(name, 0) + 1
+        counts = trues.setdefault(name, {})
+        if s.get("error"):
+            counts["error"] = counts.get("error", 0) + 1
+        for k, v in (s.get("attrs") or {}).items():
+            if isinstance(v, bool):
+                counts[k] = counts.get(k, 0) + int(v)
+    return {
+        name: {k: round(n / totals[name], 4) for k, n in sorted(counts.items())}
+        for name, counts in trues.items()
+        if counts
+    }
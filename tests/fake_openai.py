@@ -0,0 +1,32 @@
+"""
+Test helpers around the offline fake OpenAI server (app.bench.fake_openai).
+"""
+import numpy as np
+
+from app.bench.fake_openai import FakeOpenAIServer, fake_embedding  # noqa: F401  (used by the tests)
+
+
+def write_fake_corpus(data_dir, texts, doc_id="cv"):
+    """
+    Chunk store + flat faiss.index + lexical index in data_dir whose vectors
+    match what the fake server returns for the same texts. Returns the index path.
+    """
+    import os
+
+    import faiss
+
+    from app.ingest.chunk_store import ChunkStoreWriter
+    from app.ingest.index_types import build_index
+    from app.ingest.lexical import LexicalIndex, lexical_path
+
+    w = ChunkStoreWriter(data_dir)
+    for i, t in enumerate(texts):
+        w.append({"doc_id": doc_id, "chunk_id": f"{doc_id}-{i}", "page_num": 1, "text": t, "vector_id": i})
+    w.commit()
+
+    vectors = np.stack([fake_embedding(t) for t in texts])
+    faiss.normalize_L2(vectors)
+    index_path = os.path.join(data_dir, "faiss.index")
+    faiss.write_index(build_index(vectors, np.arange(len(texts)), index_type="flat"), index_path)
+    LexicalIndex().updated([], enumerate(texts)).save(lexical_path(data_dir))
+    return index_path
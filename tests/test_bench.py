@@ -0,0 +1,54 @@
+import json
+
+from openai import APIStatusError, OpenAI
+
+from app.bench.fake_openai import FakeOpenAIServer
+from app.bench.suite import compare, parse_args, run
+
+# Error injection is seeded and counted; latency applies per endpoint.
+with FakeOpenAIServer(error_rate=0.5, error_status=503, seed=7, dim=8) as server:
+    client = OpenAI(base_url=server.base_url, api_key="test", max_retries=0)
+    ok = failed = 0
+    for i in range(40):
+        try:
+            resp = client.embeddings.create(model="m", input=[f"text {i}", "other"])
+            assert len(resp.data[0].embedding) == 8
+            ok += 1
+        except APIStatusError as e:
+            assert e.status_code == 503
+            failed += 1
+    stats = server.stats()
+    assert stats["errors_injected"] == failed and 5 < failed < 35, stats
+    assert stats["embedded_inputs"] == 2 * ok
+
+server = FakeOpenAIServer(latency_s=0.01, embed_latency_s=0.5, embed_per_item_s=0.1)
+assert server.request_latency({"input": ["a", "b"]}, embeddings=True) == 0.5 + 0.2
+assert server.request_latency({"input": "x"}, embeddings=False) == 0.01
+server.httpd.server_close()
+
+# A tiny run of the whole suite: every scenario reports, JSON round-trips.
+args = parse_args([
+    "--pages", "20", "--sizes", "200,500", "--queries", "10", "--dim", "32",
+    "--analyze-pages", "5", "--analyze-queries", "4", "--embed-latency-ms", "1",
+    "--llm-latency-ms", "1", "--jitter-ms", "0",
+])
+results = json.loads(json.dumps(run(args)))
+
+ingest = results["scenarios"]["ingest"]
+assert ingest["pages"] == 20 and ingest["chunks"] > 0 and ingest["chunks_per_s"] > 0
+assert ingest["rss_peak_mb"] > 0
+
+sizes = results["scenarios"]["search"]["sizes"]
+assert [s["chunks"] for s in sizes] == [200, 500]
+assert all(s["vector"]["p99_ms"] >= s["vector"]["p50_ms"] for s in sizes)
+
+analyze = results["scenarios"]["analyze"]
+assert analyze["batch"]["failed"] == 0
+assert {"analyze", "embed", "search", "llm", "parse"} <= set(analyze["stages"])
+assert results["fake_server"]["requests"] > 0
+
+lines = compare(results, results)
+assert lines and all(line.endswith("+0.0%") for line in lines)
+assert any("search.sizes[500].vector.p50_ms" in line for line in lines)
+
+print("OK")
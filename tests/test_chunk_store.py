@@ -0,0 +1,87 @@
+import json
+import os
+import tempfile
+
+import numpy as np
+
+from app.ingest.chunk_store import (
+    RECORD,
+    ChunkStoreReader,
+    ChunkStoreWriter,
+    blob_files,
+    blob_path,
+    migrate_jsonl,
+    store_paths,
+)
+
+data_dir = tempfile.mkdtemp()
+
+# Legacy chunks.jsonl (rows addressed by position) -> binary store
+with open(os.path.join(data_dir, "chunks.jsonl"), "w", encoding="utf-8") as f:
+    for i in range(6):
+        doc = "a" if i < 3 else "b"
+        f.write(json.dumps({"doc_id": doc, "chunk_id": f"{doc}-{i}", "page_num": i % 2 + 1, "text": f"text {i}"}) + "\n")
+
+assert migrate_jsonl(data_dir)
+store = ChunkStoreReader(data_dir)
+print("Migrated rows:", len(store))
+assert len(store) == 6
+assert store.get(4)["chunk_id"] == "b-4"
+assert store.ids_matching(doc_id="a").tolist() == [0, 1, 2]
+assert store.ids_matching(doc_id="b", page_num=1).tolist() == [4]
+
+# Replace doc "a": its ids disappear, new rows get fresh ids
+w = ChunkStoreWriter(data_dir)
+next_id = w.next_id
+removed = w.remove_docs({"a"})
+for i in range(2):
+    w.append({"doc_id": "a", "chunk_id": f"a-new-{i}", "page_num": 1, "text": "new", "vector_id": next_id + i})
+w.commit()
+
+store = ChunkStoreReader(data_dir)
+print("Removed ids:", removed.tolist(), "rows now:", len(store))
+assert removed.tolist() == [0, 1, 2]
+assert store.get(0) is None
+assert store.get(6)["chunk_id"] == "a-new-0"
+assert [r["chunk_id"] for r in store.iter_rows()] == ["b-3", "b-4", "b-5", "a-new-0", "a-new-1"]
+
+# Compaction: the compacted blob gets a new name and the old one stays until
+# the idx pointing at the new one is published, so a reader opening at any
+# point pairs an idx with its own blob.
+w = ChunkStoreWriter(data_dir)
+next_id = w.next_id
+w.remove_docs({"b"})
+for i in range(3):
+    w.append({"doc_id": "c", "chunk_id": f"c-{i}", "page_num": 1, "text": f"c text {i}", "vector_id": next_id + i})
+old_reader = ChunkStoreReader(data_dir)
+w._blob.flush()
+w.records = np.concatenate([w.records, np.array(w._new, dtype=RECORD)])
+w._new = []
+w._compact()  # what commit() does first; idx not yet published
+mid_reader = ChunkStoreReader(data_dir)
+assert mid_reader.generation == 0 and mid_reader.get(4)["chunk_id"] == "b-4"
+w.commit()
+
+store = ChunkStoreReader(data_dir)
+print("Blobs after compaction:", [os.path.basename(p) for p in blob_files(data_dir)], "generation:", store.generation)
+assert store.generation == 1 and blob_files(data_dir) == [blob_path(data_dir, 1)]
+assert [r["chunk_id"] for r in store.iter_rows()] == ["a-new-0", "a-new-1", "c-0", "c-1", "c-2"]
+# Readers opened earlier keep their (now unlinked) blob and old offsets.
+assert old_reader.get(4)["chunk_id"] == "b-4" and mid_reader.get(6)["chunk_id"] == "a-new-0"
+
+# Deleting the doc holding the highest ids does not free them for reuse.
+w = ChunkStoreWriter(data_dir)
+w.remove_docs({"c"})
+w.commit()
+assert ChunkStoreWriter(data_dir).next_id == 11
+
+# An idx written before the header existed points at chunks.bin.
+legacy_dir = tempfile.mkdtemp()
+w = ChunkStoreWriter(legacy_dir)
+w.append({"doc_id": "a", "chunk_id": "a-0", "page_num": 1, "text": "legacy", "vector_id": 0})
+w.commit()
+idx_path = store_paths(legacy_dir)["idx"]
+raw = np.fromfile(idx_path, dtype=RECORD)
+raw[1:].tofile(idx_path)
+store = ChunkStoreReader(legacy_dir)
+assert store.generation == 0 and store.get(0)["text"] == "legacy"
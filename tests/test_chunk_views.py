@@ -0,0 +1,72 @@
+import pickle
+import random
+
+from app.bench.chunk_memory import run, synthetic_pages
+from app.ingest.chunking import Chunk, DocChunks, TextBuffer, chunk_document, chunk_pages
+from app.ingest.loaders import Page
+
+
+def legacy_chunks(pages, chunk_size=2200, overlap=250):
+    # The slice + strip chunker that views replaced.
+    out = []
+    for p in pages:
+        text = p.text
+        start, idx = 0, 0
+        while start < len(text):
+            end = min(start + chunk_size, len(text))
+            chunk_text = text[start:end].strip()
+            if chunk_text:
+                out.append((f"{p.doc_id}-p{p.page_num}-c{idx}", p.page_num, chunk_text))
+            idx += 1
+            if end == len(text):
+                break
+            start = max(0, end - overlap)
+    return out
+
+
+rng = random.Random(7)
+for trial in range(200):
+    pages = []
+    for n in range(rng.randint(1, 4)):
+        # Whitespace runs at window edges exercise the offset trimming.
+        text = "".join(rng.choice(["ab ", "  ", "\n", "word", "x", " \t "]) for _ in range(rng.randint(0, 120)))
+        pages.append(Page(doc_id="d", page_num=n + 1, text=text))
+    size = rng.randint(5, 40)
+    overlap = rng.randint(0, size - 1)
+    expected = legacy_chunks(pages, size, overlap)
+
+    got = [(c.chunk_id, c.page_num, c.text) for c in chunk_pages(pages, chunk_size=size, overlap=overlap)]
+    assert got == expected, (trial, got, expected)
+
+    doc = chunk_document("d", pages, chunk_size=size, overlap=overlap)
+    assert [(c.chunk_id, c.page_num, c.text) for c in doc] == expected, trial
+    assert [(r["chunk_id"], r["page_num"], r["text"]) for r in doc.rows()] == expected, trial
+print("Views match slice + strip chunking: OK")
+
+pages = synthetic_pages("doc", 3, 5000, random.Random(0))
+doc = chunk_document("doc", pages)
+rows = [c.row() for c in chunk_pages(pages)]
+assert list(doc.rows()) == rows
+assert set(rows[0]) == {"doc_id", "chunk_id", "page_num", "text"}
+
+# The buffer holds each page once; chunks only hold offsets into it.
+assert doc.buffer.text == "\n".join(p.text for p in pages)
+for i, p in enumerate(pages):
+    lo, hi = doc.buffer.page_bounds(i)
+    assert doc.buffer.text[lo:hi] == p.text
+assert len(doc) == len(rows) and doc[1].start < doc[0].end  # overlapping, stored once
+print("DocChunks rows:", len(doc))
+
+for obj in (doc, doc[0], doc.buffer, pages[0]):
+    assert not hasattr(obj, "__dict__"), type(obj).__name__
+assert isinstance(doc[0], Chunk) and isinstance(doc, DocChunks) and isinstance(doc.buffer, TextBuffer)
+# Pages cross process boundaries at ingest.
+assert pickle.loads(pickle.dumps(pages[0])) == pages[0]
+print("Slots: OK")
+
+out = run(docs=4, pages=10, page_chars=3000, chunk_size=800, overlap=200)
+res = out["results"]
+print({name: r["retained_mb"] for name, r in res.items()})
+assert len({r["chunks"] for r in res.values()}) == 1
+assert res["doc_chunks"]["retained_mb"] < res["rows"]["retained_mb"]
+print("Chunk memory benchmark: OK")
@@ -0,0 +1,113 @@
+import asyncio
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from openai import AsyncOpenAI, OpenAI
+
+from app import clients
+from app.clients import AsyncSingleFlight, CoalescingClient, SingleFlight
+from app.ingest import embed_store
+from app.rag import extract, retrieve
+from app.rag.retrieve import Retriever
+from tests.fake_openai import FakeOpenAIServer, write_fake_corpus
+
+# SingleFlight: one call per key while in flight, result and errors shared.
+flight = SingleFlight()
+runs = []
+
+
+def slow(value):
+    runs.append(value)
+    time.sleep(0.2)
+    if value == "boom":
+        raise ValueError("boom")
+    return [value]
+
+
+with ThreadPoolExecutor(16) as pool:
+    results = list(pool.map(lambda _: flight.do("k", lambda: slow("v")), range(16)))
+assert runs == ["v"] and all(r is results[0] for r in results), runs
+assert flight.calls == 1 and flight.shared == 15
+
+errors = []
+
+
+def failing():
+    try:
+        flight.do("e", lambda: slow("boom"))
+    except ValueError as e:
+        errors.append(e)
+
+
+threads = [threading.Thread(target=failing) for _ in range(4)]
+for t in threads:
+    t.start()
+for t in threads:
+    t.join()
+assert len(errors) == 4 and runs.count("boom") == 1
+# Sequential calls are not cached: the next one calls again.
+flight.do("k", lambda: slow("again"))
+assert runs[-1] == "again"
+
+data_dir = tempfile.mkdtemp()
+index_path = write_fake_corpus(data_dir, [f"experience line {i}" for i in range(20)])
+retriever = Retriever(data_dir=data_dir, index_path=index_path)
+
+with FakeOpenAIServer(latency_s=0.2) as server:
+    client = CoalescingClient(OpenAI(base_url=server.base_url, api_key="test"), SingleFlight())
+    retrieve.client = client
+    extract.client = client
+
+    # A burst of the same query: one embeddings request, one LLM request.
+    with ThreadPoolExecutor(12) as pool:
+        hits = list(pool.map(lambda _: retriever.search("python engineer", top_k=3), range(12)))
+        raws = list(pool.map(lambda _: extract.call_llm("same prompt", use_cache=False), range(12)))
+    assert all(h == hits[0] for h in hits) and len(set(raws)) == 1
+    assert server.requests == 2, server.stats()
+    assert client.flight.calls == 2 and client.flight.shared == 22
+
+    # Different queries still go out separately; streamed calls never coalesce.
+    with ThreadPoolExecutor(4) as pool:
+        list(pool.map(lambda i: retriever.search(f"query {i}", top_k=3), range(4)))
+    assert server.requests == 6
+    assert client.with_options(max_retries=0).flight is client.flight
+
+    # Async: shared task; a cancelled caller does not cancel it for the rest.
+    aclient = CoalescingClient(AsyncOpenAI(base_url=server.base_url, api_key="test"), AsyncSingleFlight())
+    before = server.requests
+
+    async def burst():
+        call = lambda: aclient.embeddings.create(model="m", input=["same"])  # noqa: E731
+        impatient = asyncio.ensure_future(call())
+        rest = [asyncio.ensure_future(call()) for _ in range(9)]
+        await asyncio.sleep(0.05)
+        impatient.cancel()
+        return await asyncio.gather(*rest)
+
+    responses = asyncio.run(burst())
+    assert server.requests == before + 1, server.stats()
+    assert all(r is responses[0] for r in responses)
+    assert aclient.flight.calls == 1 and aclient.flight.shared == 9
+
+for module in (retrieve, extract, embed_store):
+    module.client = None
+retrieve.aclient = None
+
+# Without a key the shared clients refuse to build (assigned clients never need one).
+key, clients.OPENAI_API_KEY = clients.OPENAI_API_KEY, ""
+try:
+    clients.get_openai_client()
+    raise AssertionError("built a client without OPENAI_API_KEY")
+except RuntimeError:
+    pass
+clients.OPENAI_API_KEY = key or "test"
+
+# The process-wide clients: built once, shared by every module.
+shared = clients.get_openai_client()
+assert shared is clients.get_openai_client() is retrieve.get_client() is extract.get_client() is embed_store.get_client()
+assert clients.get_async_openai_client() is retrieve.get_aclient()
+assert shared.client.max_retries == clients.OPENAI_MAX_RETRIES
+
+print("OK")
@@ -0,0 +1,60 @@
+import time
+
+from app import tokens
+from app.ingest.chunking import iter_chunks
+from app.ingest.loaders import Page
+from app.rag.context import SEPARATOR, knapsack, merge_overlap, pack_context
+from app.tokens import count_tokens
+
+page_text = " ".join(f"word{i}" for i in range(400))
+chunks = [
+    {"doc_id": c.doc_id, "chunk_id": c.chunk_id, "page_num": c.page_num, "text": c.text, "score": 0.5}
+    for c in iter_chunks([Page("cv", 1, page_text)], chunk_size=600, overlap=100)
+]
+
+# Overlap between neighbours is removed exactly.
+assert merge_overlap(chunks[0]["text"], chunks[1]["text"]) == page_text[:len(chunks[0]["text"]) + 500].strip()
+
+# All chunks of the page, out of order -> one block with the page text once.
+ctx = pack_context(list(reversed(chunks)), max_tokens=100_000)
+assert ctx.count("[chunk_id=") == 1
+assert ctx.split("\n", 1)[1] == page_text
+naive_tokens = sum(count_tokens(c["text"]) for c in chunks)
+print("Merged tokens:", count_tokens(ctx), "vs naive:", naive_tokens)
+assert count_tokens(ctx) < naive_tokens
+
+# Knapsack: a big chunk that doesn't fit must not stop smaller, later ones.
+assert knapsack([5, 9, 4], [3.0, 10.0, 3.0], budget=9) == [1]
+assert sorted(knapsack([6, 5, 4], [5.0, 4.0, 4.0], budget=9)) == [1, 2]
+
+big = {"doc_id": "a", "chunk_id": "a-p1-c0", "page_num": 1, "text": "alpha " * 300, "score": 0.9}
+small = [
+    {"doc_id": "b", "chunk_id": f"b-p{i}-c0", "page_num": i, "text": f"fact number {i}", "score": 0.5}
+    for i in range(3)
+]
+ctx = pack_context([big] + small, max_tokens=100)
+assert "alpha" not in ctx and all(f"fact number {i}" in ctx for i in range(3))
+assert count_tokens(ctx) <= 100
+
+# Budget is always respected.
+for budget in (50, 200, 400, 800):
+    assert count_tokens(pack_context(chunks, budget)) <= budget, budget
+
+# Blocks are ordered by score.
+ctx = pack_context([dict(small[0], score=0.1), dict(small[1], score=0.9)], max_tokens=1000)
+assert ctx.split(SEPARATOR)[0].startswith("[chunk_id=b-p1-c0")
+
+t0 = time.perf_counter()
+for _ in range(20):
+    pack_context(chunks, 400)
+print(f"pack_context: {(time.perf_counter() - t0) / 20 * 1000:.2f} ms for {len(chunks)} chunks")
+
+# Without a configured TIKTOKEN_CACHE_DIR, counting never loads tiktoken
+# (which could download the encoding) and uses the estimator.
+saved = tokens.TIKTOKEN_CACHE_DIR
+tokens.TIKTOKEN_CACHE_DIR = ""
+tokens._encoding.cache_clear()
+assert tokens._encoding() is None
+assert count_tokens(page_text) == tokens.estimate_tokens(page_text)
+tokens.TIKTOKEN_CACHE_DIR = saved
+tokens._encoding.cache_clear()
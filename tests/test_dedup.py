@@ -0,0 +1,115 @@
+import os
+import random
+import tempfile
+
+from app.ingest import embed_engine, embed_store
+from app.ingest.chunk_store import ChunkStoreReader
+from app.ingest.dedup import Deduper
+from app.rag import retrieve
+from app.rag.retrieve import Retriever
+
+WORDS = "python team latency recall platform cloud costs roadmap analytics pipelines services data".split()
+rng = random.Random(5)
+
+
+def prose(n):
+    return " ".join(rng.choice(WORDS) for _ in range(n)) + "."
+
+
+# Exact (case, punctuation and whitespace ignored) and near duplicates.
+disclaimer = ("This document is confidential and intended solely for the addressee. Any review, copying or "
+              "distribution by others is strictly prohibited. ACME Corp accepts no liability for errors.")
+d = Deduper()
+assert d.check(disclaimer, 1) is None
+assert d.check(disclaimer.upper().replace(".", " ;"), 2) == 1
+body = prose(300)
+assert d.check(body, 3) is None
+tokens = body.split()
+tokens[150] = "zebra"
+assert d.check(" ".join(tokens), 4) == 3  # one word changed
+assert d.check(prose(300), 5) is None  # same vocabulary, different text
+assert d.check("Page 1 of 9", 6) is None and d.check("Page 2 of 9", 7) is None  # short: exact only
+assert d.check("page 1 of 9!", 8) == 6
+d.reset()
+assert d.check(disclaimer, 9) is None
+print("Deduper: OK")
+
+# Ingest: boilerplate is embedded and indexed once, kept as locations.
+saved = {
+    embed_store: {k: getattr(embed_store, k) for k in ("DATA_DIR", "INDEX_PATH", "EMBED_CACHE_PATH", "EMBED_BACKEND",
+                                                       "DEDUP_ENABLED", "client")},
+    retrieve: {k: getattr(retrieve, k) for k in ("EMBED_BACKEND", "client")},
+}
+data_dir = tempfile.mkdtemp()
+embed_store.DATA_DIR = data_dir
+embed_store.INDEX_PATH = os.path.join(data_dir, "faiss.index")
+embed_store.EMBED_CACHE_PATH = os.path.join(data_dir, "embed_cache.sqlite")
+embed_store.EMBED_BACKEND = "hashing"
+embed_store.DEDUP_ENABLED = True
+retrieve.EMBED_BACKEND = "hashing"
+embed_store.client = None
+retrieve.client = None
+
+
+terms = "Terms of use: " + prose(150)
+
+
+def report(doc_id, pages):
+    # One content chunk and one disclaimer chunk per page, the disclaimer
+    # carrying the page number.
+    rows = []
+    for p in range(1, pages + 1):
+        rows.append({"doc_id": doc_id, "chunk_id": f"{doc_id}-p{p}-c0", "page_num": p,
+                     "text": f"Quarterly report for region {p}: " + prose(120)})
+        rows.append({"doc_id": doc_id, "chunk_id": f"{doc_id}-p{p}-c1", "page_num": p,
+                     "text": f"{disclaimer} {terms} Page {p} of {pages}."})
+    return rows
+
+
+stats = embed_store.upsert_documents({"q1": report("q1", 20), "q2": report("q2", 10)})
+print("Embedded:", stats.chunks, "duplicates:", stats.duplicates)
+assert stats.chunks == 30 + 2 and stats.duplicates == 19 + 9  # one disclaimer per document
+
+store = ChunkStoreReader(data_dir)
+assert len(store) == 60 and store.vectors == 32 and len(store.dups) == 28
+alias = store.get(int(store.dups["alias"][0]))
+assert set(alias) == {"doc_id", "chunk_id", "page_num", "vector_id", "dup_of"}  # no text stored
+
+r = Retriever(data_dir=data_dir, index_path=embed_store.INDEX_PATH, mode="hybrid")
+hits = r.search("confidential intended solely for the addressee liability", top_k=3)
+top = hits[0]
+print("Top hit:", top["chunk_id"], "locations:", len(top["locations"]))
+assert top["chunk_id"].endswith("-p1-c1")
+assert [loc["page_num"] for loc in top["locations"]] == list(range(1, 21 if top["doc_id"] == "q1" else 11))
+assert all(loc["doc_id"] == top["doc_id"] for loc in top["locations"])
+# The two documents' disclaimers both make the top 3; no slot is spent on a repeat.
+assert sum(h["chunk_id"].endswith("-c1") for h in hits) == 2
+assert all("locations" not in h for h in hits if h["chunk_id"].endswith("-c0"))
+
+# A page filter on a repeat's page finds the kept chunk.
+hits = r.search("confidential addressee", top_k=5, doc_id="q2", page_num=4)
+assert hits[0]["chunk_id"] == "q2-p1-c1"
+assert all(4 in [loc["page_num"] for loc in h.get("locations", [h])] for h in hits)
+
+# Replacing a document drops its aliases with it; the other keeps its own.
+stats = embed_store.upsert_document("q1", report("q1", 5))
+assert stats.replaced == 40 and stats.duplicates == 4
+store = ChunkStoreReader(data_dir)
+assert store.vectors == 6 + 11 and len(store.dups) == 4 + 9
+assert len(r.search("confidential addressee", top_k=5, doc_id="q2")[0]["locations"]) == 10
+
+# reindex rebuilds from the kept chunks only.
+assert embed_store.reindex("flat") == 17
+assert r.search("confidential addressee", top_k=1, doc_id="q1")[0]["chunk_id"] == "q1-p1-c1"
+
+# Off: every chunk is its own vector.
+embed_store.DEDUP_ENABLED = False
+stats = embed_store.upsert_document("q2", report("q2", 10))
+assert stats.duplicates == 0 and stats.chunks == 20
+assert ChunkStoreReader(data_dir).vectors == 6 + 20
+
+for module, attrs in saved.items():
+    for k, v in attrs.items():
+        setattr(module, k, v)
+embed_engine._default_engine = None
+print("Dedup ingest: OK")
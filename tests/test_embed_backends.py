@@ -0,0 +1,109 @@
+import os
+import tempfile
+
+import numpy as np
+from openai import OpenAI
+
+from app.ingest import embed_engine, embed_store
+from app.ingest.embed_backends import (
+    HashingBackend,
+    check_index_meta,
+    get_backend,
+    read_index_meta,
+)
+from app.rag import retrieve
+from app.rag.retrieve import Retriever
+
+# Hashing backend: deterministic, normalized, similar texts score higher.
+backend = HashingBackend(dim=256)
+texts = ["Senior Python engineer, Django and PostgreSQL", "Python engineer with Django", "Pastry chef in Lyon"]
+a = backend.embed(texts)
+b = HashingBackend(dim=256).embed(texts)
+assert a.shape == (3, 256) and a.dtype == np.float32
+assert np.array_equal(a, b)
+assert np.allclose(np.linalg.norm(a, axis=1), 1.0, atol=1e-5)
+assert a[0] @ a[1] > a[0] @ a[2], (a[0] @ a[1], a[0] @ a[2])
+assert backend.embed([]).shape == (0, 256)
+
+assert get_backend("hashing") is get_backend("hashing")
+try:
+    get_backend("word2vec")
+    raise AssertionError("unknown backend accepted")
+except ValueError:
+    pass
+
+try:
+    import sentence_transformers  # noqa: F401
+except ImportError:
+    try:
+        get_backend("local")
+        raise AssertionError("local backend without sentence-transformers")
+    except RuntimeError as e:
+        assert "sentence-transformers" in str(e)
+
+# Metadata checks.
+meta = backend.meta(256)
+check_index_meta(meta, backend, 256)
+check_index_meta(None, backend, 999)
+for bad, dim in (({**meta, "model": "other"}, 256), (meta, 128), ({**meta, "normalized": False}, 256)):
+    try:
+        check_index_meta(bad, backend, dim)
+        raise AssertionError(f"accepted {bad} dim={dim}")
+    except ValueError:
+        pass
+
+# Offline ingest + search with the hashing backend: no API client at all.
+saved = {
+    embed_store: {k: getattr(embed_store, k) for k in ("DATA_DIR", "INDEX_PATH", "EMBED_CACHE_PATH", "EMBED_BACKEND", "client")},
+    retrieve: {k: getattr(retrieve, k) for k in ("EMBED_BACKEND", "client")},
+}
+data_dir = tempfile.mkdtemp()
+embed_store.DATA_DIR = data_dir
+embed_store.INDEX_PATH = os.path.join(data_dir, "faiss.index")
+embed_store.EMBED_CACHE_PATH = os.path.join(data_dir, "embed_cache.sqlite")
+embed_store.EMBED_BACKEND = "hashing"
+retrieve.EMBED_BACKEND = "hashing"
+embed_store.client = None
+retrieve.client = None
+
+
+def rows(doc_id, lines):
+    return [{"doc_id": doc_id, "chunk_id": f"{doc_id}-c{i}", "page_num": 1, "text": t} for i, t in enumerate(lines)]
+
+
+embed_store.upsert_document("cv", rows("cv", texts))
+meta = read_index_meta(embed_store.INDEX_PATH)
+assert meta == {"backend": "hashing", "model": f"hashing-{get_backend('hashing').dim}",
+                "dim": get_backend("hashing").dim, "normalized": True}, meta
+
+r = Retriever(data_dir=data_dir, index_path=embed_store.INDEX_PATH, mode="vector")
+hits = r.search("python django engineer", top_k=2)
+assert {h["chunk_id"] for h in hits} == {"cv-c0", "cv-c1"}, hits
+
+# Querying with another backend is caught before a wrong-space search.
+try:
+    Retriever(data_dir=data_dir, index_path=embed_store.INDEX_PATH, backend=HashingBackend(dim=64)).search("python")
+    raise AssertionError("backend mismatch not detected")
+except ValueError as e:
+    assert "reindex" in str(e)
+
+# ... and so is ingesting with one.
+embed_store.EMBED_BACKEND = "openai"
+embed_store.client = OpenAI(base_url="http://127.0.0.1:9", api_key="test")
+try:
+    embed_store.upsert_document("other", rows("other", ["Go developer"]))
+    raise AssertionError("ingest with another backend accepted")
+except ValueError as e:
+    assert "hashing" in str(e)
+embed_store.EMBED_BACKEND = "hashing"
+
+# Deletes need no embeddings and keep the metadata.
+assert embed_store.delete_document("cv") == 3
+assert read_index_meta(embed_store.INDEX_PATH)["backend"] == "hashing"
+
+for module, attrs in saved.items():
+    for k, v in attrs.items():
+        setattr(module, k, v)
+embed_engine._default_engine = None
+
+print("OK")
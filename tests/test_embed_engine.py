@@ -0,0 +1,46 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from openai import OpenAI
+
+from app.ingest.embed_engine import EmbeddingEngine
+from tests.fake_openai import FakeOpenAIServer, fake_embedding
+
+texts = [f"chunk number {i} " + "word " * (i % 50) for i in range(300)]
+
+with FakeOpenAIServer(latency_s=0.02, fail_first=2) as server:
+    client = OpenAI(base_url=server.base_url, api_key="test")
+    engine = EmbeddingEngine(client, model="fake", max_in_flight=4, max_batch_tokens=500, backoff_base=0.01)
+
+    vectors = engine.embed(texts)
+
+    expected = np.stack([fake_embedding(t) for t in texts])
+    assert vectors.shape == expected.shape
+    assert np.allclose(vectors, expected), "output rows must stay in input order"
+    assert engine.stats.retries == 2
+    assert server.max_in_flight > 1
+
+    print("Batches:", len(engine.plan_batches(texts)))
+    print("Requests:", engine.stats.requests, "retries:", engine.stats.retries)
+    print("Max in flight:", engine.stats.max_in_flight)
+    print(f"Chunks/s: {engine.stats.chunks_per_s:.1f}")
+
+# Concurrent embed() calls (as embed_stream makes) share the engine's slots:
+# max_in_flight is the ceiling for the process, not per call.
+with FakeOpenAIServer(latency_s=0.05) as server:
+    client = OpenAI(base_url=server.base_url, api_key="test")
+    engine = EmbeddingEngine(client, model="fake", max_in_flight=4, max_batch_tokens=100)
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        parts = list(pool.map(engine.embed, [texts[i::4] for i in range(4)]))
+    wall = time.perf_counter() - t0
+
+    assert sum(len(p) for p in parts) == len(texts)
+    assert server.max_in_flight == engine.stats.max_in_flight == 4, (server.max_in_flight, engine.stats.max_in_flight)
+    # Overlapping calls are timed once: elapsed is wall time, not the sum per call.
+    assert engine.stats.elapsed_s <= wall, (engine.stats.elapsed_s, wall)
+    assert engine.stats.chunks_per_s >= len(texts) / wall
+    print("Concurrent calls, max in flight:", server.max_in_flight)
+    print(f"Concurrent calls, chunks/s: {engine.stats.chunks_per_s:.1f}")
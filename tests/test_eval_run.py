@@ -0,0 +1,91 @@
+import json
+import os
+import tempfile
+import time
+
+from openai import OpenAI
+
+from app.eval.cassette import Cassette, use_cassette
+from app.eval.run import run_all, run_cases
+from app.rag import extract, retrieve
+from app.rag.retrieve import Retriever
+from tests.fake_openai import FakeOpenAIServer, write_fake_corpus
+
+OUTPUT = json.dumps({
+    "refusal": False,
+    "candidate_name": "Test",
+    "email": "test@example.com",
+    "skills": ["python", "sql", "docker"],
+    "experience": [{"company": "Acme", "highlights": ["shipped"]}],
+})
+
+data_dir = tempfile.mkdtemp()
+index_path = write_fake_corpus(data_dir, [f"experience line {i}" for i in range(20)])
+retriever = Retriever(data_dir=data_dir, index_path=index_path)
+cassette_path = os.path.join(data_dir, "eval.cassette.jsonl")
+report_path = os.path.join(data_dir, "report.json")
+
+# Record: cases run concurrently against the (slow) fake API.
+with FakeOpenAIServer(latency_s=0.2, responder=lambda body: OUTPUT) as server:
+    client = OpenAI(base_url=server.base_url, api_key="test")
+    retrieve.client = client
+    extract.client = client
+
+    t0 = time.perf_counter()
+    code = run_all(top_k=3, retriever=retriever, concurrency=8,
+                   cassette=Cassette(cassette_path, "record"), report_path=report_path)
+    recorded_s = time.perf_counter() - t0
+    live_requests = server.requests
+
+assert code == 0
+assert server.max_in_flight > 1, "cases must overlap"
+# 4 cases reach the pipeline, 2 requests each; serially that is >= 1.6 s.
+assert live_requests == 8, live_requests
+assert recorded_s < 1.2, recorded_s
+assert retrieve.client is client and extract.client is client, "clients restored"
+
+report = json.load(open(report_path))
+assert report["passed"] == report["total"] == 6
+by_name = {c["name"]: c for c in report["cases"]}
+assert by_name["unsafe_01"]["path"] == "policy" and by_name["inj_01"]["path"] == "policy"
+assert by_name["skills_non_empty"]["path"] == "pipeline"
+assert by_name["skills_non_empty"]["ms"] >= 200 > by_name["inj_01"]["ms"]
+
+# Replay: no server at all, same results.
+dead = OpenAI(base_url="http://127.0.0.1:9", api_key="test", max_retries=0)
+retrieve.client = dead
+extract.client = dead
+
+replay = Cassette(cassette_path, "replay")
+t0 = time.perf_counter()
+assert run_all(top_k=3, retriever=retriever, cassette=replay, report_path=report_path) == 0
+assert time.perf_counter() - t0 < 0.5
+assert replay.hits == 8 and replay.recorded == 0
+replayed = json.load(open(report_path))
+assert [(c["name"], c["passed"]) for c in replayed["cases"]] == [(c["name"], c["passed"]) for c in report["cases"]]
+
+# Replay never writes the cassette; a changed request is a miss, reported
+# per case instead of calling the API.
+before = open(cassette_path, "rb").read()
+with use_cassette(Cassette(cassette_path, "replay")) as c:
+    results = run_cases(top_k=2, retriever=retriever)
+errors = [r for r in results if r.error]
+assert len(errors) == 4 and all("CassetteMiss" in r.error for r in errors), errors
+assert open(cassette_path, "rb").read() == before
+
+# Streamed extractions round-trip too.
+stream_path = os.path.join(data_dir, "stream.cassette.jsonl")
+with FakeOpenAIServer(responder=lambda body: OUTPUT) as server:
+    client = OpenAI(base_url=server.base_url, api_key="test")
+    retrieve.client = client
+    extract.client = client
+    with use_cassette(Cassette(stream_path, "record")):
+        live = extract.analyze_document("Extract skills", top_k=3, retriever=retriever, use_cache=False, stream=True)
+
+retrieve.client = dead
+extract.client = dead
+with use_cassette(Cassette(stream_path, "replay")):
+    again = extract.analyze_document("Extract skills", top_k=3, retriever=retriever, use_cache=False, stream=True)
+assert live == again and again.skills == ["python", "sql", "docker"]
+
+print("OK")
@@ -2,7 +2,8 @@ import os
 import faiss
 from app.ingest.loaders import load_pdf
 from app.ingest.chunking import chunk_pages
-from app.ingest.embed_store import build_and_persist, CHUNKS_PATH, INDEX_PATH
+from app.ingest.embed_store import build_and_persist, INDEX_PATH
+from app.ingest.chunk_store import ChunkStoreReader, store_paths
 
 pages = load_pdf("docs/sample.pdf", doc_id="sample")
 chunks = chunk_pages(pages)
@@ -16,8 +17,11 @@ rows = [{
 
 build_and_persist(rows)
 
-print("Saved:", CHUNKS_PATH, "exists=", os.path.exists(CHUNKS_PATH))
+paths = store_paths()
+for name in ("blob", "idx", "docs"):
+    print("Saved:", paths[name], "exists=", os.path.exists(paths[name]))
 print("Saved:", INDEX_PATH, "exists=", os.path.exists(INDEX_PATH))
 
 index = faiss.read_index(INDEX_PATH)
 print("Index size:", index.ntotal)
+print("Store size:", len(ChunkStoreReader()))
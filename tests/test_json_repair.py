@@ -0,0 +1,40 @@
+from app.rag import extract
+from app.rag.json_repair import RepairError, repair_summary
+
+CASES = [
+    # (raw, expected fields, expected fixes)
+    ('{"skills": ["a", "b",], "candidate_name": "X",}',
+     {"candidate_name": "X", "skills": ["a", "b"]}, ["trailing_comma"]),
+    ("Here you go:\n```json\n{'candidate_name': 'Ann', 'refusal': False}\n```\nHope it helps",
+     {"candidate_name": "Ann"}, ["python_literals", "single_quotes", "stripped_prose"]),
+    ('{"summary_points": ["line one\nline two"]}',
+     {"summary_points": ["line one\nline two"]}, ["raw_control_chars"]),
+    ('{"candidate_name": "Ann", "skills": ["python", "sq',
+     {"candidate_name": "Ann", "skills": ["python"]}, ["closed_truncated"]),
+    ('{"candidate_name": "Ann", "refusal": tr',
+     {"candidate_name": "Ann"}, ["closed_truncated"]),
+    ('{"experience": [{"company": "X", "highlights": ["a"]}, {"company": "Y", "role": "Eng", "highl',
+     {"experience": [{"company": "X", "highlights": ["a"]}, {"company": "Y", "role": "Eng"}]}, ["closed_truncated"]),
+    ('{candidate_name: "Ann", skills: [python, sql]}',
+     {"candidate_name": "Ann", "skills": ["python", "sql"]}, ["unquoted_keys", "unquoted_strings"]),
+    ('{"skills": "python", "experience": [{"role": "no company"}, {"company": "Z"}]}',
+     {"skills": ["python"], "experience": [{"company": "Z"}]}, ["coerced:skills", "coerced:experience"]),
+]
+
+for raw, expected, fixes in CASES:
+    r = repair_summary(raw)
+    assert r.summary.model_dump(exclude_defaults=True) == expected, (raw, r.summary)
+    assert r.fixes == fixes, (raw, r.fixes)
+
+for raw in ["Sorry, I cannot do that.", "", '{"a" "b"}', "[" * 5000, '{"a": ' * 5000]:
+    try:
+        repair_summary(raw)
+        raise AssertionError(f"expected RepairError for {raw!r}")
+    except RepairError:
+        pass
+
+# robust_parse path reporting (no network needed for these)
+assert extract.parse_with_report('{"candidate_name": "A"}').path == "direct"
+report = extract.parse_with_report('```json\n{"candidate_name": "A", "skills": ["x",\n')
+assert report.path == "local_repair" and report.summary.skills == ["x"]
+print("Local repair fixes:", report.fixes)
@@ -0,0 +1,106 @@
+import os
+import tempfile
+import time
+
+from openai import OpenAI
+
+from app.ingest.lexical import LexicalBuilder, LexicalIndex, load_lexical, rrf_fuse, tokenize
+from app.rag import retrieve
+from app.rag.retrieve import Retriever
+from tests.fake_openai import FakeOpenAIServer, write_fake_corpus
+
+TEXTS = [
+    "Contact: jane.doe@acme.io, +1 555 0100",
+    "Skills: Python, Node.js, PostgreSQL, Kubernetes",
+    "Experience: Senior engineer at Globex Corporation, 2019-2023",
+    "Education: MSc Computer Science, University of Springfield",
+] + [f"experience line {i} with generic filler words" for i in range(40)]
+
+# Compound identifiers are indexed whole and by part.
+tokens = tokenize("Mail Jane.Doe@Acme.io about node.js")
+assert "jane.doe@acme.io" in tokens and "acme" in tokens, tokens
+assert "node.js" in tokens and "node" in tokens, tokens
+
+index = LexicalIndex().updated([], enumerate(TEXTS))
+assert len(index) == len(TEXTS)
+
+scores, ids = index.search("jane.doe@acme.io", top_k=3)
+assert ids[0] == 0, ids
+scores, ids = index.search("kubernetes postgresql", top_k=3)
+assert ids.tolist() == [1], ids
+scores, ids = index.search("globex", top_k=5, allowed=[0, 1])
+assert len(ids) == 0, ids
+scores, ids = index.search("no such term", top_k=5)
+assert len(ids) == 0
+
+# Incremental update == rebuild; removed ids disappear.
+updated = index.updated([1], [(100, "Skills: Rust and Kubernetes")])
+rebuilt = LexicalIndex().updated([], [(i, t) for i, t in enumerate(TEXTS) if i != 1] + [(100, "Skills: Rust and Kubernetes")])
+assert updated.vocab == rebuilt.vocab
+for q in ("kubernetes", "python", "experience filler", "acme"):
+    a, b = updated.search(q, top_k=10), rebuilt.search(q, top_k=10)
+    assert sorted(a[1].tolist()) == sorted(b[1].tolist()), q
+assert updated.search("kubernetes", top_k=5)[1].tolist() == [100]
+assert len(updated.search("python", top_k=5)[1]) == 0
+
+builder = LexicalBuilder(index, [0])
+builder.add(200, "jane.doe@acme.io moved")
+assert builder.build().search("jane.doe@acme.io", top_k=5)[1].tolist() == [200]
+
+# Persistence round trip.
+tmp = tempfile.mkdtemp()
+updated.save(os.path.join(tmp, "lexical.npz"))
+loaded = load_lexical(tmp)
+assert loaded.vocab == updated.vocab
+assert loaded.search("kubernetes", top_k=5)[1].tolist() == [100]
+assert len(load_lexical(tempfile.mkdtemp())) == 0
+
+# RRF: ids ranked well by both lists win.
+fused = rrf_fuse([[1, 2, 3], [3, 1, 4]], k=60)
+assert [vid for vid, _ in fused][:2] == [1, 3], fused
+
+data_dir = tempfile.mkdtemp()
+index_path = write_fake_corpus(data_dir, TEXTS)
+
+# Lexical mode never touches the embeddings client.
+retrieve.client = None
+lexical = Retriever(data_dir=data_dir, index_path=index_path, mode="lexical")
+hits = lexical.search("jane.doe@acme.io", top_k=3)
+assert hits[0]["chunk_id"] == "cv-0", hits
+
+t0 = time.perf_counter()
+for _ in range(200):
+    lexical.search("python kubernetes", top_k=5)
+per_query_us = (time.perf_counter() - t0) / 200 * 1e6
+
+assert lexical.search("globex", top_k=3, doc_id="other") == []
+
+with FakeOpenAIServer() as server:
+    retrieve.client = OpenAI(base_url=server.base_url, api_key="test")
+    hybrid = Retriever(data_dir=data_dir, index_path=index_path, mode="hybrid")
+
+    hits = hybrid.search("jane.doe@acme.io", top_k=3)
+    assert hits[0]["chunk_id"] == "cv-0", hits
+    assert server.requests == 1
+
+    # Dense-only results still come back in vector mode.
+    assert len(hybrid.search("experience", top_k=3, mode="vector")) == 3
+
+    many = hybrid.search_many(["jane.doe@acme.io", "globex corporation"], top_k=2)
+    assert many[0][0]["chunk_id"] == "cv-0" and many[1][0]["chunk_id"] == "cv-2", many
+
+try:
+    Retriever(data_dir=data_dir, index_path=index_path, mode="fuzzy")
+    raise AssertionError("unknown mode accepted")
+except ValueError:
+    pass
+
+os.remove(os.path.join(data_dir, "lexical.npz"))
+try:
+    Retriever(data_dir=data_dir, index_path=index_path, mode="lexical").search("python")
+    raise AssertionError("lexical search without an index")
+except RuntimeError as e:
+    assert "reindex" in str(e)
+
+print(f"lexical search: {per_query_us:.0f} us/query")
+print("OK")
@@ -0,0 +1,59 @@
+import os
+import tempfile
+
+from openai import OpenAI
+
+from app.cache import DiskCache
+from app.rag import extract
+from app.rag import llm_cache
+from app.rag.llm_cache import llm_cache_key
+from tests.fake_openai import FakeOpenAIServer
+
+# Every input that can change the output must change the key.
+base = llm_cache_key("m", "sys", "prompt", {"temperature": 0})
+assert base == llm_cache_key("m", "sys", "prompt", {"temperature": 0})
+assert base != llm_cache_key("m2", "sys", "prompt", {"temperature": 0})
+assert base != llm_cache_key("m", "sys2", "prompt", {"temperature": 0})
+assert base != llm_cache_key("m", "sys", "prompt2", {"temperature": 0})
+assert base != llm_cache_key("m", "sys", "prompt", {"temperature": 0, "max_output_tokens": 10})
+
+data_dir = tempfile.mkdtemp()
+llm_cache._cache = DiskCache(os.path.join(data_dir, "llm_cache.sqlite"), max_entries=2)
+
+
+
+def responder(body):
+    # No JSON at all for extraction (beyond local repair), valid JSON for the repair call.
+    prompt = body["input"][-1]["content"]
+    return '{"skills": ["a"]}' if prompt.startswith("Fix the following") else "Sorry, no JSON today."
+
+
+with FakeOpenAIServer(responder=responder) as server:
+    extract.client = OpenAI(base_url=server.base_url, api_key="test")
+
+    first = extract.call_llm("same prompt")
+    second = extract.call_llm("same prompt")
+    assert first == second
+    assert server.requests == 1, "second identical call must be served from the cache"
+
+    extract.call_llm("same prompt", use_cache=False)
+    assert server.requests == 2, "bypass must always hit the API"
+
+    # Output without JSON goes through the LLM repair call, which is cached too.
+    assert extract.parse_with_report(first).path == "llm_repair"
+    n = server.requests
+    extract.robust_parse(first)
+    assert server.requests == n
+
+    # Size bound: LRU eviction keeps at most max_entries rows.
+    extract.call_llm("other prompt 1")
+    extract.call_llm("other prompt 2")
+    assert len(llm_cache._cache) == 2
+
+    print("API requests:", server.requests, "cached entries:", len(llm_cache._cache))
+
+# TTL: expired rows are not returned.
+ttl_cache = DiskCache(os.path.join(data_dir, "ttl.sqlite"), ttl_seconds=0)
+ttl_cache.put("k", b"v")
+assert ttl_cache.get("k") is None
+print("TTL expiry OK")
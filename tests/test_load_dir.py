@@ -0,0 +1,41 @@
+import os
+import tempfile
+
+import fitz
+
+from app.ingest.loaders import doc_ids_for_paths, find_pdfs, load_pdfs_parallel
+
+
+def write_pdf(path: str, texts, **save_options) -> None:
+    doc = fitz.open()
+    for t in texts:
+        doc.new_page().insert_text((72, 72), t)
+    doc.save(path, **save_options)
+    doc.close()
+
+
+root = tempfile.mkdtemp()
+os.makedirs(os.path.join(root, "sub"))
+write_pdf(os.path.join(root, "good.pdf"), [f"good page {i}" for i in range(3)])
+write_pdf(os.path.join(root, "sub", "a.pdf"), ["lower case a"])
+write_pdf(os.path.join(root, "sub", "a.PDF"), ["upper case a"])
+write_pdf(os.path.join(root, "locked.pdf"), ["secret"], encryption=fitz.PDF_ENCRYPT_AES_256, owner_pw="o", user_pw="u")
+with open(os.path.join(root, "broken.pdf"), "wb") as f:
+    f.write(b"%PDF-1.4 not really a pdf")
+
+# Colliding ids stay unique: the later file keeps its extension.
+files = doc_ids_for_paths(find_pdfs(root), root)
+ids = [doc_id for _, doc_id in files]
+assert len(set(ids)) == len(ids), ids
+assert dict((os.path.basename(p), i) for p, i in files if "/sub/" in p) == {"a.PDF": "sub/a", "a.pdf": "sub/a.pdf"}, files
+
+# Unreadable files are reported and skipped; the rest still load.
+errors = []
+loaded = dict(load_pdfs_parallel(files, workers=2, pages_per_task=1,
+                                 on_error=lambda path, doc_id, err: errors.append(doc_id)))
+assert sorted(errors) == ["broken", "locked"], errors
+assert sorted(loaded) == sorted(i for i in ids if i not in errors), sorted(loaded)
+assert [p.page_num for p in loaded["good"]] == [1, 2, 3]
+assert {loaded[i][0].text for i in ids if i.startswith("sub/")} == {"lower case a", "upper case a"}
+
+print("Loaded:", sorted(loaded), "skipped:", sorted(errors))
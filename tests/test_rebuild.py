@@ -0,0 +1,59 @@
+import os
+import tempfile
+
+import faiss
+
+from app.ingest import embed_engine, embed_store
+from app.ingest.chunk_store import ChunkStoreReader, blob_files
+
+saved = {k: getattr(embed_store, k) for k in ("DATA_DIR", "INDEX_PATH", "EMBED_CACHE_PATH", "EMBED_BACKEND", "client")}
+data_dir = tempfile.mkdtemp()
+embed_store.DATA_DIR = data_dir
+embed_store.INDEX_PATH = os.path.join(data_dir, "faiss.index")
+embed_store.EMBED_CACHE_PATH = os.path.join(data_dir, "embed_cache.sqlite")
+embed_store.EMBED_BACKEND = "hashing"
+embed_store.client = None
+
+
+def rows(doc_id, n):
+    return [{"doc_id": doc_id, "chunk_id": f"{doc_id}-{i}", "page_num": 1, "text": f"{doc_id} chunk {i} " + "word " * i}
+            for i in range(n)]
+
+
+def chunk_ids():
+    store = ChunkStoreReader(data_dir)
+    try:
+        return [r["chunk_id"] for r in store.iter_rows()]
+    finally:
+        store.close()
+
+
+embed_store.build_and_persist(rows("a", 5))
+assert chunk_ids() == [f"a-{i}" for i in range(5)]
+
+
+def failing():
+    yield from rows("b", 3)
+    raise ConnectionError("embeddings API unreachable")
+
+
+# A rebuild that fails midway leaves the previous store and indexes untouched.
+try:
+    embed_store.build_and_persist(failing())
+    raise AssertionError("the failure was swallowed")
+except ConnectionError:
+    pass
+assert chunk_ids() == [f"a-{i}" for i in range(5)]
+assert faiss.read_index(embed_store.INDEX_PATH).ntotal == 5
+assert not [n for n in os.listdir(data_dir) if n.startswith(".build-")], os.listdir(data_dir)
+
+# A successful rebuild replaces everything; the old blob is gone.
+embed_store.build_and_persist(rows("b", 3))
+assert chunk_ids() == ["b-0", "b-1", "b-2"]
+assert faiss.read_index(embed_store.INDEX_PATH).ntotal == 3
+assert len(blob_files(data_dir)) == 1, blob_files(data_dir)
+print("Rebuild:", [os.path.basename(p) for p in blob_files(data_dir)], "OK")
+
+for k, v in saved.items():
+    setattr(embed_store, k, v)
+embed_engine._default_engine = None
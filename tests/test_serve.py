@@ -0,0 +1,85 @@
+import asyncio
+import json
+import tempfile
+import time
+
+from openai import AsyncOpenAI
+
+from app.rag import extract, retrieve
+from app.rag.retrieve import Retriever
+from app.serve import AnalyzeServer
+from tests.fake_openai import FakeOpenAIServer, write_fake_corpus
+
+data_dir = tempfile.mkdtemp()
+index_path = write_fake_corpus(data_dir, [f"experience line {i}" for i in range(20)])
+retriever = Retriever(data_dir=data_dir, index_path=index_path)
+
+LATENCY_S = 0.2
+N = 100
+
+
+async def request(port, method, path, payload=None):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    body = json.dumps(payload).encode() if payload is not None else b""
+    writer.write(
+        f"{method} {path} HTTP/1.1\r\nHost: x\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body
+    )
+    await writer.drain()
+    raw = await reader.read()
+    writer.close()
+    head, _, data = raw.partition(b"\r\n\r\n")
+    return int(head.split()[1]), json.loads(data)
+
+
+async def main(base_url):
+    client = AsyncOpenAI(base_url=base_url, api_key="test")
+    retrieve.aclient = client
+    extract.aclient = client
+
+    app = AnalyzeServer(retriever=retriever, max_concurrency=64, timeout_s=10)
+    server = await app.start("127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+
+    status, health = await request(port, "GET", "/health")
+    assert status == 200 and health["status"] == "ok"
+    assert set(health["coalescing"]) == {"calls", "shared"}
+
+    status, _ = await request(port, "POST", "/analyze", {"top_k": 3})
+    assert status == 400
+
+    # N analyses, each 2 fake round-trips of LATENCY_S: serial would take N * 2 * LATENCY_S.
+    t0 = time.perf_counter()
+    replies = await asyncio.gather(*[
+        request(port, "POST", "/analyze", {"query": f"Extract facts {i}", "top_k": 3, "no_cache": True})
+        for i in range(N)
+    ])
+    elapsed = time.perf_counter() - t0
+
+    assert all(s == 200 for s, _ in replies), [r for r in replies if r[0] != 200][:3]
+    assert replies[0][1]["candidate_name"] == "Test"
+    assert elapsed < N * 2 * LATENCY_S / 10
+    print(f"{N} concurrent analyses in {elapsed * 1000:.0f} ms")
+
+    # Per-request timeout
+    app.timeout_s = LATENCY_S / 4
+    status, err = await request(port, "POST", "/analyze", {"query": "slow one", "no_cache": True})
+    assert status == 504, (status, err)
+    print("Timeout:", err["error"])
+
+    # A ValueError from the pipeline (e.g. an index dim mismatch) is a server fault.
+    async def mismatched(**kwargs):
+        raise ValueError("Query embedding dim 3 does not match index dim 8")
+
+    app.analyze, analyze = mismatched, app.analyze
+    status, err = await request(port, "POST", "/analyze", {"query": "dims", "no_cache": True})
+    assert status == 500 and "dim" in err["error"], (status, err)
+    app.analyze = analyze
+
+    server.close()
+    await server.wait_closed()
+
+
+with FakeOpenAIServer(latency_s=LATENCY_S) as fake:
+    asyncio.run(main(fake.base_url))
+    print("Upstream max in flight:", fake.max_in_flight)
+    assert fake.max_in_flight >= 32
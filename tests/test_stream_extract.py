@@ -0,0 +1,89 @@
+import os
+import tempfile
+import time
+
+from openai import OpenAI
+
+from app.cache import DiskCache
+from app.rag import extract, llm_cache
+from app.rag.stream_parse import FieldStreamParser, StreamAbort
+from tests.fake_openai import FakeOpenAIServer
+
+GOOD = '```json\n{"candidate_name": "Ann", "skills": ["python", "sql"], "summary_points": ["' + "x" * 400 + '"]}\n```'
+MISTYPED = '{"candidate_name": "Ann", "skills": ["python"], "experience": "five years at Acme", "email": "ann@x.io", "location": "Oslo"}'
+GARBAGE = "I am sorry, but " + "the context does not say. " * 40
+
+# Parser: fields complete one by one, whatever the delta boundaries.
+p = FieldStreamParser()
+seen = []
+for i in range(0, len(GOOD), 5):
+    seen += [name for name, _ in p.feed(GOOD[i:i + 5])]
+assert seen == ["candidate_name", "skills", "summary_points"] and p.done
+assert p.result().skills == ["python", "sql"]
+
+for bad in ['{"email": "a" "b"}', '{"skills": [1] 2}', "{oops", GARBAGE]:
+    try:
+        FieldStreamParser().feed(bad)
+        raise AssertionError(f"no abort for {bad[:20]!r}")
+    except StreamAbort:
+        pass
+
+# A mistyped field is recorded, not fatal: later fields still stream.
+p = FieldStreamParser()
+assert [name for name, _ in p.feed(MISTYPED)] == ["candidate_name", "skills", "email", "location"]
+assert p.done and list(p.invalid) == ["experience"]
+try:
+    p.result()
+    raise AssertionError("result() accepted an invalid field")
+except StreamAbort:
+    pass
+
+llm_cache._cache = DiskCache(os.path.join(tempfile.mkdtemp(), "llm_cache.sqlite"))
+
+
+def responder(body):
+    prompt = body["input"][-1]["content"]
+    if prompt.startswith("Fix the following"):
+        return '{"candidate_name": "Repaired"}'
+    if "mistyped" in prompt:
+        return MISTYPED
+    return GARBAGE if "garbage" in prompt else GOOD
+
+
+with FakeOpenAIServer(responder=responder, chunk_delay_s=0.01) as server:
+    extract.client = OpenAI(base_url=server.base_url, api_key="test")
+
+    # Partial fields arrive before the stream ends.
+    arrivals = []
+    t0 = time.perf_counter()
+    result = extract.stream_extract("good prompt", on_field=lambda n, v: arrivals.append((n, time.perf_counter() - t0)))
+    total = time.perf_counter() - t0
+    assert result.candidate_name == "Ann"
+    assert [n for n, _ in arrivals] == ["candidate_name", "skills", "summary_points"]
+    assert arrivals[0][1] < total / 2
+    print(f"first field after {arrivals[0][1] * 1000:.0f} ms, complete after {total * 1000:.0f} ms")
+
+    # Cached replay still reports fields.
+    replay = []
+    extract.stream_extract("good prompt", on_field=lambda n, v: replay.append(n))
+    assert replay == [n for n, _ in arrivals]
+
+    # Garbage: aborted after the preamble window, not the whole output.
+    before = server.stream_deltas_sent
+    t0 = time.perf_counter()
+    result = extract.stream_extract("garbage prompt", use_cache=False)
+    elapsed = time.perf_counter() - t0
+    assert result.candidate_name == "Repaired"
+    full = len(GARBAGE) // 8
+    # Deltas already buffered by the server may still be counted; well under the full output.
+    assert server.stream_deltas_sent - before < full, (server.stream_deltas_sent - before, full)
+    assert elapsed < full * 0.01
+    print(f"garbage aborted + repaired in {elapsed * 1000:.0f} ms (full stream ~{full * 10} ms)")
+
+    # Mistyped middle field: the stream runs to the end and later fields survive,
+    # same result as the non-streamed path on the same output.
+    fields = []
+    result = extract.stream_extract("mistyped prompt", on_field=lambda n, v: fields.append(n), use_cache=False)
+    assert fields == ["candidate_name", "skills", "email", "location"]
+    assert (result.candidate_name, result.email, result.location) == ("Ann", "ann@x.io", "Oslo")
+    assert result == extract.robust_parse(MISTYPED, use_cache=False)
@@ -0,0 +1,87 @@
+import random
+
+from app.bench.chunkers import run, synthetic_corpus
+from app.cli import chunk_rows
+from app.ingest.chunking import chunk_document_tokens, iter_token_chunks
+from app.ingest.loaders import Page
+from app.rag.context import merge_adjacent
+from app.tokens import estimate_tokens
+
+corpus, facts = synthetic_corpus(docs=3, pages=6, seed=3)
+longest = max(estimate_tokens(f["fact"]) for f in facts)
+sentences_checked = 0
+for budget, overlap in ((64, 0), (120, 24), (300, 48), (800, 48)):
+    for doc_id, pages in corpus.items():
+        doc = chunk_document_tokens(doc_id, pages, max_tokens=budget, overlap_tokens=overlap)
+        rows = list(doc.rows())
+
+        # Streaming over pages gives the same chunks as the whole-document pass.
+        streamed = [c.row() for c in iter_token_chunks(iter(pages), max_tokens=budget, overlap_tokens=overlap)]
+        assert streamed == rows, (budget, doc_id)
+
+        for r in rows:
+            assert estimate_tokens(r["text"]) <= budget, (budget, r["chunk_id"])
+            assert r["text"] == r["text"].strip()
+        assert [r["chunk_id"] for r in rows] == [f"{doc_id}-p{r['page_num']}-c{i}" for i, r in enumerate(rows)]
+
+        # No sentence that fits the budget is cut: every such fact (the
+        # longest sentences) is whole in some chunk, and once every sentence
+        # fits, chunks end at sentence ends.
+        text = "\n".join(p.text for p in pages)
+        for f in facts:
+            if f["fact"] in text and estimate_tokens(f["fact"]) <= budget:
+                assert any(f["fact"] in r["text"] for r in rows), (budget, f["fact"])
+                sentences_checked += 1
+        if budget >= longest:
+            for r in rows:
+                assert r["text"][-1] in ".!?", (budget, r["text"][-40:])
+print("Facts kept whole:", sentences_checked)
+
+# Chunks span page breaks and say so; without cross_pages they don't.
+pages = corpus["doc0"]
+doc = chunk_document_tokens("doc0", pages, max_tokens=800, overlap_tokens=48)
+spanning = [r for r in doc.rows() if "page_end" in r]
+assert spanning and all(r["page_end"] > r["page_num"] for r in spanning)
+for r in spanning:
+    assert r["text"].count("\n") == r["page_end"] - r["page_num"]
+per_page = chunk_document_tokens("doc0", pages, max_tokens=800, overlap_tokens=48, cross_pages=False)
+assert all("page_end" not in r for r in per_page.rows())
+assert len(doc) < len(per_page)
+print("Chunks spanning pages:", len(spanning), "of", len(doc))
+
+# Overlap repeats whole sentences, never across a page break.
+doc = chunk_document_tokens("doc0", pages[:2], max_tokens=120, overlap_tokens=40)
+text = doc.buffer.text
+overlaps = 0
+for prev, nxt in zip(doc, list(doc)[1:]):
+    if nxt.start < prev.end:
+        overlaps += 1
+        assert text[nxt.start - 2] in ".!?" and estimate_tokens(text[nxt.start:prev.end]) <= 40
+        assert "\n" not in text[nxt.start:prev.end]
+    if prev.page_end != nxt.page_num:
+        assert nxt.start > prev.end  # cut at the page break: no overlap
+assert overlaps
+print("Overlapping neighbours:", overlaps, "of", len(doc) - 1)
+
+# A sentence longer than the budget is cut between words.
+long = Page(doc_id="x", page_num=1, text=" ".join(["word"] * 500) + ". Short one.")
+chunks = list(iter_token_chunks([long], max_tokens=100, overlap_tokens=0))
+assert all(estimate_tokens(c.text) <= 100 for c in chunks)
+assert "".join(c.text.replace(" ", "") for c in chunks).count("word") == 500
+giant = Page(doc_id="x", page_num=1, text="a" * 5000)
+assert "".join(c.text for c in iter_token_chunks([giant], max_tokens=100, overlap_tokens=0)) == "a" * 5000
+
+# Both chunkers behind the ingest entry point.
+sample = [Page(doc_id="s", page_num=i + 1, text=p.text) for i, p in enumerate(corpus["doc1"])]
+assert len(list(chunk_rows(sample, "tokens"))) < len(list(chunk_rows(sample, "chars")))
+
+# Prompt context shows a chunk's page span.
+hit = dict(spanning[0], score=1.0)
+assert f"page={hit['page_num']}-{hit['page_end']}]" in merge_adjacent([hit])[0].render()
+
+out = run(docs=6, pages=8, budgets=[800], overlap=48, k=5)
+chars, tokens = out["results"]
+print({r["chunker"]: (r["chunks"], r["split_facts"], r["bm25"]["hit@1"]) for r in out["results"]})
+assert tokens["chunks"] < chars["chunks"] and tokens["embedded_tokens"] < chars["embedded_tokens"]
+assert tokens["split_facts"] == 0 and tokens["bm25"]["hit@1"] >= chars["bm25"]["hit@1"]
+print("Token chunker benchmark: OK")
@@ -0,0 +1,84 @@
+import os
+import random
+import tempfile
+
+from openai import OpenAI
+
+from app.cli import trace_stats
+from app.rag import extract, retrieve
+from app.rag.extract import analyze_document, analyze_documents
+from app.rag.retrieve import Retriever
+from app.tracing import LatencyHistogram, get_tracer, prometheus_text, read_trace, span
+from tests.fake_openai import FakeOpenAIServer, write_fake_corpus
+
+# Histogram quantiles stay within the 5% bucket width.
+h = LatencyHistogram()
+values = [random.uniform(1, 1000) for _ in range(20000)]
+for v in values:
+    h.add(v)
+values.sort()
+for q in (0.5, 0.95, 0.99):
+    exact = values[int(q * len(values)) - 1]
+    assert abs(h.quantile(q) - exact) / exact < 0.06, (q, h.quantile(q), exact)
+assert h.count == 20000 and h.max_ms == values[-1]
+
+# Nesting and errors.
+with span("outer") as outer:
+    with span("inner", k=1) as inner:
+        pass
+    try:
+        with span("failing"):
+            raise ValueError("boom")
+    except ValueError:
+        pass
+assert inner.trace_id == outer.trace_id and inner.parent_id == outer.span_id
+assert outer.parent_id is None
+
+tracer = get_tracer()
+tracer.reset()
+trace_path = os.path.join(tempfile.mkdtemp(), "trace.jsonl")
+tracer.set_path(trace_path)
+
+data_dir = tempfile.mkdtemp()
+index_path = write_fake_corpus(data_dir, [f"experience line {i}" for i in range(20)])
+retriever = Retriever(data_dir=data_dir, index_path=index_path)
+
+with FakeOpenAIServer() as server:
+    client = OpenAI(base_url=server.base_url, api_key="test")
+    retrieve.client = client
+    extract.client = client
+
+    analyze_document("Extract key facts", top_k=3, retriever=retriever, use_cache=False)
+    analyze_documents(["Extract skills", "Extract education"], top_k=3, retriever=retriever, use_cache=False)
+
+tracer.set_path(None)
+spans = list(read_trace(trace_path))
+
+# One analyze trace with a span per stage, all in the same trace.
+root = next(s for s in spans if s["name"] == "analyze")
+stages = {s["name"]: s for s in spans if s["trace_id"] == root["trace_id"]}
+assert {"analyze", "policy", "embed", "search", "context", "llm", "parse"} <= set(stages), stages.keys()
+assert stages["llm"]["attrs"]["cache_hit"] is False
+assert stages["context"]["attrs"]["context_tokens"] > 0
+assert stages["parse"]["attrs"]["path"] == "direct"
+assert stages["search"]["attrs"]["hits"] == 3
+assert root["duration_ms"] >= stages["llm"]["duration_ms"]
+
+# Batch workers' spans nest under the batch span.
+batch = next(s for s in spans if s["name"] == "analyze_batch")
+batch_llm = [s for s in spans if s["name"] == "llm" and s["trace_id"] == batch["trace_id"]]
+assert len(batch_llm) == 2, batch_llm
+
+summaries = tracer.summaries()
+assert summaries["llm"]["count"] == 3 and summaries["analyze"]["count"] == 1
+text = prometheus_text(summaries)
+assert 'llm_doc_span_duration_ms{span="llm",quantile="0.99"}' in text
+assert 'llm_doc_span_duration_ms_count{span="llm"} 3' in text
+
+table = trace_stats(trace_path)
+assert table.splitlines()[0].split()[:2] == ["span", "count"]
+assert "llm: cache_hit=0.0%" in table, table
+assert trace_stats(trace_path, "jsonl").count("\n") == len(summaries)
+
+print(table)
+print("OK")